@@ -30,10 +30,53 @@
    Alias for all address spaces
 
 """
+import bisect
+import struct
+import threading
+
+from rekall import config
 from rekall import registry
+from rekall import threadpool
 from rekall import utils
 
 
+config.DeclareOption(
+    "--read_cache_size", default=32 * 1024 * 1024, type="IntParser",
+    help="The number of bytes each caching address space (e.g. EWF or "
+    "AFF4 images) may use to cache its reads.")
+
+config.DeclareOption(
+    "--readahead_chunks", default=8, type="IntParser",
+    help="When caching address spaces detect sequential reads, read this "
+    "many chunks ahead. Set to 0 to disable readahead.")
+
+config.DeclareOption(
+    "--prefetch_threads", default=1, type="IntParser",
+    help="Number of background threads used to read ahead in compressed "
+    "images (e.g. EWF or AFF4). Set to 0 to read ahead in the foreground.")
+
+
+# The thread pools used to prefetch chunks for all caching address spaces,
+# keyed by their number of threads.
+PREFETCH_POOLS = {}
+PREFETCH_POOL_LOCK = threading.Lock()
+
+
+def GetPrefetchPool(number_of_threads):
+    """Returns the shared prefetching thread pool, creating it if needed.
+
+    Sessions asking for the same number of threads share a pool, so a session
+    with a different --prefetch_threads value gets a pool of that size.
+    """
+    with PREFETCH_POOL_LOCK:
+        pool = PREFETCH_POOLS.get(number_of_threads)
+        if pool is None:
+            pool = PREFETCH_POOLS[number_of_threads] = threadpool.ThreadPool(
+                number_of_threads)
+
+        return pool
+
+
 class Zeroer(object):
     def __init__(self):
         self.store = utils.FastStore(10)
@@ -51,6 +94,25 @@ class Zeroer(object):
 ZEROER = Zeroer()
 
 
+def ReadInto(address_space, addr, buffer):
+    """Read len(buffer) bytes from addr into buffer.
+
+    The targets of runs are not always address spaces. Some are thin wrappers
+    around a file or a stream (e.g. AFF4StreamWrapper) which only implement
+    read(), so fall back to copying from read() for those.
+
+    Returns:
+      The number of bytes read into the start of the buffer.
+    """
+    read_into = getattr(address_space, "read_into", None)
+    if read_into is not None:
+        return read_into(addr, buffer)
+
+    data = address_space.read(addr, len(buffer))
+    buffer[:len(data)] = data
+    return len(data)
+
+
 class TranslationLookasideBuffer(object):
     """An implementation of a TLB.
 
@@ -82,6 +144,103 @@ class TranslationLookasideBuffer(object):
         self.page_cache.Put(vaddr, paddr)
 
 
+class TranslationIndex(object):
+    """A sorted index of virtual to physical translations.
+
+    The index holds the runs produced by a complete page table walk as
+    (virtual address, physical address, length) tuples, sorted by virtual
+    address. It can be stored in the session cache in a compact form so that
+    subsequent sessions on the same image do not need to walk the page tables
+    again.
+
+    If the index is not complete (i.e. some of the address space maps to
+    other address spaces), it can only be used to speed up vtop().
+    """
+
+    RUN_FORMAT = struct.Struct("<QQQ")
+
+    def __init__(self, runs=(), complete=True):
+        self.complete = complete
+        self.runs = sorted(runs)
+        self.starts = [x[0] for x in self.runs]
+
+    @classmethod
+    def FromState(cls, state):
+        """Recreate the index from the output of GetState()."""
+        data = state["runs"]
+        size = cls.RUN_FORMAT.size
+        return cls((cls.RUN_FORMAT.unpack_from(data, offset)
+                    for offset in xrange(0, len(data), size)),
+                   complete=state["complete"])
+
+    def GetState(self):
+        """Returns a representation which can be stored in the cache."""
+        return dict(complete=self.complete, runs="".join(
+            self.RUN_FORMAT.pack(*run) for run in self.runs))
+
+    def vtop(self, vaddr):
+        """Returns the physical address or None if vaddr is not in the index."""
+        idx = bisect.bisect_right(self.starts, vaddr) - 1
+        if idx >= 0:
+            start, paddr, length = self.runs[idx]
+            if vaddr < start + length:
+                return paddr + vaddr - start
+
+    def get_mappings(self, start=0, address_space=None):
+        """Yields Run objects for all runs which end after start."""
+        idx = max(0, bisect.bisect_right(self.starts, start) - 1)
+        for vaddr, paddr, length in self.runs[idx:]:
+            if vaddr + length <= start:
+                continue
+
+            yield Run(start=vaddr, end=vaddr + length,
+                      address_space=address_space, file_offset=paddr)
+
+    def __len__(self):
+        return len(self.runs)
+
+
+class PageBitmap(object):
+    """A compact map of the pages in a range which hold data.
+
+    Each page between start and end is represented by a single bit, which is
+    set if the page is mapped and contains at least one non zero byte.
+    """
+
+    def __init__(self, start=0, end=0, page_size=0x1000):
+        self.page_size = page_size
+        self.start = start - start % page_size
+        self.end = end
+        self.page_count = (end - self.start + page_size - 1) // page_size
+        self.bits = bytearray((self.page_count + 7) // 8)
+
+    def set_page(self, address):
+        page = (address - self.start) // self.page_size
+        self.bits[page >> 3] |= 1 << (page & 7)
+
+    def __contains__(self, address):
+        """Is the page containing address mapped and non zero?"""
+        if not self.start <= address < self.end:
+            return False
+
+        page = (address - self.start) // self.page_size
+        return bool(self.bits[page >> 3] & (1 << (page & 7)))
+
+    def __nonzero__(self):
+        return any(self.bits)
+
+    def pages(self):
+        """Yields the start addresses of all non zero pages."""
+        for i, byte in enumerate(self.bits):
+            if byte:
+                for bit in range(8):
+                    if byte & (1 << bit):
+                        yield self.start + (i * 8 + bit) * self.page_size
+
+    def __len__(self):
+        return sum(bin(x).count("1") for x in self.bits if x)
+
+
 class Run(object):
     """A container for runs."""
     __slots__ = ("start", "end", "address_space", "file_offset", "data")
@@ -195,6 +354,23 @@ class BaseAddressSpace(object):
 
         return ZEROER.GetZeros(length)
 
+    def read_into(self, addr, buffer):
+        """Read len(buffer) bytes from addr into buffer.
+
+        This avoids building intermediate strings for large reads. Address
+        spaces which can fill the buffer directly should override this.
+
+        Args:
+          addr: The address to read from.
+          buffer: A writable bytearray or memoryview.
+
+        Returns:
+          The number of bytes read into the start of the buffer.
+        """
+        data = self.read(addr, len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
     def get_mappings(self, start=0):
         """Generates a sequence of Run() objects.
 
@@ -337,6 +513,74 @@ class BaseAddressSpace(object):
         """Tell us if the address is valid """
         return True
 
+    # Size of the reads issued by get_page_bitmap().
+    PAGE_BITMAP_READ_SIZE = 1024 * 1024
+
+    def get_page_bitmap(self, start, end, page_size=0x1000):
+        """Returns a PageBitmap of the non zero pages between start and end.
+
+        This is much faster than testing each page with is_valid_address() and
+        read(), since only the mapped ranges are visited, contiguous physical
+        ranges are read in large chunks and chunks which are entirely zero are
+        skipped with a single comparison.
+        """
+        result = PageBitmap(start, end, page_size)
+        read_size = self.PAGE_BITMAP_READ_SIZE
+        for run in self.merge_base_ranges(start=result.start, end=end):
+            for chunk_start in xrange(run.start, run.end, read_size):
+                chunk_end = min(run.end, chunk_start + read_size)
+                if run.address_space is None:
+                    data = self.read(chunk_start, chunk_end - chunk_start)
+                else:
+                    data = run.address_space.read(
+                        run.file_offset + chunk_start - run.start,
+                        chunk_end - chunk_start)
+
+                if data == ZEROER.GetZeros(len(data)):
+                    continue
+
+                offset = 0
+                while offset < len(data):
+                    address = chunk_start + offset
+                    length = min(address - address % page_size + page_size,
+                                 chunk_end) - address
+
+                    if data.count("\x00", offset, offset + length) != length:
+                        result.set_page(address)
+
+                    offset += length
+
+        return result
+
+    def is_range_empty(self, start, end, page_size=0x1000):
+        """Is every page between start and end unmapped or entirely zero?
+
+        Unlike get_page_bitmap() this stops at the first page which holds
+        data. Reads start at one page and grow up to PAGE_BITMAP_READ_SIZE, so
+        data near the start of the range is found quickly while long runs of
+        zero pages are still read in large chunks.
+        """
+        start -= start % page_size
+        for run in self.merge_base_ranges(start=start, end=end):
+            read_size = page_size
+            chunk_start = run.start
+            while chunk_start < run.end:
+                chunk_end = min(run.end, chunk_start + read_size)
+                if run.address_space is None:
+                    data = self.read(chunk_start, chunk_end - chunk_start)
+                else:
+                    data = run.address_space.read(
+                        run.file_offset + chunk_start - run.start,
+                        chunk_end - chunk_start)
+
+                if data != ZEROER.GetZeros(len(data)):
+                    return False
+
+                chunk_start = chunk_end
+                read_size = min(read_size * 2, self.PAGE_BITMAP_READ_SIZE)
+
+        return True
+
     def write(self, addr, buf):
         """Write to the address space, if writable.
 
@@ -473,26 +717,74 @@ class CachingAddressSpaceMixIn(object):
     # The size of chunks we cache. This should be large enough to make file
     # reads efficient.
     CHUNK_SIZE = 32 * 1024
-    CACHE_SIZE = 10
+
+    # Number of consecutive chunk reads before we consider the access pattern
+    # to be sequential and start reading ahead.
+    READAHEAD_THRESHOLD = 2
+
+    # Address spaces with expensive reads (e.g. decompression) set this to read
+    # ahead in a background thread, so the reads overlap with the analysis.
+    PREFETCH = False
 
     def __init__(self, **kwargs):
         super(CachingAddressSpaceMixIn, self).__init__(**kwargs)
-        self._cache = utils.FastStore(self.CACHE_SIZE)
+        self.readahead = self.session.GetParameter("readahead_chunks", 8)
+        self._last_chunk = None
+        self._sequential_reads = 0
+        self.readahead_chunks = 0
+
+        self.prefetch_threads = 0
+        if self.PREFETCH and self.readahead > 0:
+            self.prefetch_threads = self.session.GetParameter(
+                "prefetch_threads", 1)
+
+        # The prefetcher adds chunks to the cache from another thread.
+        self._cache = utils.SizeBasedCache(
+            max_bytes=self.session.GetParameter(
+                "read_cache_size", 32 * 1024 * 1024),
+            lock=self.prefetch_threads > 0)
+
+        # Serializes access to cached_read_partial() with the prefetcher.
+        self._read_lock = threading.RLock()
+
+        # Chunks up to this number were already scheduled for prefetching.
+        self._prefetch_horizon = -1
+        self._prefetch_pending = False
+
+        # Prefetched chunks which were not read yet.
+        self._prefetched = set()
+        self.prefetched_chunks = 0
+        self.prefetch_used = 0
 
     def read(self, addr, length):
         addr, length = int(addr), int(length)
 
-        result = ""
+        result = []
         while length > 0:
             data = self.read_partial(addr, length)
             if not data:
                 break
 
-            result += data
+            result.append(data)
             length -= len(data)
             addr += len(data)
 
-        return result
+        return "".join(result)
+
+    def read_into(self, addr, buffer):
+        addr = int(addr)
+        buffer = memoryview(buffer)
+
+        offset = 0
+        while offset < len(buffer):
+            data = self.read_partial(addr + offset, len(buffer) - offset)
+            if not data:
+                break
+
+            buffer[offset:offset + len(data)] = data
+            offset += len(data)
+
+        return offset
 
     def cached_read_partial(self, addr, length):
         """Implement this to allow the caching mixin to cache these reads."""
@@ -506,24 +798,123 @@ class CachingAddressSpaceMixIn(object):
         chunk_number = addr / self.CHUNK_SIZE
         chunk_offset = addr % self.CHUNK_SIZE
 
-        # Do not cache large reads but still pad them to CHUNK_SIZE.
-        if chunk_offset == 0 and length > self.CHUNK_SIZE:
+        # Do not cache large reads but still pad them to CHUNK_SIZE. Chunks
+        # which are already cached (e.g. prefetched) are still used.
+        if (chunk_offset == 0 and length > self.CHUNK_SIZE and
+                chunk_number not in self._cache):
             # Deliberately do a short read to avoid copying.
             to_read = length - length % self.CHUNK_SIZE
-            return self.cached_read_partial(addr, to_read)
+            with self._read_lock:
+                return self.cached_read_partial(addr, to_read)
 
         available_length = min(length, self.CHUNK_SIZE - chunk_offset)
 
+        # Detect streaming access patterns.
+        if chunk_number != self._last_chunk:
+            if (self._last_chunk is not None and
+                    chunk_number == self._last_chunk + 1):
+                self._sequential_reads += 1
+            else:
+                self._sequential_reads = 0
+
+            self._last_chunk = chunk_number
+
         try:
-            data = self._cache.Get(chunk_number)
+            data = self._get_cached_chunk(chunk_number)
         except KeyError:
+            data = self._read_chunks(chunk_number)
+
+        if (self.prefetch_threads and
+                self._sequential_reads >= self.READAHEAD_THRESHOLD):
+            self._schedule_prefetch(chunk_number)
+
+        return data[chunk_offset:chunk_offset + available_length]
+
+    def _get_cached_chunk(self, chunk_number):
+        data = self._cache.Get(chunk_number)
+        if chunk_number in self._prefetched:
+            self._prefetched.discard(chunk_number)
+            self.prefetch_used += 1
+
+        return data
+
+    def _schedule_prefetch(self, chunk_number):
+        """Prefetch up to self.readahead chunks after chunk_number."""
+        # Only one batch at a time is outstanding for each address space.
+        if self._prefetch_pending:
+            return
+
+        first_chunk = max(chunk_number + 1, self._prefetch_horizon + 1)
+        last_chunk = chunk_number + self.readahead
+        if first_chunk > last_chunk:
+            return
+
+        self._prefetch_pending = True
+        self._prefetch_horizon = last_chunk
+        GetPrefetchPool(self.prefetch_threads).AddTask(
+            self._prefetch, (first_chunk, last_chunk))
+
+    def _prefetch(self, first_chunk, last_chunk):
+        """Runs in the prefetching thread."""
+        try:
+            for chunk_number in xrange(first_chunk, last_chunk + 1):
+                # Take the lock for each chunk so the foreground thread can
+                # interleave its own reads.
+                with self._read_lock:
+                    if chunk_number in self._cache:
+                        continue
+
+                    data = self.cached_read_partial(
+                        chunk_number * self.CHUNK_SIZE, self.CHUNK_SIZE)
+
+                    self._cache.Put(chunk_number, data)
+                    self._prefetched.add(chunk_number)
+                    self.prefetched_chunks += 1
+
+        except Exception as e:  # pylint: disable=broad-except
+            # The foreground read will report any real problem.
+            self.session.logging.debug("Prefetching failed: %s", e)
+
+        finally:
+            self._prefetch_pending = False
+
+    def _read_chunks(self, chunk_number):
+        """Read chunk_number (and possibly some chunks ahead) into the cache."""
+        with self._read_lock:
+            # The prefetcher may have read the chunk while we waited.
+            if self.prefetch_threads and chunk_number in self._cache:
+                return self._get_cached_chunk(chunk_number)
+
+            count = 1
+            if (self.readahead > 0 and not self.prefetch_threads and
+                    self._sequential_reads >= self.READAHEAD_THRESHOLD):
+                count += self.readahead
+
             # Just read the data from the real class.
             data = self.cached_read_partial(
-                chunk_number * self.CHUNK_SIZE, self.CHUNK_SIZE)
+                chunk_number * self.CHUNK_SIZE, self.CHUNK_SIZE * count)
 
-            self._cache.Put(chunk_number, data)
+        # Insert the requested chunk last so it is the most recently used.
+        for i in reversed(xrange(count)):
+            chunk = data[i * self.CHUNK_SIZE:(i + 1) * self.CHUNK_SIZE]
+            if chunk:
+                self._cache.Put(chunk_number + i, chunk)
 
-        return data[chunk_offset:chunk_offset + available_length]
+        self.readahead_chunks += count - 1
+
+        return data[:self.CHUNK_SIZE]
+
+    def cache_statistics(self):
+        """Returns a dict describing the performance of the read cache."""
+        cached_chunks = set(self._cache.keys())
+        return dict(hits=self._cache.hits,
+                    misses=self._cache.misses,
+                    cached_bytes=self._cache.total_bytes,
+                    max_bytes=self._cache.max_bytes,
+                    readahead_chunks=self.readahead_chunks,
+                    prefetched_chunks=self.prefetched_chunks,
+                    prefetch_used=self.prefetch_used,
+                    prefetch_wasted=len(self._prefetched - cached_chunks))
 
 
 class PagedReader(BaseAddressSpace):
@@ -552,6 +943,22 @@ class PagedReader(BaseAddressSpace):
 
         return self.base.read(paddr, to_read)
 
+    def _read_chunk_into(self, vaddr, buffer):
+        """Read bytes from a virtual address into buffer.
+
+        This is the read_into() counterpart of _read_chunk(). Subclasses which
+        can read directly into the buffer should override it.
+
+        Returns:
+          The number of bytes read.
+        """
+        data = self._read_chunk(vaddr, len(buffer))
+        if not data:
+            return 0
+
+        buffer[:len(data)] = data
+        return len(data)
+
     def _write_chunk(self, vaddr, buf):
         to_write = min(len(buf), self.PAGE_SIZE - (vaddr % self.PAGE_SIZE))
         if not to_write:
@@ -582,18 +989,33 @@ class PagedReader(BaseAddressSpace):
 
         addr, length = int(addr), int(length)
 
-        result = ''
+        result = []
 
         while length > 0:
             buf = self._read_chunk(addr, length)
             if not buf:
                 break
 
-            result += buf
+            result.append(buf)
             addr += len(buf)
             length -= len(buf)
 
-        return result
+        return "".join(result)
+
+    def read_into(self, addr, buffer):
+        """Read len(buffer) bytes from the virtual address 'addr'."""
+        addr = int(addr)
+        buffer = memoryview(buffer)
+
+        offset = 0
+        while offset < len(buffer):
+            read_length = self._read_chunk_into(addr + offset, buffer[offset:])
+            if not read_length:
+                break
+
+            offset += read_length
+
+        return offset
 
     def is_valid_address(self, addr):
         vaddr = self.vtop(addr)
@@ -628,7 +1050,7 @@ class RunBasedAddressSpace(PagedReader):
 
     def __init__(self, **kwargs):
         super(RunBasedAddressSpace, self).__init__(**kwargs)
-        self.runs = utils.RangedCollection()
+        self.runs = utils.IntervalIndex()
 
     def add_run(self, virt_addr, file_address, file_len, address_space=None,
                 data=None):
@@ -664,6 +1086,25 @@ class RunBasedAddressSpace(PagedReader):
 
         return data.address_space.read(file_offset, available_length)
 
+    def _read_chunk_into(self, addr, buffer):
+        start, end, data = self.runs.get_containing_range(addr)
+        length = len(buffer)
+
+        if start is None:
+            end = self.runs.get_next_range_start(addr)
+            if end is None:
+                end = addr + length
+
+            to_read = min(end - addr, length)
+            buffer[:to_read] = ZEROER.GetZeros(to_read)
+            return to_read
+
+        available_length = min(end - addr, length)
+        file_offset = data.file_offset + addr - start
+
+        return ReadInto(data.address_space, file_offset,
+                        buffer[:available_length])
+
     def vtop_run(self, addr):
         start, end, run = self.runs.get_containing_range(addr)
         if start is not None:
@@ -1,6 +1,14 @@
+import random
+import struct
+import threading
+import time
+
 from rekall import addrspace
 from rekall import testlib
 from rekall import session
+from rekall import utils
+from rekall.plugins.addrspaces import aff4
+from rekall.plugins.addrspaces import amd64
 
 
 class CustomRunsAddressSpace(addrspace.RunBasedAddressSpace):
@@ -12,6 +20,148 @@ class CustomRunsAddressSpace(addrspace.RunBasedAddressSpace):
             self.add_run(*i)
 
 
+class RecordingCachedAddressSpace(addrspace.CachingAddressSpaceMixIn,
+                                  addrspace.BufferAddressSpace):
+    """A caching address space which records its uncached reads."""
+    __abstract = True
+
+    CHUNK_SIZE = 16
+
+    def __init__(self, **kwargs):
+        super(RecordingCachedAddressSpace, self).__init__(**kwargs)
+        self.reads = []
+
+    def cached_read_partial(self, addr, length):
+        self.reads.append((addr, length))
+        return super(RecordingCachedAddressSpace, self).cached_read_partial(
+            addr, length)
+
+
+class PrefetchingCachedAddressSpace(RecordingCachedAddressSpace):
+    __abstract = True
+
+    PREFETCH = True
+
+
+class CachingAddressSpaceTest(testlib.RekallBaseUnitTestCase):
+    """Test the CachingAddressSpaceMixIn."""
+
+    data = "".join(chr(x) for x in range(256))
+
+    def _MakeAS(self, cls=RecordingCachedAddressSpace, **parameters):
+        session_obj = session.Session()
+        with session_obj:
+            for k, v in parameters.items():
+                session_obj.SetParameter(k, v)
+
+        return cls(data=self.data, session=session_obj)
+
+    def testCacheBudget(self):
+        test_as = self._MakeAS(read_cache_size=64, readahead_chunks=0)
+        for offset in [0, 100, 200, 36, 150, 0]:
+            self.assertEqual(test_as.read(offset, 4),
+                             self.data[offset:offset + 4])
+
+        # Only 4 chunks fit in the cache so the first chunk was re-read.
+        stats = test_as.cache_statistics()
+        self.assertEqual(stats["cached_bytes"], 64)
+        self.assertEqual(stats["misses"], 6)
+        self.assertEqual(test_as.reads[-1], (0, 16))
+
+        self.assertEqual(test_as.read(0, 4), self.data[:4])
+        self.assertEqual(test_as.cache_statistics()["hits"], 1)
+
+    def testReadahead(self):
+        test_as = self._MakeAS(readahead_chunks=4)
+        for offset in range(0, 160, 4):
+            self.assertEqual(test_as.read(offset, 4),
+                             self.data[offset:offset + 4])
+
+        # After two sequential chunks the next four chunks are read ahead.
+        self.assertEqual(test_as.reads,
+                         [(0, 16), (16, 16), (32, 80), (112, 80)])
+        self.assertEqual(test_as.cache_statistics()["readahead_chunks"], 8)
+
+        # Random access does not trigger readahead.
+        test_as = self._MakeAS(readahead_chunks=4)
+        test_as.read(0, 4)
+        test_as.read(100, 4)
+        test_as.read(200, 4)
+        self.assertEqual(test_as.reads, [(0, 16), (96, 16), (192, 16)])
+
+        # The default matches the --readahead_chunks option.
+        self.assertEqual(self._MakeAS().readahead, 8)
+
+    def testBackgroundPrefetch(self):
+        test_as = self._MakeAS(cls=PrefetchingCachedAddressSpace,
+                               readahead_chunks=4, prefetch_threads=1)
+
+        # The third sequential chunk schedules the next 4 chunks.
+        for offset in range(0, 48, 4):
+            self.assertEqual(test_as.read(offset, 4),
+                             self.data[offset:offset + 4])
+
+        addrspace.GetPrefetchPool(1).queue.join()
+        self.assertEqual(test_as.reads[:3], [(0, 16), (16, 16), (32, 16)])
+        self.assertEqual(sorted(test_as.reads[3:]),
+                         [(48, 16), (64, 16), (80, 16), (96, 16)])
+
+        # Reading the prefetched chunks does not read them again.
+        self.assertEqual(test_as.read(50, 40), self.data[50:90])
+        addrspace.GetPrefetchPool(1).queue.join()
+
+        stats = test_as.cache_statistics()
+        self.assertEqual(stats["prefetch_used"], 3)
+        self.assertEqual(stats["prefetch_wasted"], 0)
+        self.assertEqual(len(test_as.reads), stats["prefetched_chunks"] + 3)
+
+    def testPrefetchPoolSize(self):
+        # Each --prefetch_threads value gets a pool of its own size.
+        self.assertEqual(len(addrspace.GetPrefetchPool(1).workers), 1)
+        self.assertEqual(len(addrspace.GetPrefetchPool(2).workers), 2)
+        self.assertTrue(
+            addrspace.GetPrefetchPool(2) is addrspace.GetPrefetchPool(2))
+
+
+class SlowSeekingStream(object):
+    """A stream whose position may be moved between seek() and read()."""
+
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+
+    def seek(self, offset):
+        self.position = offset
+        time.sleep(0.001)
+
+    def read(self, length):
+        return self.data[self.position:self.position + length]
+
+
+class AFF4StreamWrapperTest(testlib.RekallBaseUnitTestCase):
+    """Test that wrapped AFF4 streams can be read from many threads."""
+
+    def testConcurrentReads(self):
+        data = "".join(chr(x) for x in range(256))
+        wrapper = aff4.AFF4StreamWrapper(SlowSeekingStream(data))
+        errors = []
+
+        def Reader(offset):
+            for _ in range(20):
+                if wrapper.read(offset, 4) != data[offset:offset + 4]:
+                    errors.append(offset)
+
+        threads = [threading.Thread(target=Reader, args=(offset,))
+                   for offset in (0, 64, 128, 192)]
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+
+
 class RunBasedTest(testlib.RekallBaseUnitTestCase):
     """Test the RunBasedAddressSpace implementation."""
 
@@ -45,6 +195,94 @@ class RunBasedTest(testlib.RekallBaseUnitTestCase):
         self.assertEqual(self.test_as.read(2000, 10),
                          "\x00" * 10)
 
+    def testRunsReadInto(self):
+        for offset, length in [(0, 20), (1050, 4), (1005, 10), (995, 30)]:
+            buffer = bytearray("X" * length)
+            self.assertEqual(self.test_as.read_into(offset, buffer), length)
+            self.assertEqual(str(buffer), self.test_as.read(offset, length))
+
+        # Reading into a slice leaves the rest of the buffer alone.
+        buffer = bytearray("X" * 6)
+        self.test_as.read_into(1050, memoryview(buffer)[1:5])
+        self.assertEqual(str(buffer), "X0156X")
+
+    def testPageBitmap(self):
+        data = "\x00" * 0x1000 + "\x00" * 0xfff + "x" + "\x00" * 0x1000
+        test_as = CustomRunsAddressSpace(
+            session=self.session,
+            #        Voff, Poff, length
+            runs=[(0x10000, 0, 0x2000),
+                  (0x13000, 0x1000, 0x2000)],
+            data=data)
+
+        bitmap = test_as.get_page_bitmap(0x10000, 0x16000, page_size=0x1000)
+        self.assertEqual(list(bitmap.pages()), [0x11000, 0x13000])
+        self.assertEqual(len(bitmap), 2)
+        self.assertTrue(0x13800 in bitmap)
+        self.assertFalse(0x12000 in bitmap)
+
+        # The bitmap agrees with testing each page individually.
+        for page in range(0x10000, 0x16000, 0x1000):
+            self.assertEqual(
+                page in bitmap,
+                test_as.is_valid_address(page) and
+                test_as.read(page, 0x1000) != "\x00" * 0x1000)
+
+        self.assertFalse(test_as.get_page_bitmap(0x10000, 0x11000))
+        self.assertFalse(test_as.get_page_bitmap(0x14000, 0x20000))
+
+    def testIsRangeEmpty(self):
+        data = "\x00" * 0x4000 + "x" + "\x00" * 0xfff + "\x00" * 0x3000
+        test_as = CustomRunsAddressSpace(
+            session=self.session,
+            #        Voff, Poff, length
+            runs=[(0x10000, 0, 0x8000),
+                  (0x20000, 0x4000, 0x1000)],
+            data=data)
+
+        # The result agrees with the page bitmap.
+        for start, end in [(0x10000, 0x18000), (0x10000, 0x14000),
+                           (0x14800, 0x15000), (0x15000, 0x30000),
+                           (0x18000, 0x20000), (0x1f000, 0x21000)]:
+            self.assertEqual(test_as.is_range_empty(start, end),
+                             not test_as.get_page_bitmap(start, end))
+
+        # The search stops at the first chunk with data. Reads double in size
+        # from one page, so the third read finds the data at 0x4000.
+        reads = []
+        original_read = test_as.base.read
+        def RecordingRead(addr, length):
+            reads.append((addr, length))
+            return original_read(addr, length)
+
+        test_as.base.read = RecordingRead
+        self.assertFalse(test_as.is_range_empty(0x10000, 0x18000))
+        self.assertEqual(reads, [(0, 0x1000), (0x1000, 0x2000),
+                                 (0x3000, 0x4000)])
+
+    def testIntervalIndex(self):
+        ranges = utils.RangedCollection()
+        index = utils.IntervalIndex()
+        index.insert_many([(0x2000, 0x3000, "b"), (0x1000, 0x1800, "a")])
+        for start, end, data in [(0x2000, 0x3000, "b"), (0x1000, 0x1800, "a")]:
+            ranges.insert(start, end, data)
+
+        # Inserting after a lookup rebuilds the index.
+        self.assertEqual(index.get_containing_range(0x1000),
+                         (0x1000, 0x1800, "a"))
+        index.insert(0x5000, 0x6000, "c")
+        ranges.insert(0x5000, 0x6000, "c")
+
+        self.assertEqual(list(index), list(ranges))
+        self.assertEqual(list(reversed(index)), list(reversed(ranges)))
+        self.assertEqual(index[-1], ranges[-1])
+        for _ in range(1000):
+            address = random.randint(0, 0x7000)
+            self.assertEqual(index.get_containing_range(address),
+                             ranges.get_containing_range(address))
+            self.assertEqual(index.get_next_range_start(address),
+                             ranges.get_next_range_start(address))
+
     def testDiscontiguousRunsGetRanges(self):
         """Test the range merging."""
         runs = []
@@ -124,3 +362,168 @@ class RunBasedTest(testlib.RekallBaseUnitTestCase):
             break
 
         self.assertTrue(run)
+
+
+class SkippingAMD64PagedMemory(amd64.AMD64PagedMemory):
+    """An address space which skips translations while walking."""
+    __abstract = True
+
+    def __init__(self, **kwargs):
+        super(SkippingAMD64PagedMemory, self).__init__(**kwargs)
+        self.skip = False
+        self.skipped = 1
+
+    def _get_mappings(self, start=0):
+        if self.skip:
+            self.skipped += 1
+
+        return super(SkippingAMD64PagedMemory, self)._get_mappings(
+            start=start)
+
+    def _get_skipped_translations(self):
+        return self.skipped
+
+
+class AMD64PagedMemoryTest(testlib.RekallBaseUnitTestCase):
+    """Test the page table walker of the AMD64 address space."""
+
+    def setUp(self):
+        self.session = session.Session()
+
+        tables = {
+            0x1000: {0: 0x2000 | 1},                    # PML4
+            0x2000: {0: 0x3000 | 1},                    # PDPT
+            0x3000: {0: 0x4000 | 1,                     # PD
+                     1: 0x200000 | 0x81,                # Large pages.
+                     2: 0x400000 | 0x81},
+            0x4000: {0: 0x10000 | 1, 1: 0x11000 | 1,    # PT
+                     2: 0x12000 | 1, 3: 0x13000 | 1,
+                     4: 0x14000,                        # Invalid.
+                     5: 0x20000 | 1, 6: 0x5000 | 1,
+                     511: 0x21000 | 1},
+        }
+
+        data = ["\x00"] * 0x5000
+        for table, entries in tables.items():
+            for index, value in entries.items():
+                offset = table + index * 8
+                data[offset:offset + 8] = struct.pack("<Q", value)
+
+        self.base_as = addrspace.BufferAddressSpace(
+            data="".join(data), session=self.session)
+        self.test_as = amd64.AMD64PagedMemory(
+            session=self.session, dtb=0x1000, base=self.base_as)
+
+    def _GetRuns(self, start=0):
+        return [(run.start, run.end, run.file_offset)
+                for run in self.test_as.get_mappings(start=start)]
+
+    expected = [(0, 0x4000, 0x10000),
+                (0x5000, 0x6000, 0x20000),
+                (0x6000, 0x7000, 0x5000),
+                (0x1ff000, 0x200000, 0x21000),
+                (0x200000, 0x600000, 0x200000)]
+
+    def testGetMappings(self):
+        # Always walk the page tables.
+        with self.session:
+            self.session.SetParameter("cache_translations", False)
+
+        expected = self.expected
+        self.assertEqual(self._GetRuns(), expected)
+        self.assertEqual(self._GetRuns(start=0x5800), expected[1:])
+
+        # The pure python walker must produce the same runs.
+        old_numpy, amd64.numpy = amd64.numpy, None
+        try:
+            self.assertEqual(self._GetRuns(), expected)
+            self.assertEqual(self._GetRuns(start=0x5800), expected[1:])
+        finally:
+            amd64.numpy = old_numpy
+
+    def testTranslationIndex(self):
+        self.assertEqual(self._GetRuns(), self.expected)
+
+        # A new address space on the same image uses the stored index instead
+        # of walking the page tables.
+        self.test_as = amd64.AMD64PagedMemory(
+            session=self.session, dtb=0x1000, base=self.base_as)
+        self.test_as._get_mappings = None
+
+        self.assertEqual(len(self.test_as.translation_index), 5)
+        self.assertEqual(self._GetRuns(), self.expected)
+        self.assertEqual(self._GetRuns(start=0x5800), self.expected[1:])
+        self.assertEqual(self.test_as.vtop(0x5123), 0x20123)
+        self.assertEqual(self.test_as.vtop(0x200010), 0x200010)
+        self.assertEqual(self.test_as.vtop(0x4000), None)
+
+        # The index survives a round trip through the cache state.
+        index = addrspace.TranslationIndex.FromState(
+            self.test_as.translation_index.GetState())
+        self.assertEqual(index.runs, self.test_as.translation_index.runs)
+        self.assertTrue(index.complete)
+
+    def testTranslationIndexDependsOnPagefile(self):
+        self.assertEqual(self._GetRuns(), self.expected)
+
+        # Loading a pagefile may add translations, so the index of a session
+        # without the pagefile must not be used.
+        with self.session:
+            self.session.SetParameter("pagefile", ["pagefile.sys"])
+
+        self.test_as = amd64.AMD64PagedMemory(
+            session=self.session, dtb=0x1000, base=self.base_as)
+        self.assertEqual(self.test_as.translation_index, None)
+        self.assertEqual(self._GetRuns(), self.expected)
+
+    def testTranslationIndexSkipsIncompleteWalks(self):
+        self.test_as = SkippingAMD64PagedMemory(
+            session=self.session, dtb=0x1000, base=self.base_as)
+        self.test_as.skip = True
+
+        # The walk skipped some translations (e.g. the vads were not
+        # available), so its runs are not stored.
+        self.assertEqual(self._GetRuns(), self.expected)
+        self.assertEqual(self.test_as.translation_index, None)
+
+        self.test_as = SkippingAMD64PagedMemory(
+            session=self.session, dtb=0x1000, base=self.base_as)
+        self.assertEqual(self.test_as.translation_index, None)
+
+        # Translations skipped before the walk do not matter.
+        self.assertEqual(self._GetRuns(), self.expected)
+        self.assertTrue(self.test_as.translation_index.complete)
+
+    def testTranslationIndexSkipsMappedFiles(self):
+        # Pretend a file was mapped into the physical address space.
+        self.base_as.mapped_files = {"pagefile.sys": 0x20000}
+        self.assertEqual(self._GetRuns(), self.expected)
+
+        index = self.test_as.translation_index
+        self.assertFalse(index.complete)
+        self.assertEqual(index.runs, [(0, 0x10000, 0x4000),
+                                      (0x6000, 0x5000, 0x1000)])
+
+        # The incomplete index is not used to enumerate the mappings.
+        self.test_as = amd64.AMD64PagedMemory(
+            session=self.session, dtb=0x1000, base=self.base_as)
+        self.assertEqual(self._GetRuns(), self.expected)
+
+    def testPageBitmap(self):
+        # All mapped pages are zero.
+        bitmap = self.test_as.get_page_bitmap(0, 0x8000)
+        self.assertFalse(bitmap)
+        self.assertEqual(bitmap.page_count, 8)
+
+        # Bitmaps are cached per DTB.
+        self.assertTrue(self.test_as.get_page_bitmap(0, 0x8000) is bitmap)
+        self.assertTrue(self.test_as.is_range_empty(0, 0x8000))
+        test_as = amd64.AMD64PagedMemory(
+            session=self.session, dtb=0x1000, base=self.base_as)
+        self.assertTrue(test_as.get_page_bitmap(0, 0x8000) is bitmap)
+
+    def testReadInto(self):
+        # A read spanning mapped and unmapped pages.
+        buffer = bytearray(0x3000)
+        self.assertEqual(self.test_as.read_into(0x3800, buffer), 0x3000)
+        self.assertEqual(str(buffer), self.test_as.read(0x3800, 0x3000))
@@ -0,0 +1,283 @@
+# Rekall Memory Forensics
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or (at
+# your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+#
+
+"""A compact binary container for Rekall profiles.
+
+JSON profiles must be decoded in their entirety before the profile can be
+used, which takes a long time for large kernel profiles. The binary format
+stores the same data in a way which can be memory mapped and decoded on
+demand:
+
+    MAGIC
+    header length (uint32)
+    header - JSON encoded small sections ($METADATA, $ENUMS etc) and the
+             location of the tables below (relative to the end of the header).
+    string table - The names of all structs and symbols.
+    struct table - Sorted (name offset, name length, definition offset,
+             definition length) entries. Each struct definition is encoded
+             separately and only decoded when the type is first used.
+    symbol tables - Sorted (name offset, name length, value) entries for the
+             $CONSTANTS and $FUNCTIONS sections.
+
+Profiles are converted using the convert_binary_profile plugin. The IO managers
+recognize the format automatically, so binary profiles can be placed in any
+profile repository.
+"""
+import collections
+import json
+import struct
+
+from rekall import utils
+
+
+MAGIC = "RKBPROF\x01"
+
+HEADER_LENGTH = struct.Struct("<I")
+
+# name offset, name length, definition offset, definition length.
+STRUCT_ENTRY = struct.Struct("<IIII")
+
+# name offset, name length, value.
+SYMBOL_ENTRY = struct.Struct("<IIQ")
+
+# Sections stored in their own tables. All other sections go in the header.
+STRUCT_SECTION = "$STRUCTS"
+SYMBOL_SECTIONS = ("$CONSTANTS", "$FUNCTIONS")
+
+
+def IsBinaryProfile(data):
+    return data[:len(MAGIC)] == MAGIC
+
+
+def Encode(data):
+    """Encode a profile data structure (as loaded from JSON) in binary form."""
+    strings = []
+    strings_length = [0]
+    string_offsets = {}
+
+    def AddString(string):
+        string = utils.SmartStr(string)
+        offset = string_offsets.get(string)
+        if offset is None:
+            offset = string_offsets[string] = strings_length[0]
+            strings.append(string)
+            strings_length[0] += len(string)
+
+        return offset, len(string)
+
+    header = dict(sections={}, layout={}, extra_symbols={})
+    for section, value in data.iteritems():
+        if section != STRUCT_SECTION and section not in SYMBOL_SECTIONS:
+            header["sections"][section] = value
+
+    # Struct definitions are laid out after the tables, so we record their
+    # offsets relative to the start of the definitions for now.
+    struct_entries = []
+    definitions = []
+    definitions_length = 0
+    for name, definition in sorted(data.get(STRUCT_SECTION, {}).iteritems()):
+        encoded = json.dumps(definition, sort_keys=True)
+        struct_entries.append(
+            AddString(name) + (definitions_length, len(encoded)))
+        definitions.append(encoded)
+        definitions_length += len(encoded)
+
+    symbol_entries = {}
+    for section in SYMBOL_SECTIONS:
+        entries = symbol_entries[section] = []
+        extra = {}
+        for name, value in sorted(data.get(section, {}).iteritems()):
+            if isinstance(value, (int, long)) and 0 <= value < 2 ** 64:
+                entries.append(AddString(name) + (value,))
+            else:
+                extra[name] = value
+
+        if extra:
+            header["extra_symbols"][section] = extra
+
+    # All offsets are relative to the end of the header.
+    offset = strings_length[0]
+    header["layout"][STRUCT_SECTION] = [offset, len(struct_entries)]
+    offset += STRUCT_ENTRY.size * len(struct_entries)
+
+    for section in SYMBOL_SECTIONS:
+        header["layout"][section] = [offset, len(symbol_entries[section])]
+        offset += SYMBOL_ENTRY.size * len(symbol_entries[section])
+
+    definitions_offset = offset
+
+    encoded_header = json.dumps(header, sort_keys=True)
+    result = [MAGIC, HEADER_LENGTH.pack(len(encoded_header)), encoded_header]
+    result.extend(strings)
+    for name_offset, name_length, offset, length in struct_entries:
+        result.append(STRUCT_ENTRY.pack(
+            name_offset, name_length, definitions_offset + offset, length))
+
+    for section in SYMBOL_SECTIONS:
+        for entry in symbol_entries[section]:
+            result.append(SYMBOL_ENTRY.pack(*entry))
+
+    result.extend(definitions)
+
+    return "".join(result)
+
+
+class LazyTypes(collections.MutableMapping):
+    """A mapping of type names to vtype definitions which decodes on demand.
+
+    This is used as the vtypes dict of a Profile loaded from a binary profile,
+    so only the types which are actually used are ever decoded.
+    """
+
+    def __init__(self, buffer=None, index=None):
+        self.buffer = buffer
+
+        # Maps type names to the (offset, length) of their encoded definition.
+        self.index = index or {}
+
+        # Decoded (or modified) definitions.
+        self.decoded = {}
+
+    def __getitem__(self, name):
+        try:
+            return self.decoded[name]
+        except KeyError:
+            offset, length = self.index[name]
+            result = self.decoded[name] = utils.InternObject(
+                json.loads(self.buffer[offset:offset + length]))
+
+            return result
+
+    def __setitem__(self, name, value):
+        self.decoded[name] = value
+
+    def __delitem__(self, name):
+        found = False
+        if self.index.pop(name, None) is not None:
+            # Do not modify the index of a copy.
+            self.index = self.index.copy()
+            found = True
+
+        if self.decoded.pop(name, None) is not None:
+            found = True
+
+        if not found:
+            raise KeyError(name)
+
+    def __contains__(self, name):
+        return name in self.decoded or name in self.index
+
+    def __iter__(self):
+        for name in self.index:
+            yield name
+
+        for name in self.decoded:
+            if name not in self.index:
+                yield name
+
+    def __len__(self):
+        return len(self.index) + len(
+            [x for x in self.decoded if x not in self.index])
+
+    def copy(self):
+        result = self.__class__(buffer=self.buffer, index=self.index)
+        result.decoded = self.decoded.copy()
+
+        return result
+
+
+class BinaryProfileData(object):
+    """Provides access to the sections of an encoded binary profile.
+
+    This can be passed to Profile.LoadProfileFromData() in place of the
+    decoded JSON dict.
+    """
+
+    def __init__(self, buffer):
+        if not IsBinaryProfile(buffer):
+            raise ValueError("Not a binary profile.")
+
+        self.buffer = buffer
+        header_offset = len(MAGIC) + HEADER_LENGTH.size
+        header_length = HEADER_LENGTH.unpack_from(buffer, len(MAGIC))[0]
+        self.header = json.loads(
+            buffer[header_offset:header_offset + header_length])
+
+        # Offsets in the layout are relative to the end of the header.
+        self.base = header_offset + header_length
+        self.layout = self.header["layout"]
+        self._symbols = {}
+
+    def _GetString(self, offset, length):
+        offset += self.base
+        return intern(self.buffer[offset:offset + length])
+
+    def _GetTypes(self):
+        offset, count = self.layout[STRUCT_SECTION]
+        offset += self.base
+        index = {}
+        for i in xrange(count):
+            name_offset, name_length, def_offset, def_length = (
+                STRUCT_ENTRY.unpack_from(
+                    self.buffer, offset + i * STRUCT_ENTRY.size))
+
+            index[self._GetString(name_offset, name_length)] = (
+                self.base + def_offset, def_length)
+
+        return LazyTypes(buffer=self.buffer, index=index)
+
+    def _GetSymbols(self, section):
+        result = self._symbols.get(section)
+        if result is None:
+            offset, count = self.layout[section]
+            offset += self.base
+            result = {}
+            for i in xrange(count):
+                name_offset, name_length, value = SYMBOL_ENTRY.unpack_from(
+                    self.buffer, offset + i * SYMBOL_ENTRY.size)
+
+                result[self._GetString(name_offset, name_length)] = value
+
+            result.update(self.header["extra_symbols"].get(section, {}))
+            self._symbols[section] = result
+
+        return result
+
+    def get(self, section, default=None):
+        if section == STRUCT_SECTION:
+            return self._GetTypes()
+
+        if section in SYMBOL_SECTIONS:
+            return self._GetSymbols(section)
+
+        return self.header["sections"].get(section, default)
+
+    def __getitem__(self, section):
+        result = self.get(section, self)
+        if result is self:
+            raise KeyError(section)
+
+        return result
+
+    def __contains__(self, section):
+        return (section == STRUCT_SECTION or section in SYMBOL_SECTIONS or
+                section in self.header["sections"])
+
+    def keys(self):
+        return ([STRUCT_SECTION] + list(SYMBOL_SECTIONS) +
+                self.header["sections"].keys())
@@ -161,6 +161,10 @@ class FileCache(Cache):
 
         # Record all the dirty cached keys.
         self.dirty = set()
+
+        # Keys which are known not to be stored in the cache directory, so we
+        # do not need to look for them again.
+        self.missing = set()
         self.cache_dir = None
         self.enabled = True
 
@@ -180,6 +184,7 @@ class FileCache(Cache):
         if cache_dir != self.cache_dir:
             self._io_manager = None
             self.cache_dir = cache_dir
+            self.missing.clear()
 
         if self._io_manager is None and cache_dir:
             # Cache dir may be specified relative to the home directory.
@@ -198,6 +203,7 @@ class FileCache(Cache):
 
     def SetName(self, name):
         self.name = name
+        self.missing.clear()
 
     def SetFingerprint(self, fingerprint):
         name = fingerprint["hash"]
@@ -206,18 +212,22 @@ class FileCache(Cache):
             indexes[name] = fingerprint["tests"]
 
             self.name = name
+            self.missing.clear()
             self.io_manager.StoreData("sessions/index", indexes)
 
     def Get(self, item, default=None):
-        if (self.io_manager and             # We are backing to a file.
-                item not in self.data and   # Item not already cached in memory.
-                item not in self.dirty):    # Item was not previously changed.
+        if (item not in self.data and       # Item not already cached in memory.
+                item not in self.dirty and  # Item was not previously changed.
+                item not in self.missing and  # Item is not known to be absent.
+                self.io_manager):           # We are backing to a file.
             try:
                 data = self.io_manager.GetData(
                     "sessions/%s/%s" % (self.name, item),
                     default=self)
                 if data is not self:
                     self.data[item] = data
+                else:
+                    self.missing.add(item)
             except Exception:
                 self.session.logging.error(
                     "Unable to decode cached object %s", item)
@@ -227,9 +237,11 @@ class FileCache(Cache):
     def Set(self, item, value, volatile=True):
         super(FileCache, self).Set(item, value, volatile=volatile)
         self.dirty.add(item)
+        self.missing.discard(item)
 
     def Clear(self):
         super(FileCache, self).Clear()
+        self.missing.clear()
 
         # Also delete the files backing this cache.
         if self._io_manager:
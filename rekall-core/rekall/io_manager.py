@@ -37,7 +37,9 @@ __author__ = "Michael Cohen <scudette@google.com>"
 
 import StringIO
 import gzip
+import hashlib
 import json
+import mmap
 import time
 import os
 import shutil
@@ -45,6 +47,7 @@ import urllib2
 import urlparse
 import zipfile
 
+from rekall import binary_profile
 from rekall import constants
 from rekall import obj
 from rekall import registry
@@ -220,6 +223,9 @@ class IOManager(object):
         return json.dumps(data, sort_keys=True, **options)
 
     def Decoder(self, raw):
+        if binary_profile.IsBinaryProfile(raw):
+            return binary_profile.BinaryProfileData(raw)
+
         return json.loads(raw)
 
     def GetData(self, name, raw=False, default=None):
@@ -398,10 +404,85 @@ class DirectoryIOManager(IOManager):
         self.session.logging.debug("Opened local file %s" % result.name)
         return result
 
+    def GetData(self, name, raw=False, default=None):
+        """Uncompressed binary profiles are memory mapped instead of read."""
+        if not raw:
+            try:
+                with open(self._GetAbsolutePathName(name), "rb") as fd:
+                    if binary_profile.IsBinaryProfile(
+                            fd.read(len(binary_profile.MAGIC))):
+                        return binary_profile.BinaryProfileData(mmap.mmap(
+                            fd.fileno(), 0, access=mmap.ACCESS_READ))
+            except (IOError, ValueError):
+                pass
+
+        return super(DirectoryIOManager, self).GetData(
+            name, raw=raw, default=default)
+
     def __str__(self):
         return "Directory:%s" % self.dump_dir
 
 
+class ProfileCacheManager(DirectoryIOManager):
+    """A local cache of parsed profiles from other repositories.
+
+    Profiles are stored in the binary profile format, keyed by the repository,
+    the profile name and the time the profile was last modified in the
+    repository. Later processes memory map the cached profile instead of
+    fetching and decoding the JSON profile again.
+    """
+
+    __abstract = True
+
+    def __init__(self, urn=None, **kwargs):
+        kwargs["mode"] = "w"
+        kwargs["version"] = ""
+        super(ProfileCacheManager, self).__init__(urn=urn, **kwargs)
+
+    def _GetCacheKey(self, manager, name):
+        last_modified = manager.Metadata(name).get("LastModified")
+        if last_modified is None:
+            return
+
+        return hashlib.sha1(json.dumps(
+            [manager.location or manager.urn, manager.version, name,
+             last_modified])).hexdigest()
+
+    def _StoreProfile(self, key, data):
+        # Other processes may be reading or writing the same profile, so write
+        # to a temporary file and atomically move it into place.
+        path = self._GetAbsolutePathName(key)
+        temp_path = "%s.%s.tmp" % (path, os.getpid())
+        try:
+            with open(temp_path, "wb") as fd:
+                fd.write(binary_profile.Encode(data))
+
+            os.rename(temp_path, path)
+        except (IOError, OSError) as e:
+            self.session.logging.debug("Unable to cache profile: %s", e)
+
+    def GetProfileData(self, manager, name):
+        """Returns the profile data for name from manager via the cache."""
+        key = self._GetCacheKey(manager, name)
+        if key is None:
+            return manager.GetData(name)
+
+        data = self.GetData(key)
+        if isinstance(data, binary_profile.BinaryProfileData):
+            self.session.logging.debug(
+                "Loaded profile %s from cache %s", name, key)
+            return data
+
+        data = manager.GetData(name)
+        if isinstance(data, dict):
+            self._StoreProfile(key, data)
+
+        return data
+
+    def __str__(self):
+        return "ProfileCache:%s" % self.dump_dir
+
+
 # pylint: disable=protected-access
 
 class SelfClosingFile(StringIO.StringIO):
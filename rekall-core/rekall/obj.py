@@ -41,6 +41,8 @@ import StringIO
 import copy
 
 from rekall import addrspace
+from rekall import binary_profile
+from rekall import config
 from rekall import registry
 from rekall import utils
 from rekall.ui import renderer
@@ -299,6 +301,41 @@ class ProfileError(Error):
     """Errors in setting the profile."""
 
 
+config.DeclareOption(
+    "--snapshot_types", default=[], type="ArrayStringParser",
+    help="Struct types which are read in a single operation when first "
+    "accessed, rather than one member at a time.")
+
+
+class StructSnapshot(object):
+    """A copy of the memory backing a struct.
+
+    Members of a snapshotted struct decode themselves from the copy instead of
+    reading the address space.
+    """
+
+    __slots__ = ("offset", "data")
+
+    def __init__(self, offset, data):
+        self.offset = offset
+        self.data = data
+
+    def read(self, offset, length):
+        """Returns the data or None if the range is not in the snapshot."""
+        start = offset - self.offset
+        if start < 0 or start + length > len(self.data):
+            return None
+
+        return self.data[start:start + length]
+
+    def write(self, offset, data):
+        start = offset - self.offset
+        if start < 0 or start + len(data) > len(self.data):
+            return
+
+        self.data = self.data[:start] + data + self.data[start + len(data):]
+
+
 class BaseObject(object):
     __metaclass__ = registry.UniqueObjectIdMetaclass
 
@@ -366,6 +403,20 @@ class BaseObject(object):
 
         self.obj_producers = set()
 
+        # Objects derived from a snapshotted struct share its snapshot.
+        self.obj_snapshot = None
+        if isinstance(parent, BaseObject) and parent.obj_vm is vm:
+            self.obj_snapshot = parent.obj_snapshot
+
+    def ReadData(self, offset, length, vm=None):
+        """Read data for this object, preferring the struct snapshot."""
+        if self.obj_snapshot is not None and vm is None:
+            data = self.obj_snapshot.read(offset, length)
+            if data is not None:
+                return data
+
+        return (vm or self.obj_vm).read(offset, length)
+
     @property
     def obj_size(self):
         return 0
@@ -610,6 +661,9 @@ class NativeType(NumericProxyMixIn, BaseObject):
     def write(self, data):
         """Writes the data back into the address space"""
         output = struct.pack(self.format_string, int(data))
+        if self.obj_snapshot is not None:
+            self.obj_snapshot.write(self.obj_offset, output)
+
         return self.obj_vm.write(self.obj_offset, output)
 
     def proxied(self):
@@ -629,7 +683,7 @@ class NativeType(NumericProxyMixIn, BaseObject):
         if self.value is not None:
             return self.value
 
-        data = self.obj_vm.read(self.obj_offset, self.obj_size)
+        data = self.ReadData(self.obj_offset, self.obj_size)
         if not data:
             return NoneObject("Unable to read {0} bytes from {1}",
                               self.obj_size, self.obj_offset)
@@ -668,7 +722,7 @@ class BitField(NativeType):
 
         self._proxy = self.obj_profile.Object(
             target or "address", offset=self.obj_offset, vm=self.obj_vm,
-            context=self.obj_context)
+            parent=self, context=self.obj_context)
 
         self.target = target
         self.start_bit = start_bit
@@ -717,7 +771,7 @@ class Pointer(NativeType):
         # size on different platforms.
         self._proxy = self.obj_profile.Object(
             "address", offset=self.obj_offset, value=value,
-            vm=self.obj_vm, context=self.obj_context)
+            vm=self.obj_vm, parent=self, context=self.obj_context)
 
         # We just hold on to these so we can construct the objects later.
         self.target = target
@@ -1096,7 +1150,7 @@ class PointerArray(Array):
             self.format_string = "<" + "I" * self.count
 
         # Read all the data
-        data = self.obj_vm.read(self.obj_offset, self.target_size * self.count)
+        data = self.ReadData(self.obj_offset, self.target_size * self.count)
         self._data = struct.unpack(self.format_string, data)
 
     def __iter__(self):
@@ -1221,6 +1275,78 @@ class BaseAddressComparisonMixIn(object):
         return self.__comparator__(other, operator.__ne__)
 
 
+class StructFieldLayout(object):
+    """Precompiled decoders for the scalar members of a struct.
+
+    This is produced by Profile.compile_type() for each struct type, and
+    allows scalar members to be decoded directly from the struct's data without
+    instantiating member objects.
+    """
+
+    def __init__(self, fields=()):
+        """Initialize the layout.
+
+        Args:
+          fields: A list of (name, offset, format_string, is_pointer) tuples for
+            the scalar members. Offsets are relative to the start of the
+            struct.
+        """
+        self.fields = {}
+        for name, offset, format_string, is_pointer in fields:
+            self.fields[name] = (offset, struct.Struct(format_string),
+                                 is_pointer)
+
+        # Members which do not overlap (e.g. in unions) are decoded together
+        # using a single format.
+        self.names = []
+        self.pointers = []
+        formats = []
+        byte_order = None
+        end = 0
+        for name, (offset, decoder, is_pointer) in sorted(
+                self.fields.items(), key=lambda x: (x[1][0], x[0])):
+            format_string = decoder.format
+            if offset < end or byte_order not in (None, format_string[0]):
+                continue
+
+            byte_order = format_string[0]
+            if offset > end:
+                formats.append("%dx" % (offset - end))
+
+            formats.append(format_string[1:])
+            if is_pointer:
+                self.pointers.append(len(self.names))
+
+            self.names.append(name)
+            end = offset + decoder.size
+
+        self.decoder = struct.Struct((byte_order or "<") + "".join(formats))
+
+    def __contains__(self, name):
+        return name in self.fields
+
+    def end(self, names):
+        """The number of bytes needed to decode the named members."""
+        return max([self.fields[x][0] + self.fields[x][1].size
+                    for x in names if x in self.fields] or [0])
+
+    def decode(self, name, data):
+        offset, decoder, is_pointer = self.fields[name]
+        value = decoder.unpack_from(data, offset)[0]
+        if is_pointer:
+            value = Pointer.integer_to_address(value)
+
+        return value
+
+    def decode_all(self, data):
+        """Returns a dict of all non overlapping members decoded at once."""
+        values = list(self.decoder.unpack_from(data))
+        for i in self.pointers:
+            values[i] = Pointer.integer_to_address(values[i])
+
+        return dict(zip(self.names, values))
+
+
 class Struct(BaseAddressComparisonMixIn, BaseObject):
     """ A Struct is an object which represents a c struct
 
@@ -1228,6 +1354,10 @@ class Struct(BaseAddressComparisonMixIn, BaseObject):
     offset.
     """
 
+    # These are set by Profile.compile_type() for each type.
+    callable_members = ()
+    field_layout = StructFieldLayout()
+
     def __init__(self, members=None, struct_size=0, **kwargs):
         """ This must be instantiated with a dict of members. The keys
         are the offsets, the values are Curried Object classes that
@@ -1255,6 +1385,10 @@ class Struct(BaseAddressComparisonMixIn, BaseObject):
         self.struct_size = struct_size
         self._cache = {}
 
+        # Hot types are snapshotted when a member is first accessed.
+        self._snapshot_pending = (
+            self.obj_type in self.obj_profile.snapshot_types)
+
     def __hash__(self):
         return hash(self.indices)
 
@@ -1347,6 +1481,9 @@ class Struct(BaseAddressComparisonMixIn, BaseObject):
         if result is not None:
             return result
 
+        if self._snapshot_pending:
+            self.snapshot()
+
         # Allow subfields to be gotten via this function.
         if "." in attr:
             result = self
@@ -1445,9 +1582,67 @@ class Struct(BaseAddressComparisonMixIn, BaseObject):
             seen.add(item.obj_offset)
             yield item
 
+    def read_fields(self, names=None):
+        """Returns the values of members as plain python values.
+
+        Scalar members (integers and pointers) are decoded directly from a
+        single read of the struct, without creating member objects. Other
+        native members are decoded using v(), while all remaining members are
+        returned as objects.
+
+        Args:
+          names: A list of member names. If not specified, all the non
+            overlapping scalar members are decoded.
+
+        Returns:
+          A list of values in the same order as names, or a dict of all scalar
+          members if names was not specified.
+        """
+        layout = self.field_layout
+        if names is None:
+            data = self.ReadData(self.obj_offset, layout.decoder.size)
+            return layout.decode_all(data)
+
+        data = self.ReadData(self.obj_offset, layout.end(names))
+        result = []
+        for name in names:
+            if name in layout:
+                result.append(layout.decode(name, data))
+                continue
+
+            if name in self.callable_members:
+                value = getattr(self, name)
+            else:
+                value = self.m(name)
+
+            if isinstance(value, NativeType):
+                value = value.v()
+
+            result.append(value)
+
+        return result
+
+    def snapshot(self):
+        """Read the entire struct at once so members decode from the copy.
+
+        Members which point outside the struct still read the address space.
+        Returns self to allow chaining.
+        """
+        self._snapshot_pending = False
+        size = self.obj_size
+        if (self.obj_snapshot is None or
+                self.obj_snapshot.read(self.obj_offset, size) is None):
+            self.obj_snapshot = StructSnapshot(
+                self.obj_offset, self.obj_vm.read(self.obj_offset, size))
+
+            # Members created before the snapshot read the address space.
+            self._cache.clear()
+
+        return self
+
     def GetData(self):
         """Returns the raw data of this struct."""
-        return self.obj_vm.read(self.obj_offset, self.obj_size)
+        return self.ReadData(self.obj_offset, self.obj_size)
 
 
 # Profiles are the interface for creating/interpreting
@@ -1623,6 +1818,9 @@ class Profile(object):
         # Keep track of all the known types so we can command line complete.
         self.known_types = set()
 
+        # Struct types which are snapshotted when first accessed.
+        self.snapshot_types = set(session.GetParameter("snapshot_types") or [])
+
         # This is the local cache of compiled expressions.
         self.flush_cache()
 
@@ -1666,6 +1864,7 @@ class Profile(object):
         result.object_classes = self.object_classes.copy()
         result._initialized = self._initialized
         result.known_types = self.known_types.copy()
+        result.snapshot_types = self.snapshot_types.copy()
         result._metadata = self._metadata.copy()
         # pylint: enable=protected-access
 
@@ -1685,6 +1884,7 @@ class Profile(object):
         self.object_classes.update(other.object_classes)
         self.flush_cache()
         self.enums.update(other.enums)
+        self.snapshot_types.update(other.snapshot_types)
         self.name = u"%s + %s" % (self.name, other.name)
 
         # Merge in the other's profile metadata which is not in this profile.
@@ -1778,9 +1978,25 @@ class Profile(object):
             for enum, name in v.items():
                 enum_definition[intern(str(enum))] = name
 
+    def add_snapshot_types(self, *type_names):
+        """Snapshot these struct types when their members are first accessed.
+
+        This is worthwhile for hot types which have many members read (e.g.
+        the process structs), since it replaces many small reads with one.
+        """
+        self.snapshot_types.update(type_names)
+
     def add_types(self, abstract_types):
         self.flush_cache()
 
+        # Types loaded from a binary profile are only decoded when they are
+        # first compiled.
+        if (isinstance(abstract_types, binary_profile.LazyTypes) and
+                not self.vtypes):
+            self.known_types.update(abstract_types)
+            self.vtypes = abstract_types.copy()
+            return
+
         abstract_types = utils.InternObject(abstract_types)
         self.known_types.update(abstract_types)
 
@@ -1867,10 +2083,43 @@ class Profile(object):
             cls = self.object_classes.get(type_name, Struct)
 
             self.types[intern(str(type_name))] = self._make_struct_callable(
-                cls, type_name, members, size, callable_members)
+                cls, type_name, members, size, callable_members,
+                field_layout=self._make_field_layout(
+                    field_description, callable_members))
+
+    def _make_field_layout(self, field_description, callable_members):
+        """Build the StructFieldLayout for the scalar members of a struct."""
+        fields = []
+        for name, value in field_description.iteritems():
+            if callable(value) or name in callable_members:
+                continue
+
+            offset, type_list = value
+            if not isinstance(offset, (int, long)):
+                continue
+
+            target_spec = self.legacy_field_descriptor(type_list)
+            target = target_spec["target"]
+            is_pointer = target == "Pointer"
+            if is_pointer:
+                target = "address"
+
+            # Only plain native types can be decoded without the object.
+            elif target_spec["target_args"]:
+                continue
+
+            native_type = self.object_classes.get(target)
+            if (isinstance(native_type, Curry) and
+                    native_type._target in (NativeType, Bool)):
+                format_string = native_type._kwargs.get("format_string")
+                if format_string:
+                    fields.append((intern(str(name)), offset, format_string,
+                                   is_pointer))
+
+        return StructFieldLayout(fields)
 
     def _make_struct_callable(self, cls, type_name, members, size,
-                              callable_members):
+                              callable_members, field_layout=None):
         """Compile the structs class into a callable.
 
         For write support we would like to add a __setattr__ on the struct
@@ -1895,6 +2144,9 @@ class Profile(object):
         # http://stackoverflow.com/questions/938429/scope-of-python-lambda-functions-and-their-parameters/938493#938493
 
         properties = dict(callable_members=callable_members.keys())
+        if field_layout is not None:
+            properties["field_layout"] = field_layout
+
         for name in set(members).union(callable_members):
 
             # Do not mask hand written methods with autogenerated properties.
@@ -1,6 +1,7 @@
 import logging
 
 from rekall import addrspace
+from rekall import binary_profile
 from rekall import obj
 
 # Import and register all the plugins.
@@ -9,6 +10,19 @@ from rekall import session
 from rekall import testlib
 
 
+class CountingAddressSpace(addrspace.BufferAddressSpace):
+    """Counts the reads made from the buffer."""
+    __abstract = True
+
+    def __init__(self, **kwargs):
+        super(CountingAddressSpace, self).__init__(**kwargs)
+        self.reads = 0
+
+    def read(self, addr, length):
+        self.reads += 1
+        return super(CountingAddressSpace, self).read(addr, length)
+
+
 class ProfileTest(testlib.RekallBaseUnitTestCase):
     """Test the profile implementation."""
 
@@ -212,6 +226,108 @@ class ProfileTest(testlib.RekallBaseUnitTestCase):
         # Can read past the end of the array but this returns all zeros.
         self.assertEqual(test[100], 0)
 
+    def testStructSnapshot(self):
+        profile = obj.Profile.classes['Profile32Bits'](session=self.session)
+        profile.add_types({
+            'Test': [12, {
+                'First': [0, ['unsigned int']],
+                'Second': [4, ['unsigned short']],
+                'Next': [8, ['Pointer', dict(target='unsigned int')]],
+                'Chars': [4, ['Array', dict(target='unsigned char',
+                                            count=2)]],
+                }]})
+
+        address_space = CountingAddressSpace(
+            data="\x01\x00\x00\x00ab\x00\x00\x0c\x00\x00\x00"
+            "\x05\x00\x00\x00", session=self.session)
+
+        # Without snapshots every member is read separately.
+        test = profile.Object("Test", offset=0, vm=address_space)
+        self.assertEqual([test.First, test.Second, list(test.Chars)],
+                         [1, 0x6261, [0x61, 0x62]])
+        self.assertEqual(address_space.reads, 4)
+
+        profile.add_snapshot_types("Test")
+        address_space.reads = 0
+        test = profile.Object("Test", offset=0, vm=address_space)
+        self.assertEqual(
+            [test.First, test.Second, list(test.Chars), test.Next.v()],
+            [1, 0x6261, [0x61, 0x62], 12])
+        self.assertEqual(address_space.reads, 1)
+
+        # Data outside the struct is still read from the address space.
+        self.assertEqual(test.Next.deref(), 5)
+        self.assertEqual(address_space.reads, 2)
+
+    def testReadFields(self):
+        profile = obj.Profile.classes['Profile32Bits'](session=self.session)
+        profile.add_types({
+            'Test': [12, {
+                'First': [0, ['unsigned int']],
+                'Low': [0, ['unsigned short']],
+                'Second': [4, ['unsigned short']],
+                'Next': [8, ['Pointer', dict(target='unsigned int')]],
+                'Chars': [4, ['Array', dict(target='unsigned char',
+                                            count=2)]],
+                }]})
+
+        address_space = CountingAddressSpace(
+            data="\x01\x00\x00\x00ab\x00\x00\x0c\x00\x00\x00",
+            session=self.session)
+
+        test = profile.Object("Test", offset=0, vm=address_space)
+        self.assertEqual(
+            test.read_fields(["Second", "First", "Low", "Next"]),
+            [0x6261, 1, 1, 12])
+        self.assertEqual(address_space.reads, 1)
+
+        # Other members are returned as objects.
+        chars, = test.read_fields(["Chars"])
+        self.assertEqual(list(chars), [0x61, 0x62])
+
+        # Overlapping members are skipped when decoding all members at once.
+        self.assertEqual(test.read_fields(),
+                         dict(First=1, Second=0x6261, Next=12))
+        self.assertEqual(sorted(test.field_layout.fields),
+                         ["First", "Low", "Next", "Second"])
+
+    def testBinaryProfile(self):
+        data = {
+            "$METADATA": dict(ProfileClass="Profile32Bits"),
+            "$CONSTANTS": dict(foo=0x1000, bar=2**63),
+            "$ENUMS": {"Colors": {"1": "Red", "2": "Blue"}},
+            "$STRUCTS": {
+                "Test": [8, {
+                    "First": [0, ["unsigned int"]],
+                    "Second": [4, ["unsigned short"]],
+                }],
+                "Unused": [4, {"Field": [0, ["int"]]}],
+            }}
+
+        encoded = binary_profile.Encode(data)
+        self.assertTrue(binary_profile.IsBinaryProfile(encoded))
+
+        decoded = binary_profile.BinaryProfileData(encoded)
+        self.assertEqual(decoded["$METADATA"], data["$METADATA"])
+        self.assertEqual(decoded["$CONSTANTS"], data["$CONSTANTS"])
+        self.assertEqual(dict(decoded["$STRUCTS"].items()), data["$STRUCTS"])
+
+        profile = obj.Profile.LoadProfileFromData(
+            binary_profile.BinaryProfileData(encoded), session=self.session)
+        self.assertEqual(profile.get_constant("foo"), 0x1000)
+        self.assertTrue(profile.has_type("Unused"))
+
+        # Types are only decoded when they are used.
+        self.assertEqual(profile.vtypes.decoded, {})
+
+        address_space = addrspace.BufferAddressSpace(
+            data="\x01\x00\x00\x00\x02\x00\x00\x00", session=self.session)
+        test = profile.Object("Test", offset=0, vm=address_space)
+        self.assertEqual(test.First, 1)
+        self.assertEqual(test.Second, 2)
+        self.assertEqual(profile.get_enum("Colors"), {"1": "Red", "2": "Blue"})
+        self.assertEqual(profile.vtypes.decoded.keys(), ["Test"])
+
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.DEBUG)
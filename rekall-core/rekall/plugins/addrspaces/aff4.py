@@ -33,6 +33,7 @@ pip install pyaff4
 import logging
 import re
 import os
+import threading
 
 from rekall import addrspace
 from rekall import yaml_utils
@@ -54,12 +55,19 @@ LOGGER.setLevel(logging.ERROR)
 
 
 class AFF4StreamWrapper(object):
+    # Runs expose the wrappers directly (e.g. to the scanners) while the
+    # prefetching thread reads through them too. pyaff4 streams share their
+    # volume's backing file, so seeks and reads of all the streams must not be
+    # interleaved.
+    lock = threading.Lock()
+
     def __init__(self, stream):
         self.stream = stream
 
     def read(self, offset, length):
-        self.stream.seek(offset)
-        return self.stream.read(length)
+        with self.lock:
+            self.stream.seek(offset)
+            return self.stream.read(length)
 
     def end(self):
         return self.stream.Size()
@@ -97,6 +105,9 @@ class AFF4AddressSpace(addrspace.CachingAddressSpaceMixIn,
 
     order = standard.FileAddressSpace.order - 10
 
+    # Decompress chunks in the background during sequential reads.
+    PREFETCH = True
+
     def __init__(self, filename=None, **kwargs):
         super(AFF4AddressSpace, self).__init__(**kwargs)
 
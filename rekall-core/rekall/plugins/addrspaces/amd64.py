@@ -27,6 +27,11 @@
 
 import struct
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from rekall import addrspace
 from rekall import config
 from rekall import obj
@@ -119,12 +124,13 @@ class AMD64PagedMemory(intel.IA32PagedMemoryPae):
         """Returns the PML4, the base of the paging tree."""
         return self.dtb
 
-    def get_mappings(self, start=0):
-        """Enumerate all available ranges.
+    # The PTE bits which indicate that the page frame in the PTE can be used
+    # directly. If None the valid_mask is used. These PTEs are processed a
+    # whole table at a time by the vectorized walker.
+    direct_pte_mask = None
 
-        Yields Run objects for all available ranges in the virtual address
-        space.
-        """
+    def _get_mappings(self, start=0):
+        """Generate the uncoalesced runs by walking the page tables."""
         # Pages that hold PDEs and PTEs are 0x1000 bytes each.
         # Each PDE and PTE is eight bytes. Thus there are 0x1000 / 8 = 0x200
         # PDEs and PTEs we must test.
@@ -189,10 +195,17 @@ class AMD64PagedMemory(intel.IA32PagedMemoryPae):
             return
 
         data = self.base.read(pde_table_addr, 8 * 0x200)
-        pde_table = struct.unpack("<" + "Q" * 0x200, data)
+        if numpy is not None:
+            # Empty PDEs never map anything so only visit the others.
+            pde_table = numpy.frombuffer(data, dtype="<u8")
+            pde_indexes = numpy.flatnonzero(pde_table).tolist()
+            pde_table = pde_table.tolist()
+        else:
+            pde_table = struct.unpack("<" + "Q" * 0x200, data)
+            pde_indexes = range(0, 0x200)
 
         tmp2 = vaddr
-        for pde_index in range(0, 0x200):
+        for pde_index in pde_indexes:
             vaddr = tmp2 | (pde_index << 21)
 
             next_vaddr = tmp2 | ((pde_index + 1) << 21)
@@ -220,10 +233,15 @@ class AMD64PagedMemory(intel.IA32PagedMemoryPae):
                 continue
 
             data = self.base.read(pte_table_addr, 8 * 0x200)
-            pte_table = struct.unpack("<" + "Q" * 0x200, data)
-
-            for x in self._get_available_PTEs(
-                    pte_table, vaddr, start=start):
+            if numpy is not None:
+                runs = self._get_available_PTE_runs(
+                    numpy.frombuffer(data, dtype="<u8"), vaddr, start=start)
+            else:
+                runs = self._get_available_PTEs(
+                    struct.unpack("<" + "Q" * 0x200, data), vaddr,
+                    start=start)
+
+            for x in runs:
                 yield x
 
     def _get_available_PTEs(self, pte_table, vaddr, start=0):
@@ -244,6 +262,96 @@ class AMD64PagedMemory(intel.IA32PagedMemoryPae):
                                         vaddr & 0xfff),
                                 address_space=self.base)
 
+    def _get_available_PTE_runs(self, pte_table, vaddr, start=0):
+        """A vectorized version of _get_available_PTEs().
+
+        The direct PTEs (see direct_pte_mask) of the whole table are masked at
+        once and pages which are contiguous in both the virtual and physical
+        address spaces are yielded as a single run. The remaining PTEs which
+        _get_slow_PTE_indexes() selects are resolved one at a time by
+        _get_slow_PTE_run().
+
+        Args:
+          pte_table: A numpy array of 0x200 PTE values.
+          vaddr: The virtual address mapped by the first PTE.
+          start: Skip pages which end before this address.
+        """
+        # The first PTE which maps a page ending after start.
+        first = 0
+        if start > vaddr:
+            first = min(len(pte_table), (start - vaddr) >> 12)
+
+        direct_mask = self.direct_pte_mask or self.valid_mask
+        direct = (pte_table & direct_mask) != 0
+        direct[:first] = False
+
+        direct_indexes = numpy.flatnonzero(direct)
+        page_frames = pte_table[direct_indexes] & 0xffffffffff000
+
+        # Split the direct PTEs wherever the pages stop being contiguous.
+        breaks = numpy.flatnonzero(
+            (numpy.diff(direct_indexes) != 1) |
+            (numpy.diff(page_frames) != 0x1000)) + 1
+
+        run_starts = [0] + breaks.tolist()
+        run_ends = breaks.tolist() + [len(direct_indexes)]
+        direct_indexes = direct_indexes.tolist()
+        page_frames = page_frames.tolist()
+
+        slow_indexes = self._get_slow_PTE_indexes(pte_table, direct)
+        slow_indexes = [i for i in slow_indexes if i >= first]
+        slow_indexes.reverse()
+
+        for run_start, run_end in zip(run_starts, run_ends):
+            if run_start == run_end:
+                continue
+
+            first_index = direct_indexes[run_start]
+
+            # Keep the runs sorted by emitting the slow PTEs before this run.
+            while slow_indexes and slow_indexes[-1] < first_index:
+                run = self._get_slow_PTE_run(
+                    pte_table, slow_indexes.pop(), vaddr)
+                if run is not None:
+                    yield run
+
+            yield addrspace.Run(
+                start=vaddr | (first_index << 12),
+                end=vaddr | ((direct_indexes[run_end - 1] + 1) << 12),
+                file_offset=page_frames[run_start],
+                address_space=self.base)
+
+        while slow_indexes:
+            run = self._get_slow_PTE_run(pte_table, slow_indexes.pop(), vaddr)
+            if run is not None:
+                yield run
+
+    # pylint: disable=unused-argument
+    def _get_slow_PTE_indexes(self, pte_table, direct):
+        """Returns the indexes of PTEs which need to be resolved one by one.
+
+        Only valid PTEs are mapped here, so there are none. Subclasses which
+        also map invalid PTEs (e.g. through the pagefile) override this.
+
+        Args:
+          pte_table: A numpy array of PTE values.
+          direct: A boolean numpy array which is set for direct PTEs.
+        """
+        return []
+
+    def _get_slow_PTE_run(self, pte_table, index, vaddr):
+        """Resolve a single non direct PTE into a Run (or None).
+
+        Never called here since _get_slow_PTE_indexes() selects no PTEs.
+
+        Args:
+          pte_table: A numpy array of PTE values.
+          index: The index of the PTE in pte_table.
+          vaddr: The virtual address of the PTE table.
+        """
+        return None
+    # pylint: enable=unused-argument
+
     def end(self):
         return (2 ** 64) - 1
 
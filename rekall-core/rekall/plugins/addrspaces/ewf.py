@@ -42,6 +42,9 @@ class EWFAddressSpace(addrspace.CachingAddressSpaceMixIn,
     order = 20
     __image = True
 
+    # Decompress chunks in the background during sequential reads.
+    PREFETCH = True
+
     def __init__(self, **kwargs):
         super(EWFAddressSpace, self).__init__(**kwargs)
 
@@ -71,6 +71,7 @@ and returns it. This is essentially a noop for any of the other descriptors and
 therefore maintains the same speed benefits.
 
 """
+import hashlib
 import struct
 
 from rekall import addrspace
@@ -81,6 +82,11 @@ config.DeclareOption(
     "dtb", group="Autodetection Overrides",
     type="IntParser", help="The DTB physical address.")
 
+config.DeclareOption(
+    "--cache_translations", default=True, type="Boolean",
+    help="Store the virtual to physical translations of paged address "
+    "spaces in the session cache so they do not need to be walked again.")
+
 PAGE_SHIFT = 12
 PAGE_MASK = ~ 0xFFF
 
@@ -206,6 +212,9 @@ class IA32PagedMemory(addrspace.PagedReader):
 
     valid_mask = 1
 
+    # Number of page bitmaps kept in the session cache.
+    PAGE_BITMAP_CACHE_SIZE = 5000
+
     def __init__(self, name=None, dtb=None, **kwargs):
         """Instantiate an Intel 32 bit Address space over the layered AS.
 
@@ -232,6 +241,9 @@ class IA32PagedMemory(addrspace.PagedReader):
 
         self._cache = utils.FastStore(100)
 
+        # The persistent translation index (loaded lazily).
+        self._translation_index = False
+
         # Some important masks we can use.
 
         # Is the pagesize flags on?
@@ -253,12 +265,118 @@ class IA32PagedMemory(addrspace.PagedReader):
         except KeyError:
             # The TLB accepts only page aligned virtual addresses.
             aligned_vaddr = vaddr & self.PAGE_MASK
-            collection = self.describe_vtop(
-                aligned_vaddr, PhysicalAddressDescriptorCollector(self.session))
-
-            self._tlb.Put(aligned_vaddr, collection.physical_address)
+            index = self.translation_index
+            paddr = index and index.vtop(aligned_vaddr)
+            if paddr is None:
+                collection = self.describe_vtop(
+                    aligned_vaddr,
+                    PhysicalAddressDescriptorCollector(self.session))
+                paddr = collection.physical_address
+
+            self._tlb.Put(aligned_vaddr, paddr)
             return self._tlb.Get(vaddr)
 
+    @property
+    def translation_index_key(self):
+        """The cache key of the translation index.
+
+        Besides the DTB, the translations depend on what is mapped into the
+        physical address space (e.g. a pagefile), so sessions which load the
+        image differently do not share an index.
+        """
+        address_spaces = []
+        address_space = self.base
+        while address_space is not None:
+            address_spaces.append(address_space.__class__.__name__)
+            address_space = address_space.base
+
+        pagefiles = self.session.GetParameter("pagefile") or []
+        return "translation_index_%s_%#x_%s" % (
+            self.__class__.__name__, int(self.dtb),
+            hashlib.md5(repr((address_spaces, list(pagefiles)))).hexdigest())
+
+    def _get_mapped_files_start(self):
+        """Returns the lowest physical address a file is mapped at (or None).
+
+        Some physical address spaces (e.g. AFF4) map files on demand past the
+        end of the image. Where a file lands depends on the order of mapping,
+        so these addresses are not stable between sessions.
+        """
+        offsets = [offset for offset in getattr(
+            self.base, "mapped_files", {}).itervalues() if offset > 0]
+
+        if offsets:
+            return min(offsets)
+
+    @property
+    def translation_index(self):
+        """The persistent TranslationIndex for this address space (or None).
+
+        The index is only used for images which do not change (i.e. not for
+        live memory) and only if the cache_translations option is set.
+        """
+        if self._translation_index is False:
+            self._translation_index = None
+            if (not self.volatile and
+                    self.session.GetParameter("cache_translations", True)):
+                state = self.session.cache.Get(self.translation_index_key)
+                if state:
+                    self._translation_index = (
+                        addrspace.TranslationIndex.FromState(state))
+
+        return self._translation_index
+
+    def get_page_bitmap(self, start, end, page_size=0x1000):
+        """Returns a PageBitmap of the non zero pages between start and end.
+
+        Bitmaps are kept in the session cache for each DTB so that repeated
+        queries (e.g. by different plugins) do not read the pages again. The
+        returned bitmap must not be modified.
+        """
+        if self.volatile:
+            return super(IA32PagedMemory, self).get_page_bitmap(
+                start, end, page_size=page_size)
+
+        cache = self.session.GetParameter("page_bitmaps")
+        if cache == None:
+            cache = utils.FastStore(max_size=self.PAGE_BITMAP_CACHE_SIZE)
+            self.session.SetCache("page_bitmaps", cache)
+
+        key = (self.translation_index_key, start, end, page_size)
+        try:
+            return cache.Get(key)
+        except KeyError:
+            result = super(IA32PagedMemory, self).get_page_bitmap(
+                start, end, page_size=page_size)
+            cache.Put(key, result)
+
+            return result
+
+    def is_range_empty(self, start, end, page_size=0x1000):
+        """Is every page between start and end unmapped or entirely zero?
+
+        Uses the cached page bitmap of the range if there is one.
+        """
+        cache = self.session.GetParameter("page_bitmaps")
+        if not self.volatile and cache != None:
+            key = (self.translation_index_key, start, end, page_size)
+            try:
+                return not cache.Get(key)
+            except KeyError:
+                pass
+
+        return super(IA32PagedMemory, self).is_range_empty(
+            start, end, page_size=page_size)
+
+    def _read_chunk_into(self, vaddr, buffer):
+        to_read = min(len(buffer), self.PAGE_SIZE - (vaddr % self.PAGE_SIZE))
+        paddr = self.vtop(vaddr)
+        if paddr is None:
+            buffer[:to_read] = addrspace.ZEROER.GetZeros(to_read)
+            return to_read
+
+        return self.base.read_into(paddr, buffer[:to_read])
+
     def vtop_run(self, addr):
         phys_addr = self.vtop(addr)
         if phys_addr is not None:
@@ -347,12 +465,91 @@ class IA32PagedMemory(addrspace.PagedReader):
         return struct.unpack('<I', string)[0]
 
     def get_mappings(self, start=0):
-        """Enumerate all valid memory ranges.
+        """Enumerate all available ranges.
+
+        Yields Run objects for all available ranges in the virtual address
+        space. Runs which are contiguous in both the virtual and physical
+        address spaces are coalesced.
 
-        Yields:
-          tuples of (starting virtual address, size) for valid the memory
-          ranges.
+        If a translation index was stored for this address space it is used
+        instead of walking the page tables. A complete walk from the start of
+        the address space stores a new index in the session cache.
         """
+        index = self.translation_index
+        if index is not None and index.complete:
+            for run in index.get_mappings(start=start, address_space=self.base):
+                yield run
+
+            return
+
+        runs = []
+        complete = True
+        skipped_translations = self._get_skipped_translations()
+        for run in self._coalesce_runs(self._get_mappings(start=start)):
+            if run.address_space is self.base:
+                runs.append((run.start, run.file_offset, run.length))
+            else:
+                # Runs in other address spaces (e.g. the pagefile) can not be
+                # stored in the index.
+                complete = False
+
+            yield run
+
+        # Translations skipped during the walk are missing from the runs, so
+        # they must not end up in the persistent index.
+        if (start == 0 and
+                skipped_translations == self._get_skipped_translations()):
+            self._store_translation_index(runs, complete)
+
+    def _get_skipped_translations(self):
+        """Returns a count of the translations which could not be resolved.
+
+        Some address spaces can not resolve all their translations at all
+        times (e.g. windows prototype PTEs while the VADs are being listed). A
+        walk during which this count changes is not stored in the translation
+        index.
+        """
+        return 0
+
+    def _store_translation_index(self, runs, complete):
+        if (self.volatile or
+                not self.session.GetParameter("cache_translations", True)):
+            return
+
+        # Do not store translations into files mapped into the physical
+        # address space. Without them the index only speeds up vtop().
+        mapped_files_start = self._get_mapped_files_start()
+        if mapped_files_start is not None:
+            image_runs = [run for run in runs
+                          if run[1] + run[2] <= mapped_files_start]
+            if len(image_runs) != len(runs):
+                runs = image_runs
+                complete = False
+
+        index = addrspace.TranslationIndex(runs, complete=complete)
+        self._translation_index = index
+        self.session.SetCache(self.translation_index_key, index.GetState(),
+                              volatile=False)
+
+    def _coalesce_runs(self, runs):
+        last_run = None
+        for run in runs:
+            if (last_run is not None and run.start == last_run.end and
+                    run.address_space is last_run.address_space and
+                    run.file_offset == last_run.file_offset + last_run.length):
+                last_run.end = run.end
+                continue
+
+            if last_run is not None:
+                yield last_run
+
+            last_run = run
+
+        if last_run is not None:
+            yield last_run
+
+    def _get_mappings(self, start=0):
+        """Generate the uncoalesced runs by walking the page tables."""
         # Pages that hold PDEs and PTEs are 0x1000 bytes each.
         # Each PDE and PTE is four bytes. Thus there are 0x1000 / 4 = 0x400
         # PDEs and PTEs we must test
@@ -518,7 +715,7 @@ class IA32PagedMemoryPae(IA32PagedMemory):
 
             return result
 
-    def get_mappings(self, start=0):
+    def _get_mappings(self, start=0):
         """A generator of address, length tuple for all valid memory regions."""
         # Pages that hold PDEs and PTEs are 0x1000 bytes each.
         # Each PDE and PTE is eight bytes. Thus there are 0x1000 / 8 = 0x200
@@ -102,3 +102,10 @@ class LimeAddressSpace(addrspace.RunBasedAddressSpace):
             addr = smallest_address + addr
 
         return super(LimeAddressSpace, self).read(addr, length)
+
+    def read_into(self, addr, buffer):
+        smallest_address = self.runs.get_next_range_start(-1)
+        if addr > 0 and addr < smallest_address:
+            addr = smallest_address + addr
+
+        return super(LimeAddressSpace, self).read_into(addr, buffer)
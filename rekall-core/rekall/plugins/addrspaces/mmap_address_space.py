@@ -79,6 +79,19 @@ class MmapFileAddressSpace(addrspace.BaseAddressSpace):
 
         return result + addrspace.ZEROER.GetZeros(length - len(result))
 
+    def read_into(self, addr, buffer):
+        buffer = memoryview(buffer)
+        length = len(buffer)
+        read_length = 0
+        if addr != None:
+            data = self.map[addr:addr + length]
+            read_length = len(data)
+            buffer[:read_length] = data
+
+        buffer[read_length:] = addrspace.ZEROER.GetZeros(length - read_length)
+
+        return length
+
     def get_mappings(self):
         yield addrspace.Run(start=0,
                             end=self.fsize, file_offset=0,
@@ -76,6 +76,19 @@ class FDAddressSpace(addrspace.BaseAddressSpace):
         except IOError:
             return addrspace.ZEROER.GetZeros(length)
 
+    def read_into(self, addr, buffer):
+        buffer = memoryview(buffer)
+        try:
+            self.fhandle.seek(int(addr))
+            read_length = self.fhandle.readinto(buffer) or 0
+        except IOError:
+            read_length = 0
+
+        padding = len(buffer) - read_length
+        buffer[read_length:] = addrspace.ZEROER.GetZeros(padding)
+
+        return len(buffer)
+
     def read_long(self, addr):
         string = self.read(addr, 4)
         (longval,) = struct.unpack('=I', string)
@@ -32,31 +32,36 @@
 
 #pylint: disable-msg=C0111
 
-from struct import unpack
-from struct import error as StructError
+import struct
+
+UINT16 = struct.Struct("<H")
+UINT32 = struct.Struct("<L")
 
-def recombine(outbuf):
-    return "".join(outbuf[k] for k in sorted(outbuf.keys()))
 
 def xpress_decode(inputBuffer):
-    outputBuffer = {}
-    outputIndex = 0
+    """Decodes a buffer compressed with the (plain LZ77) Xpress algorithm.
+
+    The output is assembled in a bytearray. Runs of literals and back
+    references are copied as slices rather than byte by byte.
+    """
+    outputBuffer = bytearray()
+    inputLength = len(inputBuffer)
     inputIndex = 0
+    indicator = 0
     indicatorBit = 0
     nibbleIndex = 0
 
     # we are decoding the entire input here, so I have changed
     # the check to see if we're at the end of the output buffer
     # with a check to see if we still have any input left.
-    while inputIndex < len(inputBuffer):
+    while inputIndex < inputLength:
         if (indicatorBit == 0):
             # in pseudocode this was indicatorBit = ..., but that makes no
             # sense, so I think this was intended...
-            try:
-                indicator = unpack("<L", inputBuffer[inputIndex:inputIndex + 4])[0]
-            except StructError:
-                return recombine(outputBuffer)
+            if inputIndex + 4 > inputLength:
+                break
 
+            indicator = UINT32.unpack_from(inputBuffer, inputIndex)[0]
             inputIndex += 4
             indicatorBit = 32
 
@@ -65,13 +70,17 @@ def xpress_decode(inputBuffer):
         # set in indicator. For example, if indicatorBit has value 4
         # check whether the 4th bit of the value in indicator is set
         if not (indicator & (1 << indicatorBit)):
-            try:
-                outputBuffer[outputIndex] = inputBuffer[inputIndex]
-            except IndexError:
-                return recombine(outputBuffer)
-
-            inputIndex += 1
-            outputIndex += 1
+            # This is a literal. Count the literals which follow it (the
+            # clear bits below indicatorBit) and copy them all at once.
+            remaining = indicator & ((1 << indicatorBit) - 1)
+            if remaining:
+                count = indicatorBit - remaining.bit_length() + 1
+            else:
+                count = indicatorBit + 1
+
+            outputBuffer += inputBuffer[inputIndex:inputIndex + count]
+            inputIndex += count
+            indicatorBit -= count - 1
         else:
             # Get the length. This appears to use a scheme whereby if
             # the value at the current width is all ones, then we assume
@@ -82,50 +91,57 @@ def xpress_decode(inputBuffer):
             # byte used as a length nibble.
             # Thus if a nibble byte is F2, we would first use the low part (2),
             # and then at some later point get the nibble from the high part (F).
+            if inputIndex + 2 > inputLength:
+                break
 
-            try:
-                length = unpack("<H", inputBuffer[inputIndex:inputIndex + 2])[0]
-            except StructError:
-                return recombine(outputBuffer)
-
+            length = UINT16.unpack_from(inputBuffer, inputIndex)[0]
             inputIndex += 2
-            offset = length / 8
-            length = length % 8
+            offset = length >> 3
+            length = length & 7
             if length == 7:
                 if nibbleIndex == 0:
+                    if inputIndex >= inputLength:
+                        break
+
                     nibbleIndex = inputIndex
-                    length = ord(inputBuffer[inputIndex]) % 16
+                    length = ord(inputBuffer[inputIndex]) & 0xf
                     inputIndex += 1
                 else:
                     # get the high nibble of the last place a nibble sized
                     # length was used thus we don't waste that extra half
                     # byte :p
-                    length = ord(inputBuffer[nibbleIndex]) / 16
+                    length = ord(inputBuffer[nibbleIndex]) >> 4
                     nibbleIndex = 0
 
                 if length == 15:
+                    if inputIndex >= inputLength:
+                        break
+
                     length = ord(inputBuffer[inputIndex])
                     inputIndex += 1
                     if length == 255:
-                        try:
-                            length = unpack("<H", inputBuffer[inputIndex:inputIndex + 2])[0]
-                        except StructError:
-                            return recombine(outputBuffer)
+                        if inputIndex + 2 > inputLength:
+                            break
+
+                        length = UINT16.unpack_from(inputBuffer, inputIndex)[0]
                         inputIndex = inputIndex + 2
                         length = length - (15 + 7)
                     length = length + 15
                 length = length + 7
             length = length + 3
 
-            while length != 0:
-                try:
-                    outputBuffer[outputIndex] = outputBuffer[outputIndex - offset - 1]
-                except KeyError:
-                    return recombine(outputBuffer)
-                outputIndex += 1
-                length -= 1
+            start = len(outputBuffer) - offset - 1
+            if start < 0:
+                break
+
+            if length <= offset + 1:
+                outputBuffer += outputBuffer[start:start + length]
+            else:
+                # The match overlaps the output, so it repeats.
+                data = outputBuffer[start:]
+                outputBuffer += (data * (length / len(data) + 1))[:length]
 
-    return recombine(outputBuffer)
+    return str(outputBuffer)
 
 try:
     import pyxpress #pylint: disable-msg=F0401
@@ -0,0 +1,45 @@
+"""Tests for the Xpress decompressor."""
+import binascii
+
+from rekall import testlib
+from rekall.plugins.addrspaces import xpress
+
+
+class XpressTest(testlib.RekallBaseUnitTestCase):
+    """Test xpress_decode() with known compressed data."""
+
+    # The examples in MS-XCA 3.1.
+    LITERALS = (
+        binascii.unhexlify("3f000000") + "abcdefghijklmnopqrstuvwxyz",
+        "abcdefghijklmnopqrstuvwxyz")
+
+    REPEATED = (
+        binascii.unhexlify("ffffff1f61626317000fff2601"),
+        "abc" * 100)
+
+    def testKnownData(self):
+        for compressed, plain in (self.LITERALS, self.REPEATED):
+            self.assertEqual(xpress.xpress_decode(compressed), plain)
+
+    def testOverlappingMatches(self):
+        # A literal followed by two matches at offset 1. Their lengths (11
+        # and 12) share the low and high nibble of one byte.
+        self.assertEqual(
+            xpress.xpress_decode("\xff\xff\xff\x7fa\x07\x00\x21\x07\x00"),
+            "a" * 24)
+
+    def testTruncatedData(self):
+        # Truncated data decompresses up to where it ends.
+        for compressed, plain in (self.LITERALS, self.REPEATED):
+            for length in range(len(compressed)):
+                result = xpress.xpress_decode(compressed[:length])
+                self.assertTrue(plain.startswith(result))
+
+        # The match is incomplete.
+        self.assertEqual(
+            xpress.xpress_decode(self.REPEATED[0][:-1]), "abc")
+
+    def testInvalidMatch(self):
+        # The match points before the start of the output.
+        self.assertEqual(
+            xpress.xpress_decode("\xff\xff\xff\x3fab\x10\x00"), "ab")
@@ -110,6 +110,9 @@ class AddressResolverMixin(object):
         r"(?P<op> *[+-] *)?"            # Possible arithmetic operator.
         r"(?P<offset>[0-9a-fA-Fx]+)?")  # Possible hex offset.
 
+    # The number of formatted addresses to remember.
+    FORMAT_CACHE_SIZE = 10000
+
     def __init__(self, **kwargs):
         super(AddressResolverMixin, self).__init__(**kwargs)
 
@@ -119,6 +122,11 @@ class AddressResolverMixin(object):
         # A lookup between module names and the Module object itself.
         self._modules_by_name = {}
 
+        # Maps (address, max_distance) to the symbols of the address and the
+        # state of its module when they were formatted. Address resolvers are
+        # cached per process context in the session.
+        self._format_cache = utils.FastStore(max_size=self.FORMAT_CACHE_SIZE)
+
         self._initialized = False
 
     def NormalizeModuleName(self, module_name):
@@ -136,6 +144,8 @@ class AddressResolverMixin(object):
         if module.name:
             self._modules_by_name[module.name] = module
 
+        self._format_cache.Flush()
+
     def _ParseAddress(self, name):
         """Parses the symbol from Rekall symbolic notation.
 
@@ -292,10 +302,76 @@ class AddressResolverMixin(object):
         """
         self._EnsureInitialized()
 
-        _, symbols = self.get_nearest_constant_by_address(
-            address, max_distance=max_distance)
+        address = obj.Pointer.integer_to_address(address)
+        return self._format_address_in_module(
+            self.GetContainingModule(address), address, max_distance)
+
+    def format_addresses(self, addresses, max_distance=0x1000000):
+        """Format many addresses as symbol names at once.
+
+        The addresses are sorted and matched to their containing modules in a
+        single pass over the module map.
+
+        Returns:
+          A list with the symbol names of each address (as returned by
+          format_address()), in the same order as the addresses.
+        """
+        self._EnsureInitialized()
+
+        addresses = [obj.Pointer.integer_to_address(x) for x in addresses]
+
+        symbols = {}
+        modules = list(self._address_ranges)
+        module_index = -1
+        for address in sorted(set(addresses)):
+            # Find the last module starting at or below the address (like
+            # RangedCollection.get_containing_range()).
+            while (module_index + 1 < len(modules) and
+                   modules[module_index + 1][0] <= address):
+                module_index += 1
+
+            module = None
+            if module_index >= 0 and address < modules[module_index][1]:
+                module = modules[module_index][2]
+
+            symbols[address] = self._format_address_in_module(
+                module, address, max_distance)
 
-        return sorted(symbols)
+        return [list(symbols[x]) for x in addresses]
+
+    def _get_module_state(self, module):
+        """The state of the module which the symbols of its addresses use."""
+        if not module:
+            return None, None, None
+
+        profile = module.profile
+        if profile == None:
+            profile = None
+
+        # Profiles may be rebased after they are loaded.
+        return module, profile, getattr(profile, "image_base", None)
+
+    def _format_address_in_module(self, module, address, max_distance):
+        state = self._get_module_state(module)
+        try:
+            cached_state, symbols = self._format_cache.Get(
+                (address, max_distance))
+
+            # The module's profile may have been loaded or rebased since.
+            if (cached_state[0] is state[0] and
+                    cached_state[1] is state[1] and
+                    cached_state[2] == state[2]):
+                return list(symbols)
+        except KeyError:
+            pass
+
+        _, symbols = self._get_nearest_constant_in_module(
+            module, address, max_distance)
+
+        symbols = sorted(symbols)
+        self._format_cache.Put((address, max_distance), (state, symbols))
+
+        return list(symbols)
 
     def get_nearest_constant_by_address(self, address, max_distance=0x1000000):
         """Searches for a known symbol at an address lower than this.
@@ -305,8 +381,13 @@ class AddressResolverMixin(object):
         self._EnsureInitialized()
 
         address = obj.Pointer.integer_to_address(address)
-        symbols = []
         module = self.GetContainingModule(address)
+
+        return self._get_nearest_constant_in_module(
+            module, address, max_distance)
+
+    def _get_nearest_constant_in_module(self, module, address, max_distance):
+        symbols = []
         if not module or not module.name:
             return (-1, [])
 
@@ -0,0 +1,95 @@
+"""Tests for the address resolver."""
+
+from rekall import session
+from rekall import testlib
+from rekall.plugins.common import address_resolver
+from rekall.plugins.overlays.windows import pe_vtypes
+
+
+class StaticAddressResolver(address_resolver.AddressResolverMixin):
+    """An address resolver over fixed modules."""
+
+    def __init__(self, session=None, modules=()):
+        super(StaticAddressResolver, self).__init__()
+        self.session = session
+        for module in modules:
+            self.AddModule(module)
+
+
+class AddressResolverTest(testlib.RekallBaseUnitTestCase):
+    """Test the bulk symbolization of addresses."""
+
+    def setUp(self):
+        self.session = session.Session()
+        self.profile = self._Profile(0x10000, FuncA=0x10, FuncB=0x200,
+                                     FuncC=0x200)
+
+        self.modules = [
+            address_resolver.Module(
+                name="mod", start=0x10000, end=0x20000, profile=self.profile,
+                session=self.session),
+            # A module without a profile.
+            address_resolver.Module(
+                name="noprofile", start=0x30000, end=0x40000,
+                session=self.session),
+            # Directly follows the previous module.
+            address_resolver.Module(
+                name="next", start=0x40000, end=0x41000,
+                profile=self._Profile(0x40000, Next=0),
+                session=self.session),
+        ]
+
+    def _Profile(self, image_base, **constants):
+        profile = pe_vtypes.BasicPEProfile(name="test", session=self.session)
+        profile.image_base = image_base
+        profile.add_constants(constants)
+        return profile
+
+    def _Resolver(self):
+        return StaticAddressResolver(session=self.session,
+                                     modules=self.modules)
+
+    addresses = [0x10200, 0x10010, 0x10000, 0x10300, 0x10010, 0x1ffff,
+                 0x20000, 0x5, 0x30000, 0x30123, 0x3ffff, 0x40000, 0x40010,
+                 0x41000, 0xffffffffffff]
+
+    def testFormatAddresses(self):
+        expected = [self._Resolver().format_address(x)
+                    for x in self.addresses]
+
+        self.assertEqual(expected[:4], [["mod!FuncB", "mod!FuncC"],
+                                        ["mod!FuncA"],
+                                        ["mod"],
+                                        ["mod!FuncB+0x100", "mod!FuncC+0x100"]])
+        self.assertEqual(expected[6:8], [[], []])
+
+        # Cold and warm cache.
+        resolver = self._Resolver()
+        self.assertEqual(resolver.format_addresses(self.addresses), expected)
+        self.assertEqual(resolver.format_addresses(self.addresses), expected)
+        self.assertEqual(resolver.format_addresses(iter(self.addresses)),
+                         expected)
+
+        resolver = self._Resolver()
+        self.assertEqual(
+            resolver.format_addresses(self.addresses, max_distance=0x80),
+            [resolver.format_address(x, max_distance=0x80)
+             for x in self.addresses])
+
+    def testProfileChanges(self):
+        resolver = self._Resolver()
+        self.assertEqual(resolver.format_addresses([0x10010, 0x30010]),
+                         [["mod!FuncA"], ["noprofile+0x10"]])
+
+        # The profile is rebased.
+        self.profile.image_base = 0x10100
+        self.assertEqual(resolver.format_address(0x10010), ["mod+0x10"])
+        self.assertEqual(resolver.format_addresses([0x10110, 0x10010]),
+                         [["mod!FuncA"], ["mod+0x10"]])
+
+        # A profile is loaded for the module.
+        self.modules[1].profile = self._Profile(0x30000, Loaded=0x10)
+        self.assertEqual(resolver.format_address(0x30010),
+                         ["noprofile!Loaded"])
+        self.assertEqual(resolver.format_addresses([0x30010]),
+                         [["noprofile!Loaded"]])
@@ -116,6 +116,7 @@ class MemDumpMixin(core.DirectoryDumperMixin, MemmapMixIn):
             # Only dump the userspace portion of addressable memory.
             max_memory = self.session.GetParameter("highest_usermode_address")
             blocksize = 1024 * 1024
+            buffer = memoryview(bytearray(blocksize))
 
             for run in task_as.get_address_ranges(end=max_memory):
                 for offset in utils.xrange(run.start, run.end, blocksize):
@@ -123,8 +124,8 @@ class MemDumpMixin(core.DirectoryDumperMixin, MemmapMixIn):
                     if to_read == 0:
                         break
 
-                    data = task_as.read(offset, to_read)
-                    fd.write(data)
+                    read_length = task_as.read_into(offset, buffer[:to_read])
+                    fd.write(buffer[:read_length])
 
                     # Write the index file.
                     temp_renderer.table_row(fd.tell(), to_read, offset)
@@ -25,6 +25,11 @@
 import bisect
 import collections
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from rekall import testlib
 from rekall.ui import json_renderer
 
@@ -40,6 +45,15 @@ class Pas2VasResolver(object):
         self.dtb2maps = {}
         self.dtb2userspace = {}
 
+        # Numpy versions of the maps in dtb2maps for bulk lookups.
+        self.dtb2arrays = {}
+
+        # The run starts and running maximum run ends of the maps.
+        self.dtb2indexes = {}
+
+        # Userspace only views of full maps in dtb2maps.
+        self.dtb2usermaps = {}
+
         # Add the kernel.
         self.dtb2task[self.session.GetParameter("dtb")] = "Kernel"
 
@@ -59,10 +73,7 @@ class Pas2VasResolver(object):
         """
         return address
 
-    def PA2VA_for_DTB(self, physical_address, dtb, userspace=None):
-        if dtb == None:
-            return None, None
-
+    def _get_lookup_map(self, dtb, userspace=None):
         # Choose the userspace mode automatically.
         if userspace is None:
             userspace = dtb != self.session.kernel_address_space.dtb
@@ -80,24 +91,151 @@ class Pas2VasResolver(object):
                 dtb, userspace=userspace)
             self.dtb2userspace[dtb] = userspace
 
-        if lookup_map:
-            if physical_address > lookup_map[0][0]:
-                # This efficiently finds the entry in the map just below the
-                # physical_address.
-                lookup_pa, length, lookup_va = lookup_map[
-                    bisect.bisect(
-                        lookup_map, (physical_address, 2**64, 0, 0))-1]
-
-                if (lookup_pa <= physical_address and
-                        lookup_pa + length > physical_address):
-                    # Yield the pid and the virtual offset
-                    task = self.dtb2task.get(dtb)
-                    if task is not None:
-                        task = self.GetTaskStruct(task)
-                    else:
-                        task = "Kernel"
-
-                    return lookup_va + physical_address - lookup_pa, task
+        # The cached map covers the kernel too (e.g. the System process shares
+        # the kernel's DTB), but only userspace was asked for.
+        elif userspace and not self.dtb2userspace.get(dtb):
+            lookup_map = self._get_userspace_map(dtb, lookup_map)
+
+        return lookup_map
+
+    def _get_userspace_map(self, dtb, lookup_map):
+        """Returns the userspace part of a full lookup map."""
+        cached_map, user_map = self.dtb2usermaps.get(dtb, (None, None))
+        if cached_map is not lookup_map:
+            highest_virtual_address = self.session.GetParameter(
+                "highest_usermode_address")
+            user_map = [x for x in lookup_map
+                        if x[2] <= highest_virtual_address]
+            self.dtb2usermaps[dtb] = (lookup_map, user_map)
+
+        return user_map
+
+    def _get_lookup_index(self, dtb, userspace=None):
+        """Returns the map for dtb with its run starts and maximum ends.
+
+        Runs in the map may overlap (e.g. an alias of part of a large direct
+        mapping), so the run starting just below an address does not always
+        cover it. The maximum end of all the runs up to each run tells when
+        no earlier run can cover the address.
+        """
+        lookup_map = self._get_lookup_map(dtb, userspace=userspace)
+        cached_map, starts, max_ends = self.dtb2indexes.get(
+            (dtb, userspace), (None, None, None))
+        if cached_map is not lookup_map:
+            starts = []
+            max_ends = []
+            max_end = 0
+            for pa, length, _ in lookup_map:
+                max_end = max(max_end, pa + length)
+                starts.append(pa)
+                max_ends.append(max_end)
+
+            self.dtb2indexes[dtb, userspace] = (lookup_map, starts, max_ends)
+
+        return lookup_map, starts, max_ends
+
+    def _get_lookup_arrays(self, dtb, userspace=None):
+        """Returns the map for dtb as arrays of (pa, length, va, max end)."""
+        lookup_map, _, max_ends = self._get_lookup_index(
+            dtb, userspace=userspace)
+        cached_map, arrays = self.dtb2arrays.get(
+            (dtb, userspace), (None, None))
+        if cached_map is not lookup_map:
+            arrays = numpy.array(
+                [x + (max_end,) for x, max_end in zip(lookup_map, max_ends)],
+                dtype="<u8").reshape(-1, 4).transpose()
+            self.dtb2arrays[dtb, userspace] = (lookup_map, arrays)
+
+        return arrays
+
+    def PA2VA_for_DTBs(self, physical_addresses, dtbs, userspace=None):
+        """Resolves many physical addresses in many address spaces at once.
+
+        Args:
+          physical_addresses: A list of physical addresses.
+          dtbs: A list of DTBs to search.
+          userspace: Either a single value for all the DTBs or a list with a
+            value for each DTB. If None, only userspace is searched for DTBs
+            other than the kernel's (like PA2VA_for_DTB()).
+
+        Returns:
+          A list of (address index, dtb index, virtual address) tuples sorted
+          by the index of the physical address, then the index of the DTB.
+        """
+        if not isinstance(userspace, (list, tuple)):
+            userspace = [userspace] * len(dtbs)
+
+        result = []
+        if numpy is None:
+            for dtb_index, dtb in enumerate(dtbs):
+                for index, physical_address in enumerate(physical_addresses):
+                    virtual_address, _ = self.PA2VA_for_DTB(
+                        physical_address, dtb, userspace=userspace[dtb_index])
+                    if virtual_address is not None:
+                        result.append((index, dtb_index, virtual_address))
+
+            result.sort()
+            return result
+
+        addresses = numpy.asarray(physical_addresses, dtype="<u8")
+        for dtb_index, dtb in enumerate(dtbs):
+            if dtb == None:
+                continue
+
+            starts, lengths, virtual_starts, max_ends = (
+                self._get_lookup_arrays(dtb, userspace=userspace[dtb_index]))
+            if not len(starts):
+                continue
+
+            # The run just below each address, then the runs before it while
+            # one of them may still cover the address (like PA2VA_for_DTB).
+            runs = numpy.searchsorted(starts, addresses, side="right") - 1
+            pending = numpy.flatnonzero(runs >= 0)
+            while len(pending):
+                pending_runs = runs[pending]
+                pending = pending[
+                    max_ends[pending_runs] > addresses[pending]]
+                pending_runs = runs[pending]
+
+                offsets = addresses[pending] - starts[pending_runs]
+                found = offsets < lengths[pending_runs]
+                indexes = pending[found]
+                virtual_addresses = (
+                    virtual_starts[pending_runs[found]] + offsets[found])
+                result.extend(zip(indexes.tolist(), [dtb_index] * len(indexes),
+                                  virtual_addresses.tolist()))
+
+                pending = pending[~found]
+                runs[pending] -= 1
+                pending = pending[runs[pending] >= 0]
+
+        result.sort()
+        return result
+
+    def PA2VA_for_DTB(self, physical_address, dtb, userspace=None):
+        if dtb == None:
+            return None, None
+
+        lookup_map, starts, max_ends = self._get_lookup_index(
+            dtb, userspace=userspace)
+
+        # This efficiently finds the entry in the map just below the
+        # physical_address. Earlier runs may still cover the address if they
+        # overlap it.
+        index = bisect.bisect(starts, physical_address) - 1
+        while index >= 0 and max_ends[index] > physical_address:
+            lookup_pa, length, lookup_va = lookup_map[index]
+            if lookup_pa + length > physical_address:
+                # Yield the pid and the virtual offset
+                task = self.dtb2task.get(dtb)
+                if task is not None:
+                    task = self.GetTaskStruct(task)
+                else:
+                    task = "Kernel"
+
+                return lookup_va + physical_address - lookup_pa, task
+
+            index -= 1
 
         return None, None
 
@@ -126,8 +264,21 @@ class Pas2VasResolver(object):
                 self.session.report_progress(
                     "Enumerating memory for dtb %#x (%#x)", dtb, run.start)
 
-            # Now sort the map and return it.
+            # Now sort the map and merge runs which are contiguous in both the
+            # physical and virtual address spaces.
             tmp_lookup_map.sort()
+            merged = []
+            for pa, length, va in tmp_lookup_map:
+                if merged:
+                    last_pa, last_length, last_va = merged[-1]
+                    if (last_pa + last_length == pa and
+                            last_va + last_length == va):
+                        merged[-1] = (last_pa, last_length + length, last_va)
+                        continue
+
+                merged.append((pa, length, va))
+
+            tmp_lookup_map = merged
 
         return tmp_lookup_map
 
@@ -193,6 +344,33 @@ class Pas2VasMixin(object):
             if virtual_offset is not None:
                 yield virtual_offset, task
 
+    def get_virtual_addresses(self, physical_addresses, tasks=None):
+        """Resolves many physical addresses at once.
+
+        Returns:
+          A list of (physical address, virtual address, task) tuples in the
+          order of physical_addresses. Kernel addresses have the task "Kernel".
+        """
+        resolver = self.session.GetParameter("physical_address_resolver")
+
+        if tasks is None:
+            tasks = list(self.filter_processes())
+
+        # The kernel is searched first, followed by the userspace of each
+        # process (like get_virtual_address()).
+        owners = ["Kernel"] + tasks
+        dtbs = [self.session.kernel_address_space.dtb]
+        dtbs.extend(task.dtb for task in tasks)
+        userspace = [False] + [True] * len(tasks)
+
+        result = []
+        for index, dtb_index, virtual_address in resolver.PA2VA_for_DTBs(
+                physical_addresses, dtbs, userspace=userspace):
+            result.append((physical_addresses[index], virtual_address,
+                           owners[dtb_index]))
+
+        return result
+
     def render(self, renderer):
         renderer.table_header([('Physical', 'virtual_offset', '[addrpad]'),
                                ('Virtual', 'physical_offset', '[addrpad]'),
@@ -200,16 +378,15 @@ class Pas2VasMixin(object):
                                ('Name', 'name', '')])
 
         tasks = list(self.filter_processes())
-        for physical_address in self.physical_address:
-            for virtual_address, task in self.get_virtual_address(
-                    physical_address, tasks):
-                if task is 'Kernel':
-                    renderer.table_row(physical_address, virtual_address,
-                                       0, 'Kernel')
-                else:
-                    renderer.table_row(
-                        physical_address, virtual_address,
-                        task.pid, task.name)
+        for physical_address, virtual_address, task in (
+                self.get_virtual_addresses(self.physical_address, tasks)):
+            if task is 'Kernel':
+                renderer.table_row(physical_address, virtual_address,
+                                   0, 'Kernel')
+            else:
+                renderer.table_row(
+                    physical_address, virtual_address,
+                    task.pid, task.name)
 
 
 class Pas2VasResolverJsonObjectRenderer(json_renderer.StateBasedObjectRenderer):
@@ -0,0 +1,134 @@
+"""Tests for the physical to virtual address resolver."""
+
+from rekall import session
+from rekall import testlib
+from rekall.plugins.common import pas2kas
+
+
+class StaticResolver(pas2kas.Pas2VasResolver):
+    """A resolver over fixed address maps."""
+
+    def __init__(self, session=None, maps=None):
+        # Do not list the processes.
+        self.session = session
+        self.dirty = False
+        self.dtb2task = {}
+        self.dtb2maps = {}
+        self.dtb2userspace = {}
+        self.dtb2arrays = {}
+        self.dtb2indexes = {}
+        self.dtb2usermaps = {}
+
+        for dtb, (userspace, lookup_map) in maps.items():
+            self.dtb2maps[dtb] = lookup_map
+            self.dtb2userspace[dtb] = userspace
+
+
+class Pas2VasResolverTest(testlib.RekallBaseUnitTestCase):
+    """Test the bulk resolution of physical addresses."""
+
+    KERNEL_DTB = 0x1000
+    PROCESS_DTB = 0x2000
+    DIRECT_MAP_DTB = 0x3000
+
+    def setUp(self):
+        self.session = session.Session()
+        with self.session:
+            self.session.SetParameter("highest_usermode_address", 0x7fffffff)
+
+        self.resolver = StaticResolver(session=self.session, maps={
+            # The full kernel map - (pa, length, va) sorted by pa.
+            self.KERNEL_DTB: (False, [(0x10000, 0x2000, 0x80001000),
+                                      (0x20000, 0x1000, 0x400000)]),
+
+            # A process which maps some of the kernel's physical pages.
+            self.PROCESS_DTB: (True, [(0x10000, 0x1000, 0x500000),
+                                      (0x30000, 0x1000, 0x600000)]),
+
+            # A large direct map with aliases of some of its pages, which
+            # start inside it.
+            self.DIRECT_MAP_DTB: (False, [
+                (0x0, 0x100000, 0xffff880000000000),
+                (0x2000, 0x1000, 0xffffffff81000000),
+                (0x3000, 0x2000, 0xffffffffa0000000),
+                (0x4000, 0x1000, 0xffffffffc0000000)]),
+        })
+
+    # The kernel, a System like process sharing the kernel's DTB and another
+    # process.
+    dtbs = [KERNEL_DTB, KERNEL_DTB, PROCESS_DTB]
+    userspace = [False, True, True]
+
+    addresses = [0x10800, 0x20010, 0x30fff, 0x40000, 0xffff]
+
+    expected = [(0, 0, 0x80001800),
+                (0, 2, 0x500800),
+                (1, 0, 0x400010),
+                (1, 1, 0x400010),
+                (2, 2, 0x600fff)]
+
+    def testPA2VAForDTBs(self):
+        self.assertEqual(
+            self.resolver.PA2VA_for_DTBs(
+                self.addresses, self.dtbs, userspace=self.userspace),
+            self.expected)
+
+        # The bulk lookup matches single address lookups.
+        single = []
+        for index, address in enumerate(self.addresses):
+            for dtb_index, dtb in enumerate(self.dtbs):
+                virtual_address, _ = self.resolver.PA2VA_for_DTB(
+                    address, dtb, userspace=self.userspace[dtb_index])
+                if virtual_address is not None:
+                    single.append((index, dtb_index, virtual_address))
+
+        self.assertEqual(single, self.expected)
+
+    overlapping_addresses = [0x50000, 0x2800, 0x1000, 0x4800, 0x5000,
+                             0x100000]
+
+    overlapping_expected = [(0, 0, 0xffff880000050000),
+                            (1, 0, 0xffffffff81000800),
+                            (2, 0, 0xffff880000001000),
+                            (3, 0, 0xffffffffc0000800),
+                            (4, 0, 0xffff880000005000)]
+
+    def testPA2VAForOverlappingRuns(self):
+        # The run with the highest start which covers the address is used.
+        for index, _, virtual_address in self.overlapping_expected:
+            self.assertEqual(
+                self.resolver.PA2VA_for_DTB(
+                    self.overlapping_addresses[index], self.DIRECT_MAP_DTB,
+                    userspace=False),
+                (virtual_address, "Kernel"))
+
+        self.assertEqual(
+            self.resolver.PA2VA_for_DTB(
+                0x100000, self.DIRECT_MAP_DTB, userspace=False),
+            (None, None))
+
+        self.assertEqual(
+            self.resolver.PA2VA_for_DTBs(
+                self.overlapping_addresses, [self.DIRECT_MAP_DTB],
+                userspace=False),
+            self.overlapping_expected)
+
+        old_numpy, pas2kas.numpy = pas2kas.numpy, None
+        try:
+            self.assertEqual(
+                self.resolver.PA2VA_for_DTBs(
+                    self.overlapping_addresses, [self.DIRECT_MAP_DTB],
+                    userspace=False),
+                self.overlapping_expected)
+        finally:
+            pas2kas.numpy = old_numpy
+
+    def testPA2VAForDTBsWithoutNumpy(self):
+        old_numpy, pas2kas.numpy = pas2kas.numpy, None
+        try:
+            self.assertEqual(
+                self.resolver.PA2VA_for_DTBs(
+                    self.addresses, self.dtbs, userspace=self.userspace),
+                self.expected)
+        finally:
+            pas2kas.numpy = old_numpy
@@ -1 +1,4 @@
 # pylint: disable=unused-import
+
+from rekall.plugins.common import address_resolver_test
+from rekall.plugins.common import pas2kas_test
@@ -28,12 +28,10 @@ https://github.com/libyal/reviveit/
 https://github.com/sleuthkit/sleuthkit/blob/develop/tsk/fs/ntfs.c
 """
 import array
-import cStringIO
 import logging
 import struct
 
 
-
 def get_displacement(offset):
     """Calculate the displacement."""
     result = 0
@@ -52,9 +50,15 @@ SIGNATURE_MASK = 3 << 12
 SIZE_MASK = (1 << 12) - 1
 TAG_MASKS = [(1 << i) for i in range(0, 8)]
 
+UINT16 = struct.Struct("<H")
+
 
 def decompress_data(cdata, logger=None):
-    """Decompresses the data."""
+    """Decompresses the data.
+
+    The output is assembled in a bytearray. Runs of literals and back
+    references are copied as slices rather than byte by byte.
+    """
 
     if not logger:
         lznt1_logger = logging.getLogger("ntfs.lznt1")
@@ -62,67 +66,79 @@ def decompress_data(cdata, logger=None):
         lznt1_logger = logger.getChild("lznt1")
     # Change to DEBUG to turn on module level debugging.
     lznt1_logger.setLevel(logging.ERROR)
-    in_fd = cStringIO.StringIO(cdata)
-    output_fd = cStringIO.StringIO()
-    block_end = 0
+    debug = lznt1_logger.isEnabledFor(logging.DEBUG)
+
+    output = bytearray()
+    input_length = len(cdata)
+    offset = 0
+
+    while offset + 2 <= input_length:
+        block_offset = offset
+        uncompressed_chunk_offset = len(output)
 
-    while in_fd.tell() < len(cdata):
-        block_offset = in_fd.tell()
-        uncompressed_chunk_offset = output_fd.tell()
+        block_header = UINT16.unpack_from(cdata, offset)[0]
+        offset += 2
+        if debug:
+            lznt1_logger.debug("Header %#x @ %#x", block_header, block_offset)
 
-        block_header = struct.unpack("<H", in_fd.read(2))[0]
-        lznt1_logger.debug("Header %#x @ %#x", block_header, block_offset)
         if block_header & SIGNATURE_MASK != SIGNATURE_MASK:
             break
 
         size = (block_header & SIZE_MASK)
-        lznt1_logger.debug("Block size %s", size + 3)
-
-        block_end = block_offset + size + 3
-
-        if block_header & COMPRESSED_MASK:
-            while in_fd.tell() < block_end:
-                header = ord(in_fd.read(1))
-                lznt1_logger.debug("Tag %#x", header)
-                for mask in TAG_MASKS:
-                    if in_fd.tell() >= block_end:
-                        break
-
-                    if header & mask:
-                        pointer = struct.unpack("<H", in_fd.read(2))[0]
-                        displacement = DISPLACEMENT_TABLE[
-                            output_fd.tell() - uncompressed_chunk_offset - 1]
-
-                        symbol_offset = (pointer >> (12 - displacement)) + 1
-                        symbol_length = (pointer & (0xFFF >> displacement)) + 3
-
-                        output_fd.seek(-symbol_offset, 2)
-                        data = output_fd.read(symbol_length)
+        block_end = min(block_offset + size + 3, input_length)
 
-                        # Pad the data to make it fit.
-                        if 0 < len(data) < symbol_length:
-                            data = data * (symbol_length / len(data) + 1)
-                            data = data[:symbol_length]
-
-                        output_fd.seek(0, 2)
-                        lznt1_logger.debug(
-                            "Wrote %s @ %s/%s: Phrase %s %s %x",
-                            len(data), in_fd.tell(),
-                            output_fd.tell(), symbol_length, symbol_offset,
-                            pointer)
-
-                        output_fd.write(data)
-
-                    else:
-                        data = in_fd.read(1)
-                        lznt1_logger.debug("Symbol %#x", ord(data))
-                        output_fd.write(data)
-
-        else:
+        if not block_header & COMPRESSED_MASK:
             # Block is not compressed
-            data = in_fd.read(size + 1)
-            output_fd.write(data)
-
-    result = output_fd.getvalue()
-
-    return result
+            output += cdata[offset:offset + size + 1]
+            offset += size + 1
+            continue
+
+        while offset < block_end:
+            tag = ord(cdata[offset])
+            offset += 1
+
+            bit = 0
+            while bit < 8 and offset < block_end:
+                remaining = tag >> bit
+                if not remaining & 1:
+                    # Copy the run of literals up to the next phrase.
+                    if remaining:
+                        count = (remaining & -remaining).bit_length() - 1
+                    else:
+                        count = 8 - bit
+
+                    end = min(offset + count, block_end)
+                    output += cdata[offset:end]
+                    offset = end
+                    bit += count
+                    continue
+
+                # The input is truncated.
+                if offset + 2 > block_end:
+                    return str(output)
+
+                bit += 1
+                pointer = UINT16.unpack_from(cdata, offset)[0]
+                offset += 2
+
+                displacement = DISPLACEMENT_TABLE[
+                    len(output) - uncompressed_chunk_offset - 1]
+
+                symbol_offset = (pointer >> (12 - displacement)) + 1
+                symbol_length = (pointer & (0xFFF >> displacement)) + 3
+
+                start = len(output) - symbol_offset
+                if start < 0:
+                    lznt1_logger.error(
+                        "Invalid back reference @ %#x", offset - 2)
+                    return str(output)
+
+                if symbol_length <= symbol_offset:
+                    output += output[start:start + symbol_length]
+                else:
+                    # The phrase overlaps the output, so it repeats.
+                    data = output[start:]
+                    output += (data * (symbol_length / len(data) + 1))[
+                        :symbol_length]
+
+    return str(output)
@@ -0,0 +1,123 @@
+"""Tests for the LZNT1 decompressor."""
+import binascii
+import random
+import struct
+
+from rekall import testlib
+from rekall.plugins.filesystems import lznt1
+
+
+def CompressLZNT1(data, chunk_size=0x1000):
+    """A simple greedy LZNT1 compressor used to build test data."""
+    result = []
+    for chunk_start in range(0, len(data), chunk_size):
+        chunk = data[chunk_start:chunk_start + chunk_size]
+        output = []
+        position = 0
+        while position < len(chunk):
+            tag = 0
+            tokens = []
+            for bit in range(8):
+                if position >= len(chunk):
+                    break
+
+                best_length = best_offset = 0
+                if position > 0:
+                    displacement = lznt1.DISPLACEMENT_TABLE[position - 1]
+                    max_offset = min(position, 1 << (4 + displacement))
+                    max_length = (0xFFF >> displacement) + 3
+
+                    for offset in range(1, max_offset + 1):
+                        length = 0
+                        while (length < max_length and
+                               position + length < len(chunk) and
+                               chunk[position + length - offset] ==
+                               chunk[position + length]):
+                            length += 1
+
+                        if length > best_length:
+                            best_length, best_offset = length, offset
+
+                if best_length >= 3:
+                    tag |= 1 << bit
+                    tokens.append(struct.pack(
+                        "<H", ((best_offset - 1) << (12 - displacement)) |
+                        (best_length - 3)))
+                    position += best_length
+                else:
+                    tokens.append(chunk[position])
+                    position += 1
+
+            output.append(chr(tag) + "".join(tokens))
+
+        compressed = "".join(output)
+        result.append(struct.pack("<H", 0xB000 | (len(compressed) - 1)))
+        result.append(compressed)
+
+    return "".join(result)
+
+
+class LZNT1Test(testlib.RekallBaseUnitTestCase):
+    """Test decompress_data() with known compressed data."""
+
+    # The example in MS-XCA 3.2.
+    PLAIN = ("F# F# G A A G F# E D D E F# F# E E F# F# G A A G F# E D D E F# "
+             "E D D E E F# D E F# G F# D E F# G F# E D E A F# F# G A A G F# "
+             "E D D E F# E D D\x00")
+
+    COMPRESSED = binascii.unhexlify(
+        "38b08846232000204720410010a24701a045204400084501507900c0452005241388"
+        "05b4024a44ef0358028c091601484500be009e000401189000")
+
+    def testKnownData(self):
+        self.assertEqual(lznt1.decompress_data(self.COMPRESSED), self.PLAIN)
+
+    def testOverlappingBackReference(self):
+        # "abc" followed by a phrase of 9 bytes at offset 3.
+        self.assertEqual(
+            lznt1.decompress_data("\x05\xb0\x08abc\x06\x20"),
+            "abcabcabcabc")
+
+        # A run of 20 bytes repeating the last byte.
+        self.assertEqual(
+            lznt1.decompress_data("\x04\xb0\x04xy\x11\x00"),
+            "x" + "y" * 21)
+
+    def testStoredChunks(self):
+        # An uncompressed chunk followed by a compressed one. The back
+        # reference may not reach into the previous chunk.
+        self.assertEqual(
+            lznt1.decompress_data("\x02\x30xyz" + "\x05\xb0\x08abc\x06\x20"),
+            "xyzabcabcabcabc")
+
+        # A zero header ends the data.
+        self.assertEqual(
+            lznt1.decompress_data("\x02\x30xyz\x00\x00\x02\x30abc"), "xyz")
+
+    def testRoundTrip(self):
+        rand = random.Random(1)
+        words = ["alpha", "beta", "gamma", "delta", "\x00" * 20, "\xff"]
+        plain = "".join(rand.choice(words) for _ in range(300))
+
+        for chunk_size in (0x100, 0x1000):
+            self.assertEqual(
+                lznt1.decompress_data(CompressLZNT1(plain, chunk_size)),
+                plain)
+
+    def testTruncatedData(self):
+        # Truncated data decompresses up to where it ends.
+        for length in range(len(self.COMPRESSED)):
+            result = lznt1.decompress_data(self.COMPRESSED[:length])
+            self.assertTrue(self.PLAIN.startswith(result))
+
+        # The first 8 bytes end with the first phrase.
+        self.assertEqual(
+            lznt1.decompress_data(self.COMPRESSED[:8]), "F# F# ")
+
+    def testInvalidBackReference(self):
+        # The back reference points before the start of the output, so the
+        # data is corrupt. Decompression stops there.
+        self.assertEqual(
+            lznt1.decompress_data(
+                "\x05\xb0\x08abc\x06\x40" + "\x02\x30xyz"),
+            "abc")
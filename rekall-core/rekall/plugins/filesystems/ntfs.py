@@ -40,6 +40,7 @@ $ rekal -v --profile ntfs -f ~/images/ntfs1-gen2.E01
 """
 
 import array
+import collections
 import logging
 import re
 import struct
@@ -396,6 +397,13 @@ class FixupAddressSpace(addrspace.BaseAddressSpace):
 class RunListAddressSpace(addrspace.RunBasedAddressSpace):
     """An address space which is initialized from a runlist."""
 
+    # The number of decompressed compression units to keep.
+    DECOMPRESSED_CACHE_SIZE = 64
+
+    # When compressed units are read sequentially, this many following
+    # compressed units are decompressed ahead of time.
+    READAHEAD_UNITS = 8
+
     def __init__(self, run_list, cluster_size=None, size=0, name="", **kwargs):
         super(RunListAddressSpace, self).__init__(**kwargs)
         self.PAGE_SIZE = cluster_size or self.session.cluster_size
@@ -403,6 +411,14 @@ class RunListAddressSpace(addrspace.RunBasedAddressSpace):
         self._end = size
         self.name = name
 
+        # Decompressed compression units keyed by the run start.
+        self._unit_cache = utils.FastStore(
+            max_size=self.DECOMPRESSED_CACHE_SIZE)
+
+        # The address following the last compressed read. Used to detect
+        # sequential access.
+        self._next_compressed_read = None
+
         # In clusters.
         file_offset = 0
         for range_start, range_length in run_list:
@@ -464,6 +480,14 @@ class RunListAddressSpace(addrspace.RunBasedAddressSpace):
         addr = int(addr)
         start, end, run = self.runs.get_containing_range(addr)
 
+        # A compressed run only covers the compressed clusters, but its data
+        # decompresses to the entire compression unit.
+        if start is None:
+            unit_start = addr - addr % self.compression_unit_size
+            start, end, run = self.runs.get_containing_range(unit_start)
+            if start != unit_start or not run.data.get("compression"):
+                start = None
+
         # addr is not in any range, pad to the next range.
         if start is None:
             end = self.runs.get_next_range_start(addr)
@@ -473,22 +497,21 @@ class RunListAddressSpace(addrspace.RunBasedAddressSpace):
             return "\x00" * min(end - addr, length)
 
         if run.data.get("compression"):
-            block_data = lznt1.decompress_data(
-                self.base.read(run.file_offset, run.length) + "\x00" * 10,
-                logger=self.session.logging.getChild("ntfs"))
+            block_data = self._get_decompressed_unit(
+                run, readahead=addr == self._next_compressed_read)
 
             available_length = (self.compression_unit_size - (addr - run.start))
 
             block_offset = addr - run.start
+            length = min(length, available_length)
 
-            result = block_data[
-                block_offset:
-                block_offset + min(length, available_length)]
+            result = block_data[block_offset:block_offset + length]
 
             # Decompression went wrong - just zero pad.
             if len(result) < length:
                 result += "\x00" * (length - len(result))
 
+            self._next_compressed_read = addr + len(result)
             return result
 
         available_length = run.length - (addr - run.start)
@@ -498,6 +521,65 @@ class RunListAddressSpace(addrspace.RunBasedAddressSpace):
             return self.base.read(
                 block_offset, min(length, available_length))
 
+    def _decompress(self, data):
+        return lznt1.decompress_data(
+            data + "\x00" * 10, logger=self.session.logging.getChild("ntfs"))
+
+    def _get_decompressed_unit(self, run, readahead=False):
+        """Returns the decompressed data of the compression unit in run.
+
+        Reading a compression unit in small pieces would otherwise decompress
+        the entire unit for each read, so decompressed units are cached. When
+        readahead is set, the following compressed units are also decompressed
+        and their compressed data is read from the base address space in as
+        few reads as possible.
+        """
+        try:
+            return self._unit_cache.Get(run.start)
+        except KeyError:
+            pass
+
+        runs = [run]
+        if readahead:
+            next_run = run
+            while len(runs) <= self.READAHEAD_UNITS:
+                next_start = self.runs.get_next_range_start(next_run.end)
+                if next_start is None:
+                    break
+
+                _, _, next_run = self.runs.get_containing_range(next_start)
+                if not next_run.data.get("compression"):
+                    break
+
+                runs.append(next_run)
+
+        # Group runs which are contiguous in the base address space into a
+        # single read.
+        groups = []
+        for unit in runs:
+            if (groups and groups[-1][-1].file_offset + groups[-1][-1].length ==
+                    unit.file_offset):
+                groups[-1].append(unit)
+            else:
+                groups.append([unit])
+
+        for group in groups:
+            file_offset = group[0].file_offset
+            data = self.base.read(
+                file_offset,
+                group[-1].file_offset + group[-1].length - file_offset)
+
+            for unit in group:
+                offset = unit.file_offset - file_offset
+                self._unit_cache.Put(unit.start, self._decompress(
+                    data[offset:offset + unit.length]))
+
+        return self._unit_cache.Get(run.start)
+
+    def _read_chunk_into(self, addr, buffer):
+        # Compressed runs can only be read through _read_chunk().
+        return addrspace.PagedReader._read_chunk_into(self, addr, buffer)
+
     def get_mappings(self, start=0):
         for run in super(RunListAddressSpace, self).get_mappings(start=start):
             if start > run.end:
@@ -935,6 +1017,164 @@ class NTFSProfile(basic.ProfileLLP64, basic.BasicClasses):
         })
 
 
+MFTRecord = collections.namedtuple("MFTRecord", [
+    "entry", "sequence", "flags", "parent", "name", "allocated_size", "size",
+    "si_created", "si_modified", "si_mft_modified", "si_accessed",
+    "fn_created", "fn_modified", "fn_mft_modified", "fn_accessed"])
+
+
+class MFTParser(object):
+    """A fast parser of the MFT which does not use the object layer.
+
+    The MFT is read in large blocks, fixups are applied to the block in place
+    and the attributes we are interested in are decoded with struct directly.
+    Each base record is emitted as an MFTRecord tuple, including records of
+    deleted files (their flags do not have the ALLOCATED bit set). Timestamps
+    are in seconds since the epoch (like WinFileTime.v()).
+
+    Note that attributes stored in extension records (i.e. those found through
+    an $ATTRIBUTE_LIST) are not merged into the base record.
+    """
+
+    # MFT_ENTRY header: magic, fixup_offset, fixup_count, sequence_value,
+    # attribute_offset, flags, base_record_reference.
+    RECORD_HEADER = struct.Struct("<4sHH8xH2xHH8xQ")
+
+    # NTFS_ATTRIBUTE header: type, length, resident, name_length.
+    ATTRIBUTE_HEADER = struct.Struct("<IIBB")
+    RESIDENT_CONTENT = struct.Struct("<IH")
+    NON_RESIDENT_SIZES = struct.Struct("<QQ")
+
+    STANDARD_INFORMATION = struct.Struct("<qqqq")
+
+    # Parent reference, 4 timestamps, allocated size, size, flags,
+    # reparse_value, name length and name type.
+    FILE_NAME = struct.Struct("<Qqqqqqq8xBB")
+
+    # The number of records to read at once.
+    RECORDS_PER_BLOCK = 1024
+
+    SECTOR_SIZE = 512
+
+    def __init__(self, address_space, record_size=0x400, session=None):
+        self.address_space = address_space
+        self.record_size = record_size
+        self.session = session
+
+    @staticmethod
+    def _unix_time(value):
+        return max(value / 10000000 - 11644473600, 0)
+
+    def _apply_fixups(self, buffer, offset, fixup_offset, fixup_count):
+        magic = buffer[offset + fixup_offset:offset + fixup_offset + 2]
+        for i in xrange(1, fixup_count):
+            sector_end = offset + i * self.SECTOR_SIZE - 2
+            if (sector_end + 2 > offset + self.record_size or
+                    buffer[sector_end:sector_end + 2] != magic):
+                return False
+
+            table_offset = offset + fixup_offset + i * 2
+            buffer[sector_end:sector_end + 2] = buffer[
+                table_offset:table_offset + 2]
+
+        return True
+
+    def _parse_record(self, buffer, offset, entry):
+        (magic, fixup_offset, fixup_count, sequence, attribute_offset,
+         flags, base_record) = self.RECORD_HEADER.unpack_from(buffer, offset)
+
+        if magic != "FILE" or base_record & 0xFFFFFFFFFFFF:
+            return
+
+        if not self._apply_fixups(buffer, offset, fixup_offset, fixup_count):
+            return
+
+        end = offset + self.record_size
+        si_times = fn_times = (0, 0, 0, 0)
+        parent = allocated_size = size = 0
+        name = None
+        name_type = None
+        found_data = False
+
+        attribute = offset + attribute_offset
+        while attribute + self.ATTRIBUTE_HEADER.size <= end:
+            attribute_type, length, non_resident, name_length = (
+                self.ATTRIBUTE_HEADER.unpack_from(buffer, attribute))
+
+            if (attribute_type == 0xFFFFFFFF or length == 0 or
+                    attribute + length > end):
+                break
+
+            if non_resident:
+                # The size of the first unnamed $DATA stream.
+                if (attribute_type == 128 and not name_length and
+                        not found_data):
+                    allocated_size, size = self.NON_RESIDENT_SIZES.unpack_from(
+                        buffer, attribute + 40)
+                    found_data = True
+
+            else:
+                content_size, content_offset = (
+                    self.RESIDENT_CONTENT.unpack_from(buffer, attribute + 16))
+                content = attribute + content_offset
+
+                # Skip corrupted attributes.
+                if content + content_size > end:
+                    pass
+
+                elif (attribute_type == 16 and
+                      content_size >= self.STANDARD_INFORMATION.size):
+                    si_times = self.STANDARD_INFORMATION.unpack_from(
+                        buffer, content)
+
+                # Prefer the Win32 name over the DOS name.
+                elif (attribute_type == 48 and name_type in (None, 2) and
+                      content_size >= self.FILE_NAME.size):
+                    fields = self.FILE_NAME.unpack_from(buffer, content)
+                    parent = fields[0] & 0xFFFFFFFFFFFF
+                    fn_times = fields[1:5]
+                    name_type = fields[8]
+                    name_start = content + self.FILE_NAME.size
+                    name = str(buffer[
+                        name_start:name_start + fields[7] * 2]).decode(
+                            "utf-16-le", "ignore")
+
+                elif (attribute_type == 128 and not name_length and
+                      not found_data):
+                    allocated_size = size = content_size
+                    found_data = True
+
+            attribute += length
+
+        return MFTRecord(
+            entry, sequence, flags, parent, name, allocated_size, size,
+            *[self._unix_time(x) for x in si_times + fn_times])
+
+    def records(self, start=0, end=None):
+        """Yields an MFTRecord for each valid MFT record."""
+        if end is None:
+            end = self.address_space.end() / self.record_size
+
+        block_size = self.RECORDS_PER_BLOCK * self.record_size
+        buffer = bytearray(block_size)
+
+        for block_start in xrange(start, end, self.RECORDS_PER_BLOCK):
+            if self.session:
+                self.session.report_progress(
+                    "Parsing MFT entry %d/%d", block_start, end)
+
+            count = min(self.RECORDS_PER_BLOCK, end - block_start)
+            view = memoryview(buffer)[:count * self.record_size]
+            read = self.address_space.read_into(
+                block_start * self.record_size, view)
+
+            for i in xrange(read / self.record_size):
+                record = self._parse_record(
+                    buffer, i * self.record_size, block_start + i)
+                if record is not None:
+                    yield record
+
+
 class NTFS(object):
     """A class to manage the NTFS filesystem parser."""
 
@@ -973,6 +1213,32 @@ class NTFS(object):
         # Add a reference to the mft to all sub-objects..
         self.mft.obj_context["mft"] = self.mft
 
+        # Maps a directory's MFT entry number to a dict of its lowercased
+        # filenames and their (MFT entry number, filename).
+        self._directory_index = {}
+
+        # Maps a tuple of lowercased path components to the (MFT entry number,
+        # case corrected path components) of the path.
+        self._path_cache = {(): (5, ())}
+
+    def DirectoryIndex(self, mft_entry):
+        """Returns the filename index of the directory at mft_entry.
+
+        The index is built in a single pass over the directory's $I30 entries
+        and kept for the life of this object (which is cached in the session).
+        """
+        result = self._directory_index.get(mft_entry)
+        if result is None:
+            result = self._directory_index[mft_entry] = {}
+            for record in self.mft[mft_entry].list_files():
+                filename = record.file.name.v()
+
+                # The first matching entry wins, as with a linear search.
+                result.setdefault(
+                    filename.lower(), (int(record.mftReference), filename))
+
+        return result
+
     def MFTEntryByName(self, path):
         """Return the MFT entry by traversing the path.
 
@@ -985,27 +1251,38 @@ class NTFS(object):
           a tuple of (path, MFT_ENTRY) where path is the case corrected path.
 
         """
-        components = filter(None, re.split(r"[\\/]", path))
-        return_path = []
-
-        # Always start from the root of the filesystem.
-        directory = self.mft[5]
-        for component in components:
-            component = component.lower()
-
-            for record in directory.list_files():
-                filename = record.file.name.v()
-                if filename.lower() == component.lower():
-                    directory = self.mft[record.mftReference]
-                    return_path.append(filename)
-                    break
-            else:
+        components = tuple(
+            x.lower() for x in re.split(r"[\\/]", path) if x)
+
+        # Start from the longest path prefix we resolved before.
+        depth = len(components)
+        while components[:depth] not in self._path_cache:
+            depth -= 1
+
+        mft_entry, return_path = self._path_cache[components[:depth]]
+        for depth in xrange(depth + 1, len(components) + 1):
+            component = components[depth - 1]
+            try:
+                mft_entry, filename = self.DirectoryIndex(mft_entry)[component]
+            except KeyError:
                 raise IOError("Path %s component not found." % component)
 
+            return_path += (filename,)
+            self._path_cache[components[:depth]] = (mft_entry, return_path)
+
+        directory = self.mft[mft_entry]
         directory.obj_context["path"] = "/".join(return_path)
 
         return directory
 
+    def MFTRecords(self, start=0, end=None):
+        """Yields an MFTRecord for all records in the MFT (see MFTParser)."""
+        parser = MFTParser(self.address_space,
+                           record_size=self.bs.mft_record_size,
+                           session=self.profile.session)
+
+        return parser.records(start=start, end=end)
+
 
 class NTFSPlugins(plugin.PhysicalASMixin, plugin.ProfileCommand):
     """Base class for ntfs plugins."""
@@ -1232,6 +1509,56 @@ class ILS(MFTPluginsMixin, NTFSPlugins):
                     file_record.name)
 
 
+class MFTRecords(NTFSPlugins):
+    """List all records in the MFT using the fast MFT parser."""
+
+    name = "mft_records"
+
+    @classmethod
+    def args(cls, parser):
+        super(MFTRecords, cls).args(parser)
+        parser.add_argument("start", type="IntParser", default=0,
+                            help="First MFT entry to list.")
+
+        parser.add_argument("end", type="IntParser", default=None,
+                            help="Stop listing at this MFT entry (exclusive).")
+
+    def __init__(self, start=0, end=None, **kwargs):
+        super(MFTRecords, self).__init__(**kwargs)
+        self.start = start
+        self.end = end
+
+    def _timestamp(self, value):
+        return self.profile.UnixTimeStamp(value=value)
+
+    def render(self, renderer):
+        renderer.table_header([
+            ("MFT", "mft", ">10"),
+            ("Seq", "seq", ">5"),
+            ("Flags", "flags", ">5"),
+            ("Parent", "parent", ">10"),
+            ("SI Created", "si_created", "25"),
+            ("SI File Mod", "si_file_mod", "25"),
+            ("SI MFT Mod", "si_mft_mod", "25"),
+            ("SI Access", "si_accessed", "25"),
+            ("FN Created", "fn_created", "25"),
+            ("FN File Mod", "fn_file_mod", "25"),
+            ("FN MFT Mod", "fn_mft_mod", "25"),
+            ("FN Access", "fn_accessed", "25"),
+            ("Size", "size", ">10"),
+            ("Filename", "filename", ""),
+        ])
+
+        for record in self.ntfs.MFTRecords(start=self.start, end=self.end):
+            renderer.table_row(
+                record.entry,
+                record.sequence,
+                record.flags,
+                record.parent,
+                *([self._timestamp(x) for x in record[7:15]] +
+                  [record.size, record.name]))
+
+
 class IDump(NTFSPlugins):
     """Dump a part of an MFT file."""
     name = "idump"
@@ -1302,6 +1629,12 @@ class TestIExport(testlib.HashChecker):
     )
 
 
+class TestMFTRecords(testlib.SimpleTestCase):
+    PARAMETERS = dict(
+        commandline="mft_records --end 100"
+    )
+
+
 class TestIStat(testlib.SimpleTestCase):
     PARAMETERS = dict(
         commandline="istat %(mfts)s"
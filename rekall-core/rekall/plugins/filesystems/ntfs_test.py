@@ -0,0 +1,343 @@
+"""Tests for the NTFS support."""
+import random
+import re
+import struct
+
+from rekall import addrspace
+from rekall import session
+from rekall import testlib
+from rekall.plugins.filesystems import lznt1_test
+from rekall.plugins.filesystems import ntfs
+
+
+class RecordingBufferAddressSpace(addrspace.BufferAddressSpace):
+    """A buffer address space which records its reads."""
+    __abstract = True
+
+    def __init__(self, **kwargs):
+        super(RecordingBufferAddressSpace, self).__init__(**kwargs)
+        self.reads = []
+
+    def read(self, addr, length):
+        self.reads.append((addr, length))
+        return super(RecordingBufferAddressSpace, self).read(addr, length)
+
+
+class RunListAddressSpaceTest(testlib.RekallBaseUnitTestCase):
+    """Test reading compressed runs."""
+
+    CLUSTER_SIZE = 512
+    UNIT_SIZE = 16 * CLUSTER_SIZE
+
+    def setUp(self):
+        self.session = session.Session()
+        rand = random.Random(1)
+
+        text = "".join(rand.choice(["foo ", "bar ", "baz\n", "quux "])
+                       for _ in range(3000))
+        noise = "".join(chr(rand.randint(0, 255))
+                        for _ in range(self.UNIT_SIZE))
+
+        # The second unit is stored uncompressed, the others are compressed.
+        units = [
+            text[:self.UNIT_SIZE],
+            noise,
+            text[100:100 + self.UNIT_SIZE],
+            # Decompresses to less than a unit - the rest reads as zeros.
+            text[200:200 + 0x1000] + "\x00" * (self.UNIT_SIZE - 0x1000),
+            text[300:300 + self.UNIT_SIZE],
+        ]
+
+        self.expected = "".join(units)
+
+        image = []
+        run_list = []
+        self.unit_clusters = []
+        cluster = 0
+        for index, plain in enumerate(units):
+            if index == 1:
+                stored = plain
+            elif index == 3:
+                stored = lznt1_test.CompressLZNT1(plain[:0x1000])
+            else:
+                stored = lznt1_test.CompressLZNT1(plain)
+
+            clusters = -(-len(stored) // self.CLUSTER_SIZE)
+            image.append(stored.ljust(clusters * self.CLUSTER_SIZE, "\x00"))
+            run_list.append((cluster, clusters))
+            self.unit_clusters.append((cluster, clusters))
+            if clusters < 16:
+                run_list.append((None, 16 - clusters))
+
+            cluster += clusters
+
+        self.image = "".join(image)
+        self.run_list = run_list
+
+    def _MakeAS(self):
+        base = RecordingBufferAddressSpace(data=self.image,
+                                           session=self.session)
+        return ntfs.RunListAddressSpace(
+            run_list=self.run_list, cluster_size=self.CLUSTER_SIZE,
+            base=base, session=self.session)
+
+    def testSequentialReads(self):
+        test_as = self._MakeAS()
+        result = []
+        for offset in range(0, len(self.expected), 1000):
+            result.append(test_as.read(
+                offset, min(1000, len(self.expected) - offset)))
+
+        self.assertEqual("".join(result), self.expected)
+
+        # Each compressed unit was read from the image once. The fifth unit
+        # was read ahead together with the fourth unit.
+        def Extent(unit, units=1):
+            cluster = self.unit_clusters[unit][0]
+            clusters = sum(x[1] for x in self.unit_clusters[unit:unit + units])
+            return cluster * self.CLUSTER_SIZE, clusters * self.CLUSTER_SIZE
+
+        unit1_start, unit1_length = Extent(1)
+        self.assertEqual(
+            [x for x in test_as.base.reads
+             if not unit1_start <= x[0] < unit1_start + unit1_length],
+            [Extent(0), Extent(2), Extent(3, 2)])
+
+    def testRandomReads(self):
+        rand = random.Random(2)
+        test_as = self._MakeAS()
+        for _ in range(200):
+            offset = rand.randint(0, len(self.expected) - 1)
+            length = min(rand.randint(1, 3 * self.CLUSTER_SIZE),
+                         len(self.expected) - offset)
+            self.assertEqual(test_as.read(offset, length),
+                             self.expected[offset:offset + length])
+
+        # A read past the end of a unit which decompresses short is padded to
+        # the end of the unit, and continues in the next unit.
+        offset = 4 * self.UNIT_SIZE - 10
+        self.assertEqual(self._MakeAS().read(offset, 20),
+                         self.expected[offset:offset + 20])
+
+    def testUnitCache(self):
+        test_as = self._MakeAS()
+        self.assertEqual(test_as.read(10, 10), self.expected[10:20])
+        reads = len(test_as.base.reads)
+
+        # Reading the rest of the unit does not decompress it again.
+        for offset in range(20, self.UNIT_SIZE - 100, 100):
+            self.assertEqual(test_as.read(offset, 100),
+                             self.expected[offset:offset + 100])
+
+        self.assertEqual(len(test_as.base.reads), reads)
+
+
+class FakeIndexRecord(object):
+    """Looks like an INDEX_RECORD_ENTRY to MFTEntryByName()."""
+
+    def __init__(self, name, mft_reference):
+        self.file = FakeFileName(name)
+        self.mftReference = mft_reference
+
+
+class FakeFileName(object):
+    def __init__(self, name):
+        self.name = FakeValue(name)
+
+
+class FakeValue(object):
+    def __init__(self, value):
+        self.value = value
+
+    def v(self):
+        return self.value
+
+
+class FakeMFTEntry(object):
+    def __init__(self, entry, files=()):
+        self.entry = entry
+        self.files = [FakeIndexRecord(*x) for x in files]
+        self.obj_context = {}
+
+    def list_files(self):
+        return iter(self.files)
+
+
+class StaticNTFS(ntfs.NTFS):
+    """An NTFS over a fixed directory tree."""
+
+    def __init__(self, directories):
+        # Do not parse a boot sector.
+        self.mft = dict((entry, FakeMFTEntry(entry, directories.get(entry, ())))
+                        for entry in range(100))
+
+        self._directory_index = {}
+        self._path_cache = {(): (5, ())}
+
+
+def LinearMFTEntryByName(mft, path):
+    """The original lookup which searches each directory in turn."""
+    components = filter(None, re.split(r"[\\/]", path))
+    return_path = []
+
+    directory = mft[5]
+    for component in components:
+        for record in directory.list_files():
+            filename = record.file.name.v()
+            if filename.lower() == component.lower():
+                directory = mft[record.mftReference]
+                return_path.append(filename)
+                break
+        else:
+            raise IOError("Path %s component not found." % component)
+
+    return directory, "/".join(return_path)
+
+
+class MFTEntryByNameTest(testlib.RekallBaseUnitTestCase):
+    """Test the indexed path lookup against a linear search."""
+
+    directories = {
+        5: [("Windows", 10), ("Users", 11), ("pagefile.sys", 12),
+            # Differs only in case - the first entry wins.
+            ("WINDOWS", 13)],
+        10: [("System32", 20), ("notepad.exe", 21)],
+        11: [("Public", 50)],
+        20: [("drivers", 30), ("ntoskrnl.exe", 31)],
+        30: [("null.sys", 40)],
+    }
+
+    paths = ["", "/", "Windows", "windows/system32/DRIVERS/null.sys",
+             r"\Windows\notepad.exe", "/users/public", "WINDOWS/System32",
+             "pagefile.sys", "Windows/Missing", "Windows/notepad.exe/foo",
+             "windows//system32\\ntoskrnl.exe"]
+
+    def testLookupMatchesLinearSearch(self):
+        fs = StaticNTFS(self.directories)
+
+        # The second pass is answered from the path cache.
+        for path in self.paths * 2:
+            try:
+                expected = LinearMFTEntryByName(fs.mft, path)
+            except IOError:
+                self.assertRaises(IOError, fs.MFTEntryByName, path)
+                continue
+
+            directory = fs.MFTEntryByName(path)
+            self.assertTrue(directory is expected[0])
+            self.assertEqual(directory.obj_context["path"], expected[1])
+
+
+def FileTime(timestamp):
+    """Converts seconds since the epoch to a Windows FILETIME."""
+    return (timestamp + 11644473600) * 10000000
+
+
+def ResidentAttribute(attribute_type, content):
+    length = (24 + len(content) + 7) & ~7
+    header = struct.pack("<IIBBHHHIH2x", attribute_type, length, 0, 0, 0, 0, 0,
+                         len(content), 24)
+    return (header + content).ljust(length, "\x00")
+
+
+def MFTRecordData(name, flags=1, base_record=0, sequence=7, usn="\x05\x00",
+                  record_size=0x400):
+    """Builds an MFT record with fixups applied as they are on disk."""
+    standard_information = ResidentAttribute(16, struct.pack(
+        "<qqqq", *[FileTime(x) for x in (1000, 2000, 3000, 4000)]).ljust(
+            72, "\x00"))
+
+    encoded_name = name.encode("utf-16-le")
+    file_name = ResidentAttribute(48, struct.pack(
+        "<Qqqqqqq8xBB", (3 << 48) | 42,
+        FileTime(5000), FileTime(6000), FileTime(7000), FileTime(8000),
+        4096, 1234, len(name), 1) + encoded_name)
+
+    run_list = "\x11\x01\x10\x00"
+    data = struct.pack("<IIBBHHHQQH6xQQQ", 128, 72, 1, 0, 0, 0, 1,
+                       0, 0, 64, 4096, 1234, 1234) + run_list
+    data = data.ljust(72, "\x00")
+
+    attributes = standard_information + file_name + data + "\xff" * 4
+    attribute_offset = 56
+    used = attribute_offset + len(attributes) + 4
+
+    sectors = record_size // 512
+    header = struct.pack("<4sHHQHHHHIIQHxxI", "FILE", 48, sectors + 1, 0,
+                         sequence, 1, attribute_offset, flags, used,
+                         record_size, base_record, 4, 0)
+
+    record = bytearray(
+        (header + "\x00" * (48 - len(header)) + usn + "\x00" * sectors * 2 +
+         "\x00" * (attribute_offset - 50 - sectors * 2) +
+         attributes).ljust(record_size, "\x00"))
+
+    # Move the end of each sector into the fixup table.
+    for i in range(1, sectors + 1):
+        sector_end = i * 512 - 2
+        record[48 + i * 2:50 + i * 2] = record[sector_end:sector_end + 2]
+        record[sector_end:sector_end + 2] = usn
+
+    return str(record)
+
+
+class MFTParserTest(testlib.RekallBaseUnitTestCase):
+    """Test the fast MFT parser against the MFT_ENTRY object."""
+
+    # The long name crosses the first sector boundary so it is only correct
+    # after the fixups are applied.
+    name = u"A long file name %s.txt" % (u"\u00e9x" * 80)
+
+    def setUp(self):
+        self.session = session.Session()
+        records = [
+            MFTRecordData(self.name),
+            # A deleted record.
+            MFTRecordData(self.name, flags=0),
+            # An extension record of record 5.
+            MFTRecordData(self.name, base_record=(7 << 48) | 5),
+            MFTRecordData(self.name)[:0x3fe] + "XX",
+        ]
+
+        self.address_space = addrspace.BufferAddressSpace(
+            data="".join(records), session=self.session)
+
+    def testParseRecords(self):
+        parser = ntfs.MFTParser(self.address_space, session=self.session)
+        records = list(parser.records())
+
+        # The extension record and the record with the broken fixup are
+        # skipped.
+        self.assertEqual([x.entry for x in records], [0, 1])
+        self.assertEqual([x.flags for x in records], [1, 0])
+        self.assertEqual(list(parser.records(start=1, end=2)), records[1:])
+
+        profile = ntfs.NTFSProfile(session=self.session)
+        mft = profile.Array(offset=0, vm=self.address_space,
+                            target="MFT_ENTRY", target_size=0x400)
+        mft.obj_context["mft"] = mft
+
+        for record in records:
+            entry = mft[record.entry]
+            filename = entry.filename
+            standard_information = entry.get_attribute(
+                "$STANDARD_INFORMATION").DecodeAttribute()
+            data = entry.get_attribute("$DATA")
+
+            self.assertEqual(record.sequence, entry.sequence_value)
+            self.assertEqual(record.flags, entry.flags.v())
+            self.assertEqual(record.name, filename.name.v())
+            self.assertEqual(record.name, self.name)
+            self.assertEqual(record.parent, filename.mftReference.v())
+            self.assertEqual(record.allocated_size, data.allocated_size)
+            self.assertEqual(record.size, entry.data_size)
+
+            self.assertEqual(
+                record[7:15],
+                tuple(x.v() for x in (
+                    standard_information.create_time,
+                    standard_information.file_altered_time,
+                    standard_information.mft_altered_time,
+                    standard_information.file_accessed_time,
+                    filename.created, filename.file_modified,
+                    filename.mft_modified, filename.file_accessed)))
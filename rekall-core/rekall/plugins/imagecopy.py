@@ -82,6 +82,7 @@ class ImageCopy(plugin.PhysicalASMixin, plugin.Command):
                                      "please remove it before continuing")
 
         blocksize = 1024 * 1024 * 5
+        buffer = memoryview(bytearray(blocksize))
         with renderer.open(filename=self.output_image, mode="wb") as fd:
             for run in self.address_space.get_mappings():
                 renderer.format("Range {0:#x} - {1:#x}\n", run.start,
@@ -90,10 +91,11 @@ class ImageCopy(plugin.PhysicalASMixin, plugin.Command):
                 for offset in utils.xrange(
                         run.start, run.end, blocksize):
                     to_read = min(blocksize, run.end - offset)
-                    data = self.address_space.read(offset, to_read)
+                    read_length = self.address_space.read_into(
+                        offset, buffer[:to_read])
 
                     fd.seek(offset)
-                    fd.write(data)
+                    fd.write(buffer[:read_length])
 
                     renderer.RenderProgress(
                         "Writing offset %s" % self.human_readable(offset))
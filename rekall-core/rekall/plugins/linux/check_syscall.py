@@ -151,10 +151,13 @@ class CheckSyscall(common.LinuxPlugin):
                     )
                 )
 
-            resolver = self.session.address_resolver
-            for i, entry in enumerate(table):
-                yield (table_name, i, entry,
-                       resolver.format_address(entry.deref()))
+            # Symbolize all the table entries at once.
+            entries = list(table)
+            symbols = self.session.address_resolver.format_addresses(
+                [entry.v() for entry in entries])
+
+            for i, entry in enumerate(entries):
+                yield (table_name, i, entry, symbols[i])
 
     def render(self, renderer):
         renderer.table_header([
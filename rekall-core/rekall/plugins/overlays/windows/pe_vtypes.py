@@ -931,6 +931,88 @@ class PE(object):
             yield (dll, function_table[ordinal],
                    obj.NoneObject("Name not accessible"), ordinal)
 
+    # The number of export tables to keep in the session cache.
+    EXPORT_TABLE_CACHE_SIZE = 500
+
+    def _GetExportTableKey(self):
+        """Returns the cache key of the export table.
+
+        Dlls mapped into many processes share the same physical pages. The key
+        consists of the physical pages of the PE header and the export
+        directory, so an export table which was modified in a process (i.e.
+        copied on write) is parsed again.
+        """
+        vtop = getattr(self.vm, "vtop", None)
+        if vtop is None:
+            return
+
+        data_directory = self.nt_header.OptionalHeader.DataDirectory[
+            'IMAGE_DIRECTORY_ENTRY_EXPORT']
+        start = data_directory.m("VirtualAddress").v()
+        end = start + data_directory.Size
+
+        pages = [vtop(self.image_base)]
+        for page in xrange(start & ~0xFFF, end, 0x1000):
+            pages.append(vtop(page))
+
+        # Pages which are not mapped can not be compared.
+        if None in pages:
+            return
+
+        return (tuple(pages), self.nt_header.FileHeader.TimeDateStamp.v(),
+                self.nt_header.OptionalHeader.SizeOfImage.v())
+
+    def ExportTable(self):
+        """Returns the export directory as a list of simple tuples.
+
+        This is a cached version of ExportDirectory() for callers which only
+        need the exported addresses and names. The parsed table is shared in
+        the session between all processes which map the same dll.
+
+        Returns:
+          A list of (dll, function address, function name, ordinal) tuples. The
+          function name is None for functions exported by ordinal.
+        """
+        key = self._GetExportTableKey()
+        cache = self.session.GetParameter("pe_export_tables")
+        if cache == None:
+            cache = utils.FastStore(max_size=self.EXPORT_TABLE_CACHE_SIZE)
+            self.session.SetCache("pe_export_tables", cache)
+
+        table = None
+        if key is not None:
+            try:
+                table = cache.Get(key)
+            except KeyError:
+                pass
+
+        # The cached table holds RVAs.
+        if table is None:
+            table = []
+            for dll, func, name, ordinal in self.ExportDirectory():
+                if name == None:
+                    name = None
+                else:
+                    name = utils.SmartUnicode(name)
+
+                rva = func.v()
+                if rva:
+                    rva -= self.image_base
+
+                table.append((utils.SmartUnicode(dll), rva, name, ordinal))
+
+            if key is not None:
+                cache.Put(key, table)
+
+        result = []
+        for dll, rva, name, ordinal in table:
+            if name is None:
+                name = obj.NoneObject("Name not accessible")
+
+            result.append((dll, rva and rva + self.image_base, name, ordinal))
+
+        return result
+
     def GetProcAddress(self, name):
         """Scan the export table for a function of the given name.
 
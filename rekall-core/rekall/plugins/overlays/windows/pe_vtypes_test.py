@@ -0,0 +1,148 @@
+"""Tests for the PE helpers."""
+import struct
+
+from rekall import addrspace
+from rekall import session
+from rekall import testlib
+from rekall.plugins.overlays.windows import pe_vtypes
+
+
+class PEExportTableTest(testlib.RekallBaseUnitTestCase):
+    """Test the cached export table against the export directory."""
+
+    # A minimal 32 bit PE header.
+    VTYPES = {
+        '_IMAGE_DOS_HEADER': [0x40, {
+            'e_magic': [0, ['unsigned short']],
+            'e_lfanew': [0x3c, ['long']],
+        }],
+        '_IMAGE_NT_HEADERS': [0xf8, {
+            'Signature': [0, ['unsigned long']],
+            'FileHeader': [4, ['_IMAGE_FILE_HEADER']],
+            'OptionalHeader': [0x18, ['_IMAGE_OPTIONAL_HEADER']],
+        }],
+        '_IMAGE_FILE_HEADER': [0x14, {
+            'Machine': [0, ['unsigned short']],
+            'NumberOfSections': [2, ['unsigned short']],
+            'TimeDateStamp': [4, ['unsigned long']],
+            'SizeOfOptionalHeader': [0x10, ['unsigned short']],
+            'Characteristics': [0x12, ['unsigned short']],
+        }],
+        '_IMAGE_OPTIONAL_HEADER': [0xe0, {
+            'Magic': [0, ['unsigned short']],
+            'ImageBase': [0x1c, ['unsigned long']],
+            'SizeOfImage': [0x38, ['unsigned long']],
+            'DataDirectory': [0x60, ['Array', dict(
+                target='_IMAGE_DATA_DIRECTORY', count=16)]],
+        }],
+        '_IMAGE_DATA_DIRECTORY': [8, {
+            'VirtualAddress': [0, ['unsigned long']],
+            'Size': [4, ['unsigned long']],
+        }],
+        '_IMAGE_EXPORT_DIRECTORY': [0x28, {
+            'Name': [0xc, ['unsigned long']],
+            'Base': [0x10, ['unsigned long']],
+            'NumberOfFunctions': [0x14, ['unsigned long']],
+            'NumberOfNames': [0x18, ['unsigned long']],
+            'AddressOfFunctions': [0x1c, ['unsigned long']],
+            'AddressOfNames': [0x20, ['unsigned long']],
+            'AddressOfNameOrdinals': [0x24, ['unsigned long']],
+        }],
+    }
+
+    IMAGE_SIZE = 0x2000
+
+    def _BuildImage(self, functions):
+        data = bytearray(self.IMAGE_SIZE)
+        struct.pack_into("<H", data, 0, 0x5a4d)
+        struct.pack_into("<I", data, 0x3c, 0x80)
+        struct.pack_into("<IHHI8xHH", data, 0x80, 0x4550, 0x14c, 0,
+                         0x12345678, 0xe0, 0x2102)
+        struct.pack_into("<H", data, 0x98, 0x10b)
+        struct.pack_into("<I", data, 0x98 + 0x38, self.IMAGE_SIZE)
+
+        # The export directory.
+        struct.pack_into("<II", data, 0x98 + 0x60, 0x1000, 0x200)
+        struct.pack_into("<IIIIIII", data, 0x100c, 0x1100, 1, len(functions),
+                         2, 0x1040, 0x1060, 0x1080)
+        struct.pack_into("<%dI" % len(functions), data, 0x1040, *functions)
+        struct.pack_into("<II", data, 0x1060, 0x1120, 0x1130)
+        struct.pack_into("<HH", data, 0x1080, 3, 0)
+        data[0x1100:0x1109] = "test.dll\x00"
+        data[0x1120:0x1126] = "FuncA\x00"
+        data[0x1130:0x1136] = "FuncB\x00"
+
+        return str(data)
+
+    def setUp(self):
+        self.session = session.Session()
+        profile = pe_vtypes.PEProfile(name="pe", session=self.session)
+        profile.add_types(self.VTYPES)
+        self.session.profile_cache["pe"] = profile
+
+        # The dll is mapped at two addresses from the same physical pages. The
+        # export address table of the third mapping was modified (copied on
+        # write).
+        functions = [0x500, 0x600, 0, 0x700, 0x800]
+        modified_functions = [0x500, 0x1f00, 0, 0x700, 0x800]
+
+        image = self._BuildImage(functions)
+        modified = self._BuildImage(modified_functions)
+        base = addrspace.BufferAddressSpace(
+            data=image + modified[0x1000:0x2000], session=self.session)
+
+        self.address_space = addrspace.RunBasedAddressSpace(
+            base=base, session=self.session)
+        self.address_space.add_run(0x10000000, 0, self.IMAGE_SIZE)
+        self.address_space.add_run(0x20000000, 0, self.IMAGE_SIZE)
+        self.address_space.add_run(0x30000000, 0, 0x1000)
+        self.address_space.add_run(0x30001000, 0x2000, 0x1000)
+
+    def _PE(self, image_base):
+        return pe_vtypes.PE(address_space=self.address_space,
+                            image_base=image_base, session=self.session)
+
+    def _ExportDirectory(self, pe):
+        result = []
+        for dll, func, name, ordinal in pe.ExportDirectory():
+            if name == None:
+                name = None
+            else:
+                name = unicode(name)
+
+            result.append((unicode(dll), func.v(), name, ordinal))
+
+        return result
+
+    def _ExportTable(self, pe):
+        result = []
+        for dll, func, name, ordinal in pe.ExportTable():
+            if name == None:
+                name = None
+
+            result.append((dll, func, name, ordinal))
+
+        return result
+
+    def testExportTable(self):
+        for image_base in (0x10000000, 0x20000000, 0x30000000):
+            pe = self._PE(image_base)
+            expected = self._ExportDirectory(pe)
+            self.assertEqual(self._ExportTable(pe), expected)
+
+            # The table is cached.
+            self.assertEqual(self._ExportTable(pe), expected)
+
+        # The cached RVAs are rebased, except for empty slots.
+        self.assertEqual(self._ExportTable(self._PE(0x20000000))[:4], [
+            (u"test.dll", 0x20000700, u"FuncA", 3),
+            (u"test.dll", 0x20000500, u"FuncB", 0),
+            (u"test.dll", 0x20000600, None, 1),
+            (u"test.dll", 0, None, 2)])
+
+        # The modified table is not shared with the other mappings.
+        self.assertEqual(self._ExportTable(self._PE(0x30000000))[2], (
+            u"test.dll", 0x30001f00, None, 1))
+
+        self.assertEqual(
+            len(self.session.GetParameter("pe_export_tables")), 2)
@@ -85,6 +85,12 @@ class CachingManager(io_manager.IOManager):
 
         return self.url_manager.CheckInventory(name)
 
+    def Metadata(self, name):
+        # Prefer the upstream metadata since it identifies the version of the
+        # profile in the repository.
+        return (self.url_manager.Metadata(name) or
+                self.cache_io_manager.Metadata(name))
+
     def GetData(self, name, **kwargs):
         if self.cache_io_manager.CheckInventory(name):
             local_age = self.cache_io_manager.Metadata(name).get(
@@ -187,8 +187,9 @@ class CapstoneInstruction(Instruction):
         target = self.session.profile.Object(
             type, offset=operand, vm=self.address_space).v()
 
-        target_name = ", ".join(self.resolver.format_address(target))
-        operand_name = ", ".join(self.resolver.format_address(operand))
+        # Without a resolver for the profile there are no names.
+        names = self.resolver.format_addresses([target, operand]) or [[], []]
+        target_name, operand_name = [", ".join(x) for x in names]
 
         if target_name:
             return "0x%x %s -> %s" % (target, operand_name, target_name)
@@ -257,28 +258,47 @@ class Capstone(Disassembler):
     def __init__(self, mode, **kwargs):
         super(Capstone, self).__init__(mode, **kwargs)
 
+        self.cs = self._MakeCapstone()
+        self.cs.detail = True
+
+        # Only created when needed by disassemble_lite().
+        self.cs_lite = None
+
+    def _MakeCapstone(self):
         if self.mode == "I386":
-            self.cs = capstone.Cs(capstone.CS_ARCH_X86, capstone.CS_MODE_32)
+            cs = capstone.Cs(capstone.CS_ARCH_X86, capstone.CS_MODE_32)
         elif self.mode == "AMD64":
-            self.cs = capstone.Cs(capstone.CS_ARCH_X86, capstone.CS_MODE_64)
+            cs = capstone.Cs(capstone.CS_ARCH_X86, capstone.CS_MODE_64)
         elif self.mode == "MIPS":
-            self.cs = capstone.Cs(capstone.CS_ARCH_MIPS, capstone.CS_MODE_32 +
-                                  capstone.CS_MODE_BIG_ENDIAN)
+            cs = capstone.Cs(capstone.CS_ARCH_MIPS, capstone.CS_MODE_32 +
+                             capstone.CS_MODE_BIG_ENDIAN)
         elif self.mode == "ARM":
-            self.cs = capstone.Cs(capstone.CS_ARCH_ARM, capstone.CS_MODE_ARM)
+            cs = capstone.Cs(capstone.CS_ARCH_ARM, capstone.CS_MODE_ARM)
         else:
             raise NotImplementedError(
                 "No disassembler available for this arch.")
 
-        self.cs.detail = True
-        self.cs.skipdata_setup = ("db", None, None)
-        self.cs.skipdata = True
+        cs.skipdata_setup = ("db", None, None)
+        cs.skipdata = True
+        return cs
 
     def disassemble(self, data, offset):
         for insn in self.cs.disasm(data, int(offset)):
             yield CapstoneInstruction(insn, session=self.session,
                                       address_space=self.address_space)
 
+    def disassemble_lite(self, data, offset):
+        """Yields the (address, size) of each instruction.
+
+        This finds the same instructions as disassemble() but does not decode
+        their details, so it is much faster for a linear sweep.
+        """
+        if self.cs_lite is None:
+            self.cs_lite = self._MakeCapstone()
+
+        for address, size, _, _ in self.cs_lite.disasm_lite(data, int(offset)):
+            yield address, size
+
 
 class Disassemble(plugin.Command):
     """Disassemble the given offset."""
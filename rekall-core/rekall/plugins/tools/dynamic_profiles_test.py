@@ -10,6 +10,9 @@ class MockAddressResolver(object):
     def format_address(self, address):
         return self.name_map.get(address, "")
 
+    def format_addresses(self, addresses):
+        return [self.format_address(x) for x in addresses]
+
 
 class TestDynamicProfile(testlib.RekallBaseUnitTestCase):
     """Tests the dynamic profile mechanism."""
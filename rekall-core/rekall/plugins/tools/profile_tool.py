@@ -89,6 +89,7 @@ import re
 import StringIO
 import yaml
 
+from rekall import binary_profile
 from rekall import io_manager
 from rekall import plugin
 from rekall import registry
@@ -401,6 +402,50 @@ class TestConvertProfile(testlib.DisabledTest):
     PARAMETERS = dict(commandline="convert_profile")
 
 
+class ConvertBinaryProfile(core.OutputFileMixin, plugin.Command):
+    """Convert a Rekall JSON profile to the binary profile format.
+
+    Binary profiles are memory mapped and each struct definition is only
+    decoded when it is first used, so large profiles load much faster.
+    """
+
+    __name = "convert_binary_profile"
+
+    @classmethod
+    def args(cls, parser):
+        """Declare the command line args we need."""
+        parser.add_argument("source",
+                            help="Filename of the JSON profile to read.")
+
+        super(ConvertBinaryProfile, cls).args(parser)
+
+    def __init__(self, source=None, out_file=None, **kwargs):
+        super(ConvertBinaryProfile, self).__init__(out_file=out_file, **kwargs)
+        self.source = source
+
+    def render(self, renderer):
+        try:
+            with gzip.open(self.source) as fd:
+                data = fd.read()
+        except IOError:
+            with open(self.source, "rb") as fd:
+                data = fd.read()
+
+        if binary_profile.IsBinaryProfile(data):
+            raise IOError("%s is already a binary profile." % self.source)
+
+        encoded = binary_profile.Encode(json.loads(data))
+        with renderer.open(filename=self.out_file, mode="wb") as output:
+            output.write(encoded)
+
+        self.session.logging.info("Converted %s to %s", self.source,
+                                  self.out_file)
+
+
+class TestConvertBinaryProfile(testlib.DisabledTest):
+    PARAMETERS = dict(commandline="convert_binary_profile")
+
+
 class TestBuildIndex(testlib.DisabledTest):
     PARAMETERS = dict(commandline="build_index")
 
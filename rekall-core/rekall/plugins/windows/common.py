@@ -272,23 +272,33 @@ class MultiPoolTagCheck(scan.MultiStringFinderCheck):
 
 
 class CheckPoolSize(scan.ScannerCheck):
-    """ Check pool block size """
-    def __init__(self, condition=None, min_size=None, **kwargs):
+    """ Check pool block size
+
+    Prefer min_size or an exact size over a condition callable: lambdas can not
+    be pickled, so they keep the scanner out of the parallel scan engine.
+    """
+    def __init__(self, condition=None, min_size=None, size=None, **kwargs):
         super(CheckPoolSize, self).__init__(**kwargs)
         self.condition = condition
-        if min_size:
-            self.condition = lambda x: x >= min_size
+        self.min_size = min_size
+        self.size = size
 
         self.pool_align = self.session.profile.constants['PoolAlignment']
-        if self.condition is None:
+        if self.condition is None and not (self.min_size or self.size):
             raise RuntimeError("No pool size provided")
 
     def check(self, buffer_as, offset):
         pool_hdr = self.session.profile._POOL_HEADER(
             vm=buffer_as, offset=offset)
 
-        block_size = pool_hdr.BlockSize.v()
-        return self.condition(block_size * self.pool_align)
+        pool_size = pool_hdr.BlockSize.v() * self.pool_align
+        if self.condition is not None:
+            return self.condition(pool_size)
+
+        if self.size:
+            return pool_size == self.size
+
+        return pool_size >= self.min_size
 
 
 class CheckPoolType(scan.ScannerCheck):
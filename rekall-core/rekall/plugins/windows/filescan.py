@@ -119,8 +119,7 @@ class PoolScanDriver(PoolScanFile):
 
             # Must be large enough to hold the driver object.
             ('CheckPoolSize', dict(
-                condition=lambda x: x > self.profile.get_obj_size(
-                    "_DRIVER_OBJECT"))),
+                min_size=self.profile.get_obj_size("_DRIVER_OBJECT") + 1)),
 
             ('CheckPoolType', dict(
                 paged=True, non_paged=True, free=True)),
@@ -31,6 +31,7 @@ import struct
 
 from rekall import plugin
 from rekall import testlib
+from rekall import utils
 
 from rekall.plugins.windows import common
 from rekall.plugins.overlays.windows import pe_vtypes
@@ -63,6 +64,9 @@ class HookHeuristic(object):
         self.stack = []
         self.memory = {}
 
+        # Set when the result depends on memory outside the function body.
+        self.memory_read = False
+
     def WriteToOperand(self, operand, value):
         if operand["type"] == "REG":
             self.regs[operand["reg"]] = value
@@ -116,6 +120,7 @@ class HookHeuristic(object):
             # First check our local cache for a previously written value.
             return self.memory[offset]
         except KeyError:
+            self.memory_read = True
             data = self.address_space.read(offset, size)
             format_string = {1: "b", 2: "H", 4: "I", 8: "Q"}[size]
 
@@ -237,6 +242,13 @@ class CheckPEHooks(plugin.VerbosityMixIn, common.WindowsCommandPlugin):
 
     name = "check_pehooks"
 
+    # The number of bytes at the start of a function which the inline hook
+    # heuristic may examine.
+    INSPECT_LENGTH = 0x40
+
+    # The number of inline hook results to keep in the session cache.
+    INSPECT_CACHE_SIZE = 50000
+
     @classmethod
     def args(cls, parser):
         super(CheckPEHooks, cls).args(parser)
@@ -304,9 +316,12 @@ class CheckPEHooks(plugin.VerbosityMixIn, common.WindowsCommandPlugin):
             ("Dest Name", "dest_name", "60"),
             ])
 
-        for function_name, func_address in self.detect_IAT_hooks():
-            destination = self.session.address_resolver.format_address(
-                func_address, max_distance=2**64)
+        hooks = list(self.detect_IAT_hooks())
+        destinations = self.session.address_resolver.format_addresses(
+            [func_address for _, func_address in hooks], max_distance=2**64)
+
+        for (function_name, func_address), destination in zip(
+                hooks, destinations):
             if not destination:
                 destination = "%#x" % func_address
 
@@ -339,14 +354,14 @@ class CheckPEHooks(plugin.VerbosityMixIn, common.WindowsCommandPlugin):
 
         resolver = self.session.address_resolver
 
-        for dll, func, name, hint in pe.ExportDirectory():
+        for dll, func, name, hint in pe.ExportTable():
             self.session.report_progress("Checking export %s!%s", dll, name)
 
             # Skip zero or invalid addresses.
-            if address_space.read(func.v(), 10) == "\x00" * 10:
+            if address_space.read(func, 10) == "\x00" * 10:
                 continue
 
-            if start < func.v() < end:
+            if start < func < end:
                 continue
 
             function_name = "%s:%s (%s)" % (
@@ -361,9 +376,12 @@ class CheckPEHooks(plugin.VerbosityMixIn, common.WindowsCommandPlugin):
             ("Dest Name", "dest_name", "[wrap:60]"),
             ])
 
-        for function_name, func_address in self.detect_IAT_hooks():
-            destination = self.session.address_resolver.format_address(
-                func_address, max_distance=2**64)
+        hooks = list(self.detect_IAT_hooks())
+        destinations = self.session.address_resolver.format_addresses(
+            [func_address for _, func_address in hooks], max_distance=2**64)
+
+        for (function_name, func_address), destination in zip(
+                hooks, destinations):
             if not destination:
                 destination = "%#x" % func_address
 
@@ -379,28 +397,70 @@ class CheckPEHooks(plugin.VerbosityMixIn, common.WindowsCommandPlugin):
         # Inspect the export directory for inline hooks.
         pe = pe_vtypes.PE(image_base=self.image_base, session=self.session)
 
-        for _, function, name, _ in pe.ExportDirectory():
+        for _, address, name, _ in pe.ExportTable():
+            function = pe.profile.Pointer(
+                value=address, vm=pe.vm, target="Function")
+
             self.session.report_progress(
-                "Checking function %#x (%s)", function, name)
+                "Checking function %#x (%s)", address, name)
 
             # Try to detect an inline hook.
-            destination = self.heuristic.Inspect(function, instructions=3) or ""
+            destination = self._InspectFunction(function, instructions=3)
 
             # If we did not detect a hook we skip this function.
             if destination:
                 yield function, name, destination
 
+    def _InspectFunction(self, function, instructions=3):
+        """Run the hook heuristic on the function.
+
+        Dlls are mapped into many processes from the same physical pages, so
+        the result is cached in the session by the function's virtual address
+        and the physical pages of its first bytes. Results which depend on
+        memory outside the function body (e.g. JMP [address]) are not cached.
+        """
+        address = function.v()
+        key = None
+        vtop = getattr(function.obj_vm, "vtop", None)
+        if vtop is not None:
+            start = vtop(address)
+            end = vtop(address + self.INSPECT_LENGTH - 1)
+            if start is not None and end is not None:
+                key = (address, start, end, instructions)
+
+        cache = self.session.GetParameter("pe_inline_hook_cache")
+        if cache == None:
+            cache = utils.FastStore(max_size=self.INSPECT_CACHE_SIZE)
+            self.session.SetCache("pe_inline_hook_cache", cache)
+
+        if key is not None:
+            try:
+                return cache.Get(key)
+            except KeyError:
+                pass
+
+        destination = self.heuristic.Inspect(
+            function, instructions=instructions) or ""
+
+        if key is not None and not self.heuristic.memory_read:
+            cache.Put(key, destination)
+
+        return destination
+
     def render_inline_hooks(self, renderer):
         renderer.table_header([("Name", "name", "20s"),
                                ("Hook", "hook", "30s"),
                                ("Disassembly", "location", "60s"),
                               ])
-        for function, name, destination in self.detect_inline_hooks():
-            hook_detected = False
+        hooks = list(self.detect_inline_hooks())
 
-            # Try to resolve the destination into a name.
-            destination_name = self.session.address_resolver.format_address(
-                destination, max_distance=2**64)
+        # Try to resolve the destinations into names.
+        destination_names = self.session.address_resolver.format_addresses(
+            [destination for _, _, destination in hooks], max_distance=2**64)
+
+        for (function, name, destination), destination_name in zip(
+                hooks, destination_names):
+            hook_detected = False
 
             # We know about it. We suppress the output for jumps that go into a
             # known module. These should be visible using the regular vad
@@ -444,9 +504,12 @@ class IATHooks(plugin.VerbosityMixIn, common.WinProcessFilter):
         checker = self.session.plugins.check_pehooks(
             image_base=dll.base)
 
-        for function_name, func_address in checker.detect_IAT_hooks():
-            destination = self.session.address_resolver.format_address(
-                func_address, max_distance=2**64)
+        hooks = list(checker.detect_IAT_hooks())
+        destinations = self.session.address_resolver.format_addresses(
+            [func_address for _, func_address in hooks], max_distance=2**64)
+
+        for (function_name, func_address), destination in zip(
+                hooks, destinations):
             if not destination:
                 destination = "%#x" % func_address
 
@@ -490,9 +553,12 @@ class EATHooks(plugin.VerbosityMixIn, common.WinProcessFilter):
         checker = self.session.plugins.check_pehooks(
             image_base=dll.base)
 
-        for function_name, func_address in checker.detect_EAT_hooks():
-            destination = self.session.address_resolver.format_address(
-                func_address, max_distance=2**64)
+        hooks = list(checker.detect_EAT_hooks())
+        destinations = self.session.address_resolver.format_addresses(
+            [func_address for _, func_address in hooks], max_distance=2**64)
+
+        for (function_name, func_address), destination in zip(
+                hooks, destinations):
             if not destination:
                 destination = "%#x" % func_address
 
@@ -537,12 +603,15 @@ class InlineHooks(plugin.VerbosityMixIn, common.WinProcessFilter):
         checker = self.session.plugins.check_pehooks(
             image_base=dll.base)
 
-        for function, name, destination in checker.detect_inline_hooks():
-            hook_detected = False
+        hooks = list(checker.detect_inline_hooks())
 
-            # Try to resolve the destination into a name.
-            destination_name = self.session.address_resolver.format_address(
-                destination, max_distance=2**64)
+        # Try to resolve the destinations into names.
+        destination_names = self.session.address_resolver.format_addresses(
+            [destination for _, _, destination in hooks], max_distance=2**64)
+
+        for (function, name, destination), destination_name in zip(
+                hooks, destination_names):
+            hook_detected = False
 
             # We know about it. We suppress the output for jumps that go into a
             # known module. These should be visible using the regular vad
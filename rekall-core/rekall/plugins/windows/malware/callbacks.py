@@ -172,7 +172,7 @@ class AbstractCallbackScanner(common.PoolScanner):
 class PoolScanFSCallback(AbstractCallbackScanner):
     """PoolScanner for File System Callbacks"""
     checks = [('PoolTagCheck', dict(tag="IoFs")),
-              ('CheckPoolSize', dict(condition=lambda x: x == 0x18)),
+              ('CheckPoolSize', dict(size=0x18)),
               ('CheckPoolType', dict(non_paged=True, paged=True,
                                      free=True)),
              ]
@@ -190,7 +190,7 @@ class PoolScanFSCallback(AbstractCallbackScanner):
 class PoolScanShutdownCallback(AbstractCallbackScanner):
     """PoolScanner for Shutdown Callbacks"""
     checks = [('PoolTagCheck', dict(tag="IoSh")),
-              ('CheckPoolSize', dict(condition=lambda x: x == 0x18)),
+              ('CheckPoolSize', dict(size=0x18)),
               ('CheckPoolType', dict(non_paged=True, paged=True,
                                      free=True)),
               ('CheckPoolIndex', dict(value=0)),
@@ -226,7 +226,7 @@ class PoolScanShutdownCallback(AbstractCallbackScanner):
 class PoolScanGenericCallback(AbstractCallbackScanner):
     """PoolScanner for Generic Callbacks"""
     checks = [('PoolTagCheck', dict(tag="Cbrb")),
-              ('CheckPoolSize', dict(condition=lambda x: x == 0x18)),
+              ('CheckPoolSize', dict(size=0x18)),
               ('CheckPoolType', dict(non_paged=True, paged=True, free=True)),
              ]
 
@@ -254,7 +254,7 @@ class PoolScanGenericCallback(AbstractCallbackScanner):
 class PoolScanDbgPrintCallback(AbstractCallbackScanner):
     """PoolScanner for DebugPrint Callbacks on Vista and 7"""
     checks = [('PoolTagCheck', dict(tag="DbCb")),
-              ('CheckPoolSize', dict(condition=lambda x: x == 0x20)),
+              ('CheckPoolSize', dict(size=0x20)),
               ('CheckPoolType', dict(non_paged=True, paged=True, free=True)),
              ]
 
@@ -274,7 +274,7 @@ class PoolScanRegistryCallback(AbstractCallbackScanner):
     """PoolScanner for DebugPrint Callbacks on Vista and 7"""
     checks = [('PoolTagCheck', dict(tag="CMcb")),
               # Seen as 0x38 on Vista SP2 and 0x30 on 7 SP0
-              ('CheckPoolSize', dict(condition=lambda x: x >= 0x38)),
+              ('CheckPoolSize', dict(min_size=0x38)),
               ('CheckPoolType', dict(non_paged=True, paged=True, free=True)),
               ('CheckPoolIndex', dict(value=4)),
              ]
@@ -300,7 +300,7 @@ class PoolScanPnp9(AbstractCallbackScanner):
     """PoolScanner for Pnp9 (EventCategoryHardwareProfileChange)"""
     checks = [('MultiPoolTagCheck', dict(tags=["Pnp9", "PnpD", "PnpC"])),
               # seen as 0x2C on W7, 0x28 on vistasp0 (4 less but needs 8 less)
-              ('CheckPoolSize', dict(condition=lambda x: x >= 0x30)),
+              ('CheckPoolSize', dict(min_size=0x30)),
               ('CheckPoolType', dict(non_paged=True, paged=True, free=True)),
               ('CheckPoolIndex', dict(value=1)),
              ]
@@ -513,8 +513,11 @@ class CallbackScan(common.WindowsCommandPlugin):
                                ("Details", "details", ""),
                               ])
 
-        for (sym, cb, detail) in self.generate_hits():
-            symbol_name = self.session.address_resolver.format_address(cb)
+        hits = list(self.generate_hits())
+        symbol_names = self.session.address_resolver.format_addresses(
+            [cb for _, cb, _ in hits])
+
+        for (sym, cb, detail), symbol_name in zip(hits, symbol_names):
             renderer.table_row(sym, cb, symbol_name, detail)
 
 
@@ -562,12 +565,13 @@ class Callbacks(common.WindowsCommandPlugin):
                 )
             )
 
-            for callback in array:
-                function = callback.Callback
-                renderer.table_row(
-                    table, callback, function,
-                    resolver.format_address(function, max_distance=2**64)
-                    )
+            callbacks = list(array)
+            symbols = resolver.format_addresses(
+                [callback.Callback for callback in callbacks],
+                max_distance=2**64)
+
+            for callback, symbol in zip(callbacks, symbols):
+                renderer.table_row(table, callback, callback.Callback, symbol)
 
     def get_bugcheck_callbacks(self, renderer):
         resolver = self.session.address_resolver
@@ -579,14 +583,17 @@ class Callbacks(common.WindowsCommandPlugin):
             list_head = resolver.get_constant_object(
                 list_head_name, "_LIST_ENTRY")
 
-            for record in list_head.list_of_type(type, "Entry"):
-                function = record.CallbackRoutine
+            records = list(list_head.list_of_type(type, "Entry"))
+            symbols = resolver.format_addresses(
+                [record.CallbackRoutine for record in records],
+                max_distance=2**64)
 
+            for record, symbol in zip(records, symbols):
                 renderer.table_row(
                     list_head_name,
                     record,
-                    function,
-                    resolver.format_address(function, max_distance=2**64),
+                    record.CallbackRoutine,
+                    symbol,
                     record.Component
                 )
 
@@ -18,6 +18,8 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
 #
 
+import re
+
 from rekall import plugin
 from rekall import obj
 from rekall import testlib
@@ -105,6 +107,10 @@ class ImpScan(common.WinProcessFilter):
 
         The function name is used if available, otherwise
         we take the ordinal value.
+
+        Returns a dict mapping each function address to a (module, function
+        address, function name) tuple. Use _make_function() to get the
+        Function object.
         """
         exports = {}
 
@@ -115,13 +121,18 @@ class ImpScan(common.WinProcessFilter):
             pe = pe_vtypes.PE(address_space=mod.obj_vm,
                               session=self.session, image_base=mod.DllBase)
 
-            for _, func_pointer, func_name, ordinal in pe.ExportDirectory():
+            # The export table is shared between processes mapping the dll.
+            for _, func_address, func_name, ordinal in pe.ExportTable():
                 function_name = func_name or ordinal or ''
 
-                exports[func_pointer.v()] = (mod, func_pointer, function_name)
+                exports[func_address] = (mod, func_address, function_name)
 
         return exports
 
+    def _make_function(self, module, func_address):
+        """Returns the Function object for an address from _enum_apis()."""
+        return self.profile.Function(vm=module.obj_vm, offset=func_address)
+
     def _iat_scan(self, addr_space, calls_imported, apis, base_address,
                   end_address):
         """Scan forward from the lowest IAT entry found for new import entries.
@@ -178,6 +189,17 @@ class ImpScan(common.WinProcessFilter):
     JMP_RULE = {'mnemonic': 'JMP', 'operands': [
         {'type': 'MEM', 'target': "$target", 'address': '$address'}]}
 
+    # Opcode bytes of indirect CALL (FF /2) and JMP (FF /4) instructions
+    # through a displacement only memory operand: FF 15/25 (disp32 on x86, RIP
+    # relative on x64) and FF 14/24 25 (disp32 through a SIB byte).
+    CALL_PATTERN = re.compile("\xff(?:[\x15\x25]|[\x14\x24]\x25)")
+
+    # Size of the blocks read by call_scan.
+    CALL_SCAN_BLOCK_SIZE = 1024 * 1024
+
+    # Enough data to decode the longest x86 instruction.
+    MAX_INSTRUCTION_LENGTH = 16
+
     def call_scan(self, addr_space, base_address, size_to_read):
         """Locate calls in a block of code.
 
@@ -197,29 +219,75 @@ class ImpScan(common.WinProcessFilter):
         On x64, the 0x989d is a relative offset from the current instruction
         (RIP).
 
-        So we simply disassemble the entire code section of the executable
-        looking for calls, then we collect all the targets of the calls.
+        Disassembling the entire code section in detail is slow. Instead we
+        read the code in large blocks, find the instruction boundaries with a
+        fast linear sweep and only decode the instructions which start with
+        the opcode bytes of these calls. Opcode bytes which are not at an
+        instruction boundary (e.g. inside an immediate) are ignored, just like
+        with a full disassembly.
 
         @param addr_space: an AS to scan with
         @param base_address: memory base address
-        @param data: buffer of data found at base_address
+        @param size_to_read: number of bytes to scan
 
         """
         func_obj = self.profile.Function(vm=addr_space, offset=base_address)
         end_address = base_address + size_to_read
 
-        for instruction in func_obj.disassemble(2**32):
-            if instruction.address > end_address:
-                break
+        # On x64 the opcode may be preceded by a REX prefix.
+        rex_prefix = func_obj.mode == "AMD64"
+
+        # The address of the next instruction of the linear sweep.
+        next_address = base_address
+
+        for block_start in xrange(base_address, end_address,
+                                  self.CALL_SCAN_BLOCK_SIZE):
+            block_end = min(end_address,
+                            block_start + self.CALL_SCAN_BLOCK_SIZE)
+            data = addr_space.read(
+                block_start,
+                block_end - block_start + self.MAX_INSTRUCTION_LENGTH)
+
+            # The addresses in this block where a call could start. A REX
+            # prefix may be the last byte of the block.
+            candidates = set()
+            for match in self.CALL_PATTERN.finditer(
+                    data, 0, block_end - block_start + 3):
+                address = block_start + match.start()
+                if (rex_prefix and match.start() and
+                        "\x40" <= data[match.start() - 1] <= "\x4f"):
+                    candidates.add(address - 1)
+
+                candidates.add(address)
+
+            # An instruction may run into this block from the last one.
+            sweep_offset = next_address - block_start
+            for address, size in func_obj.dis.disassemble_lite(
+                    data[sweep_offset:], next_address):
+                if address >= block_end:
+                    break
+
+                next_address = address + size
+                if address not in candidates:
+                    continue
 
-            context = {}
-            if (instruction.match_rule(self.CALL_RULE, context) or
-                    instruction.match_rule(self.JMP_RULE, context)):
-                target = context.get("$target")
-                if target:
-                    yield (instruction.address,
-                           context.get("$address"),
-                           self.profile.Function(vm=addr_space, offset=target))
+                offset = address - block_start
+                for instruction in func_obj.dis.disassemble(
+                        data[offset:offset + self.MAX_INSTRUCTION_LENGTH],
+                        address):
+                    break
+                else:
+                    continue
+
+                context = {}
+                if (instruction.match_rule(self.CALL_RULE, context) or
+                        instruction.match_rule(self.JMP_RULE, context)):
+                    target = context.get("$target")
+                    if target:
+                        yield (instruction.address,
+                               context.get("$address"),
+                               self.profile.Function(vm=addr_space,
+                                                     offset=target))
 
     def find_process_imports(self, task):
         task_space = task.get_process_address_space()
@@ -252,8 +320,9 @@ class ImpScan(common.WinProcessFilter):
         for iat, (_, func_pointer) in sorted(calls_imported.iteritems()):
             tmp = apis.get(func_pointer.obj_offset)
             if tmp:
-                module, func_pointer, func_name = tmp
-                yield iat, func_pointer, module, func_name
+                module, func_address, func_name = tmp
+                yield (iat, self._make_function(module, func_address),
+                       module, func_name)
 
     def find_kernel_import(self):
         # If the user has not specified the base, we just use the kernel's
@@ -289,12 +358,14 @@ class ImpScan(common.WinProcessFilter):
                        base_address, size_to_read)
 
         for iat, (address, func_pointer) in sorted(calls_imported.items()):
-            module, func_pointer, func_name = apis.get(func_pointer.v(), (
-                obj.NoneObject("Unknown"),
-                obj.NoneObject("Unknown"),
-                obj.NoneObject("Unknown")))
-
-            yield iat, func_pointer, module, func_name
+            tmp = apis.get(func_pointer.v())
+            if tmp:
+                module, func_address, func_name = tmp
+                yield (iat, self._make_function(module, func_address),
+                       module, func_name)
+            else:
+                yield (iat, obj.NoneObject("Unknown"),
+                       obj.NoneObject("Unknown"), obj.NoneObject("Unknown"))
 
     def render(self, renderer):
         table_header = [("IAT", 'iat', "[addrpad]"),
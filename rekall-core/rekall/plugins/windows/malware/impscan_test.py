@@ -0,0 +1,196 @@
+"""Tests for the impscan plugin."""
+import struct
+
+from rekall import addrspace
+from rekall import obj
+from rekall import session
+from rekall import testlib
+from rekall.plugins.tools import disassembler
+from rekall.plugins.windows.malware import impscan
+
+
+class StaticImpScan(impscan.ImpScan):
+    """An impscan plugin over fixed modules and exports."""
+
+    def __init__(self, session=None, profile=None, exports=None):
+        # Do not look for processes.
+        self.session = session
+        self.profile = profile
+        self.exports = exports
+
+    def _enum_apis(self, all_mods):
+        return self.exports
+
+
+class FakeModule(object):
+    """A loaded module (like _LDR_DATA_TABLE_ENTRY)."""
+
+    def __init__(self, name, base, size, address_space):
+        self.BaseDllName = name
+        self.DllBase = base
+        self.SizeOfImage = size
+        self.obj_vm = address_space
+
+
+class FakeTask(object):
+    """A process with a fixed address space and modules."""
+
+    def __init__(self, address_space, modules):
+        self.address_space = address_space
+        self.modules = modules
+
+    def get_process_address_space(self):
+        return self.address_space
+
+    def get_load_modules(self):
+        return self.modules
+
+
+class CallScanTest(testlib.RekallBaseUnitTestCase):
+    """Test the prefiltered call scan against a linear sweep."""
+
+    BASE = 0x400000
+
+    IAT = BASE + 0x1000
+
+    # Code for each mode as (bytes, is an import call, offset of a rip
+    # relative displacement to the IAT).
+    CODE = {
+        "I386": [
+            # call dword [0x401000]
+            ("\xff\x15\x00\x10\x40\x00", True, None),
+            # mov dword [0x401020], 0x100015ff; inc eax; add al, al - the
+            # immediate decodes as call dword [0x401000] from its 7th byte.
+            ("\xc7\x05\x20\x10\x40\x00\xff\x15\x00\x10\x40\x00\xc0",
+             False, None),
+            # jmp dword [0x401004]
+            ("\xff\x25\x04\x10\x40\x00", True, None),
+            # push 0x4015ff90
+            ("\x68\x90\xff\x15\x40", False, None),
+            # call dword [0x401008] through a SIB byte.
+            ("\xff\x14\x25\x08\x10\x40\x00", True, None),
+            # call dword [0x401010] - the IAT entry is empty.
+            ("\xff\x15\x10\x10\x40\x00", False, None),
+        ],
+        "AMD64": [
+            # call qword [rip + IAT]
+            ("\xff\x15\x00\x00\x00\x00", True, 2),
+            # mov rax, imm64 - the immediate decodes as call qword [rip + IAT]
+            # from its 5th byte.
+            ("\x48\xb8\x90\x90\xff\x15\x00\x00\x00\x00", False, 6),
+            # jmp qword [rip + IAT] with a REX prefix.
+            ("\x48\xff\x25\x00\x00\x00\x00", True, 3),
+            # call qword [IAT + 8] through a SIB byte.
+            ("\xff\x14\x25\x08\x10\x40\x00", True, None),
+            # push 0x15ff90
+            ("\x68\x90\xff\x15\x00", False, None),
+        ],
+    }
+
+    def _MakeImage(self, mode):
+        """Returns the image, the size of its code and the import calls."""
+        code = ""
+        calls = []
+        for i in range(40):
+            instruction, is_call, rip_offset = self.CODE[mode][
+                i % len(self.CODE[mode])]
+
+            if rip_offset is not None:
+                # The displacement is relative to the end of the instruction.
+                end = self.BASE + len(code) + rip_offset + 4
+                instruction = (instruction[:rip_offset] +
+                               struct.pack("<i", self.IAT - end) +
+                               instruction[rip_offset + 4:])
+
+            if is_call:
+                calls.append(self.BASE + len(code))
+
+            # Vary the alignment of the instructions.
+            code += instruction + "\x90" * (i % 7)
+
+        self.assertTrue(len(code) < 0x1000)
+
+        if mode == "AMD64":
+            iat = struct.pack("<QQ", 0x7ff700000010, 0x7ff700000020)
+        else:
+            iat = struct.pack("<III", 0x77000010, 0x77000020, 0x77000030)
+
+        return (code.ljust(0x1000, "\xcc") + iat.ljust(0x1000, "\x00"),
+                len(code), calls)
+
+    def _LinearSweep(self, profile, address_space, size):
+        """Disassemble every instruction like call_scan used to."""
+        result = []
+        func = profile.Function(vm=address_space, offset=self.BASE)
+        for instruction in func.disassemble(2**32):
+            if instruction.address >= self.BASE + size:
+                break
+
+            context = {}
+            if (instruction.match_rule(impscan.ImpScan.CALL_RULE, context) or
+                    instruction.match_rule(impscan.ImpScan.JMP_RULE, context)):
+                if context.get("$target"):
+                    result.append((instruction.address,
+                                   context.get("$address"),
+                                   context.get("$target")))
+
+        return result
+
+    def _CheckCallScan(self, profile_class, mode):
+        test_session = session.Session()
+        profile = obj.Profile.classes[profile_class](session=test_session)
+        test_session.profile = profile
+
+        data, size, calls = self._MakeImage(mode)
+        address_space = addrspace.BufferAddressSpace(
+            data=data, base_offset=self.BASE, session=test_session)
+
+        # The linear sweep does not decode the calls inside immediates.
+        expected = self._LinearSweep(profile, address_space, size)
+        self.assertEqual([x[0] for x in expected], calls)
+
+        scanner = StaticImpScan(session=test_session, profile=profile)
+        for block_size in (1024 * 1024, 16, 7):
+            scanner.CALL_SCAN_BLOCK_SIZE = block_size
+            self.assertEqual(
+                [(address, iat, int(function)) for address, iat, function in
+                 scanner.call_scan(address_space, self.BASE, size)],
+                expected)
+
+    def testCallScanI386(self):
+        self._CheckCallScan("Profile32Bits", "I386")
+
+    def testCallScanAMD64(self):
+        self._CheckCallScan("ProfileLLP64", "AMD64")
+
+    def testFindProcessImports(self):
+        test_session = session.Session()
+        profile = obj.Profile.classes["Profile32Bits"](session=test_session)
+        test_session.profile = profile
+
+        data, size, _ = self._MakeImage("I386")
+        address_space = addrspace.BufferAddressSpace(
+            data=data, base_offset=self.BASE, session=test_session)
+
+        executable = FakeModule("test.exe", self.BASE, size, address_space)
+        kernel32 = FakeModule("kernel32.dll", 0x77000000, 0x1000,
+                              address_space)
+        exports = {
+            0x77000010: (kernel32, 0x77000010, "CreateFileA"),
+            0x77000020: (kernel32, 0x77000020, "ReadFile"),
+        }
+
+        scanner = StaticImpScan(session=test_session, profile=profile,
+                                exports=exports)
+        imports = list(scanner.find_process_imports(
+            FakeTask(address_space, [executable, kernel32])))
+
+        self.assertEqual(
+            [(iat, int(func), module.BaseDllName, name)
+             for iat, func, module, name in imports],
+            [(self.IAT, 0x77000010, "kernel32.dll", "CreateFileA"),
+             (self.IAT + 4, 0x77000020, "kernel32.dll", "ReadFile")])
+
+        # The functions are Function objects, like the kernel imports.
+        for _, func, _, _ in imports:
+            self.assertTrue(isinstance(func, disassembler.Function))
@@ -44,18 +44,8 @@ class Malfind(core.DirectoryDumperMixin, common.WinProcessFilter):
         @param address_space: the process address space
         """
 
-        PAGE_SIZE = 0x1000
-        all_zero_page = "\x00" * PAGE_SIZE
-
-        offset = 0
-        while offset < vad.Length:
-            next_addr = vad.Start + offset
-            if (address_space.is_valid_address(next_addr) and
-                    address_space.read(next_addr, PAGE_SIZE) != all_zero_page):
-                return False
-            offset += PAGE_SIZE
-
-        return True
+        start = int(vad.Start)
+        return address_space.is_range_empty(start, start + int(vad.Length))
 
     def _injection_filter(self, vad, task_as):
         """Detects injected vad regions.
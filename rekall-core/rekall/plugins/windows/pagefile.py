@@ -40,6 +40,11 @@ http://www.rekall-forensic.com/docs/References/Papers/p1138-cohen.pdf
 __author__ = "Michael Cohen <scudette@google.com>"
 import struct
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from rekall import addrspace
 from rekall import obj
 from rekall import utils
@@ -238,6 +243,9 @@ class WindowsPagedMemoryMixin(object):
         self._resolve_vads = True
         self._vad = None
 
+        # The number of times the vads were needed but not available.
+        self._skipped_vad_lookups = 0
+
         # We cache these bitfields in order to speed up mask calculations. We
         # derive them initially from the profile so we do not need to hardcode
         # any bit positions.
@@ -254,6 +262,9 @@ class WindowsPagedMemoryMixin(object):
         self.proto_transition_valid_mask = (self.proto_transition_mask |
                                             self.valid_mask)
         self.transition_valid_mask = self.transition_mask | self.valid_mask
+
+        # Valid and transition PTEs both point directly at the page frame.
+        self.direct_pte_mask = self.transition_valid_mask
         self.task = None
 
         self.base_as_can_map_files = self.base.metadata("can_map_files")
@@ -264,7 +275,7 @@ class WindowsPagedMemoryMixin(object):
 
     @property
     def vad(self):
-        """Returns a cached RangedCollection() of vad ranges."""
+        """Returns a cached IntervalIndex() of vad ranges."""
 
         # If this dtb is the same as the kernel dtb - there are no vads.
         if self.dtb == self.session.GetParameter("dtb"):
@@ -276,6 +287,7 @@ class WindowsPagedMemoryMixin(object):
 
         # We can not run plugins in recursive context.
         if not self._resolve_vads:
+            self._skipped_vad_lookups += 1
             return obj.NoneObject("vads not available right now")
 
         try:
@@ -292,15 +304,21 @@ class WindowsPagedMemoryMixin(object):
                 # for some of the address transition.
                 self.task = self.session.GetParameter("dtb2task").get(self.dtb)
 
-            self._vad = utils.RangedCollection()
+            self._vad = utils.IntervalIndex()
             task = self.session.profile._EPROCESS(self.task)
-            for vad in task.RealVadRoot.traverse():
-                self._vad.insert(vad.Start, vad.End, vad)
+            self._vad.insert_many(
+                (vad.Start, vad.End, vad)
+                for vad in task.RealVadRoot.traverse())
 
             return self._vad
         finally:
             self._resolve_vads = True
 
+    def _get_skipped_translations(self):
+        # Pages which are only described by the vads are missed while the
+        # vads are not available.
+        return self._skipped_vad_lookups
+
     def _get_available_PTEs(self, pte_table, vaddr, start=0):
         """Scan the PTE table and yield address ranges which are valid."""
         tmp = vaddr
@@ -313,27 +331,42 @@ class WindowsPagedMemoryMixin(object):
             if start >= next_vaddr:
                 continue
 
+            run = self._get_PTE_run(vaddr, pte_value)
+            if run is not None:
+                yield run
 
-            # A PTE value of 0 means to consult the vad, but the vad shows no
-            # mapping at this virtual address, so we can just skip this PTE in
-            # the iteration.
-            if self.vad:
-                start, end, run = self.vad.get_containing_range(vaddr)
-                if pte_value == 0 and start is None:
-                    continue
+    def _get_slow_PTE_indexes(self, pte_table, direct):
+        # With VADs even an empty PTE may be resolved through a prototype PTE,
+        # otherwise only the non empty PTEs need a closer look.
+        if self.vad:
+            return numpy.flatnonzero(~direct).tolist()
 
-            elif pte_value == 0:
-                continue
+        return numpy.flatnonzero(~direct & (pte_table != 0)).tolist()
+
+    def _get_slow_PTE_run(self, pte_table, index, vaddr):
+        return self._get_PTE_run(vaddr | (index << 12), int(pte_table[index]))
+
+    def _get_PTE_run(self, vaddr, pte_value):
+        """Returns a Run for the page at vaddr or None if it is not mapped."""
+        # A PTE value of 0 means to consult the vad, but the vad shows no
+        # mapping at this virtual address, so we can just skip this PTE.
+        if pte_value == 0:
+            if not self.vad:
+                return
+
+            start, _, _ = self.vad.get_containing_range(vaddr)
+            if start is None:
+                return
 
-            phys_addr = self._get_phys_addr_from_pte(vaddr, pte_value)
+        phys_addr = self._get_phys_addr_from_pte(vaddr, pte_value)
 
-            # Only yield valid physical addresses. This will skip DemandZero
-            # pages and File mappings into the filesystem.
-            if phys_addr is not None:
-                yield addrspace.Run(start=vaddr,
-                                    end=vaddr + 0x1000,
-                                    file_offset=phys_addr,
-                                    address_space=self.base)
+        # Only yield valid physical addresses. This will skip DemandZero
+        # pages and File mappings into the filesystem.
+        if phys_addr is not None:
+            return addrspace.Run(start=vaddr,
+                                 end=vaddr + 0x1000,
+                                 file_offset=phys_addr,
+                                 address_space=self.base)
 
     def _get_phys_addr_from_pte(self, vaddr, pte_value):
         """Gets the final physical address from the PTE value."""
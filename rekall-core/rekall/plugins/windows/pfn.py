@@ -26,6 +26,11 @@
 
 # pylint: disable=protected-access
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from rekall import testlib
 from rekall import obj
 from rekall import plugin
@@ -33,6 +38,21 @@ from rekall.plugins import core
 from rekall.plugins.windows import common
 from rekall.plugins.overlays import basic
 
+# The values of _MMPFN.u3.e1.PageLocation.
+PAGE_LOCATIONS = {
+    0: 'ZeroedPageList',
+    1: 'FreePageList',
+    2: 'StandbyPageList',
+    3: 'ModifiedPageList',
+    4: 'ModifiedNoWritePageList',
+    5: 'BadPageList',
+    6: 'ActiveAndValid',
+    7: 'TransitionPage'
+}
+
+ACTIVE_AND_VALID = 6
+
+
 class ValueEnumeration(basic.Enumeration):
     """An enumeration which receives its value from a callable."""
 
@@ -61,17 +81,7 @@ class PFNModification(obj.ProfileModification):
             '_MMPFN': [None, {
                 "Type": [0, ["ValueEnumeration", dict(
                     value=lambda x: x.u3.e1.PageLocation,
-                    choices={
-                        0: 'ZeroedPageList',
-                        1: 'FreePageList',
-                        2: 'StandbyPageList',
-                        3: 'ModifiedPageList',
-                        4: 'ModifiedNoWritePageList',
-                        5: 'BadPageList',
-                        6: 'ActiveAndValid',
-                        7: 'TransitionPage'
-                        }
-                    )]],
+                    choices=PAGE_LOCATIONS)]],
                 }],
             '_KDDEBUGGER_DATA64': [None, {
                 # This is the pointer to the PFN database.
@@ -132,6 +142,42 @@ class PFNInfo(common.WindowsCommandPlugin):
 
         self.pfn = pfn
         self.physical_address = physical_address
+        self._pfn_database_view = None
+
+    def memory_model(self):
+        if self.profile.metadata("arch") == "AMD64":
+            return "x64"
+
+        if self.profile.metadata("pae"):
+            return "pae"
+
+        return "x86"
+
+    def pfn_database_view(self):
+        """Returns a PFNDatabase for the entire PFN database.
+
+        The view is only built once since it reads the whole database.
+        """
+        result = self._pfn_database_view
+        if result is None:
+            highest_page = self.profile.get_constant_object(
+                "MmHighestPhysicalPage", "address")
+
+            if highest_page == None:
+                count = (self.session.physical_address_space.end() >>
+                         self.PAGE_BITS)
+            else:
+                count = int(highest_page) + 1
+
+            result = PFNDatabase(
+                profile=self.profile,
+                address_space=self.session.kernel_address_space,
+                offset=self.pfn_database.deref().obj_offset,
+                count=count, session=self.session)
+
+            self._pfn_database_view = result
+
+        return result
 
     def pfn_record(self, pfn=None, physical_address=None):
         """Returns the pfn record for a pfn or a virtual address."""
@@ -191,6 +237,185 @@ class PFNInfo(common.WindowsCommandPlugin):
                         long_flags_string)
 
 
+class PFNDatabase(object):
+    """A bulk view of the PFN database backed by numpy arrays.
+
+    The entire database is read once and the interesting fields of each _MMPFN
+    are decoded (using the profile's offsets) into one numpy array per field.
+    This allows queries over all physical pages without creating an _MMPFN
+    object per page.
+    """
+
+    PAGE_BITS = 12
+
+    # _MMPFN members we decode. Missing members are ignored.
+    FIELDS = dict(
+        Type="u3.e1.PageLocation",
+        PteAddress="PteAddress",
+        PteFrame="u4.PteFrame",
+        ShareCount="u2.ShareCount",
+        ReferenceCount="u3.e2.ReferenceCount",
+    )
+
+    # Number of records read at once.
+    CHUNK_RECORDS = 0x10000
+
+    # The (shift, mask) used to rebuild the virtual address at each level of
+    # the page tables, for each memory model.
+    LEVELS = dict(
+        x86=[(10, 0x3FF000), (20, 0xffc00000)],
+        pae=[(9, 0x1FF000), (18, 0x3fe00000), (27, 0x7FC0000000)],
+        x64=[(9, 0x1FF000), (18, 0x3fe00000), (27, 0x7FC0000000),
+             (36, 0xff8000000000)],
+    )
+
+    def __init__(self, profile=None, address_space=None, offset=None,
+                 count=None, session=None):
+        """Reads the PFN database.
+
+        Args:
+          profile: The kernel profile (with the PFNModification applied).
+          address_space: The kernel address space.
+          offset: The address of the first _MMPFN record.
+          count: The number of records to read.
+        """
+        if numpy is None:
+            raise plugin.PluginError("The numpy module is required.")
+
+        self.profile = profile
+        self.session = session
+        self.count = count
+        self.record_size = profile.get_obj_size("_MMPFN")
+
+        layout = self._GetLayout()
+        dtype = numpy.dtype(dict(
+            names=["f%d" % i for i in range(len(layout))],
+            formats=["<u%d" % x[1] for x in layout],
+            offsets=[x[0] for x in layout],
+            itemsize=self.record_size))
+
+        fields = {}
+        for name, (raw, _, _) in self._fields.iteritems():
+            fields[name] = numpy.zeros(
+                count, dtype="<u1" if name == "Type" else "<u%d" % raw[1])
+
+        buffer = bytearray(self.CHUNK_RECORDS * self.record_size)
+        for start in xrange(0, count, self.CHUNK_RECORDS):
+            records = min(self.CHUNK_RECORDS, count - start)
+            if session:
+                session.report_progress("Reading PFN database %d/%d",
+                                        start, count)
+
+            view = memoryview(buffer)[:records * self.record_size]
+            address_space.read_into(offset + start * self.record_size, view)
+            data = numpy.frombuffer(buffer, dtype=dtype, count=records)
+
+            for name, (raw, start_bit, mask) in self._fields.iteritems():
+                value = data["f%d" % layout.index(raw)]
+                if mask is not None:
+                    value = (value >> start_bit) & mask
+
+                fields[name][start:start + records] = value
+
+        self.fields = fields
+
+    def _GetLayout(self):
+        """Find the offset, size and bit range of each field in _MMPFN."""
+        prototype = self.profile.GetPrototype("_MMPFN")
+        self._fields = {}
+        layout = []
+        for name, path in self.FIELDS.iteritems():
+            member = prototype
+            for part in path.split("."):
+                member = member.m(part)
+
+            if member == None:
+                continue
+
+            start_bit, mask = 0, None
+            if isinstance(member, obj.BitField):
+                start_bit = member.start_bit
+                mask = (1 << (member.end_bit - member.start_bit)) - 1
+                member = member._proxy
+
+            raw = (member.obj_offset, member.obj_size)
+            if raw not in layout:
+                layout.append(raw)
+
+            self._fields[name] = (raw, start_bit, mask)
+
+        for name in ("Type", "PteAddress", "PteFrame"):
+            if name not in self._fields:
+                raise plugin.PluginError(
+                    "_MMPFN has no member %s" % self.FIELDS[name])
+
+        return layout
+
+    def __getitem__(self, name):
+        return self.fields[name]
+
+    def type_counts(self):
+        """Returns a dict of the number of pages in each page list."""
+        counts = numpy.bincount(self.fields["Type"],
+                                minlength=len(PAGE_LOCATIONS))
+        return dict((PAGE_LOCATIONS.get(i, i), int(count))
+                    for i, count in enumerate(counts) if count)
+
+    def _lookup(self, field, pfns):
+        # PFNs outside the database are reported as 0.
+        valid = pfns < self.count
+        values = numpy.where(valid, self.fields[field][pfns * valid], 0)
+        return values.astype("<u8"), valid
+
+    def ptov(self, physical_addresses, memory_model="x64"):
+        """Converts many physical addresses to virtual addresses at once.
+
+        This is a vectorized version of PtoV.ptov().
+
+        Args:
+          physical_addresses: A list or array of physical addresses.
+          memory_model: One of "x86", "pae" or "x64".
+
+        Returns:
+          A tuple of numpy arrays (virtual addresses, DTBs, valid). Addresses
+          which could not be converted have valid set to False.
+        """
+        physical_addresses = numpy.asarray(physical_addresses, dtype="<u8")
+        result = physical_addresses & 0xFFF
+        pfns = physical_addresses >> self.PAGE_BITS
+        valid = numpy.ones(len(physical_addresses), dtype=bool)
+
+        for shift, mask in self.LEVELS[memory_model]:
+            page_type, in_range = self._lookup("Type", pfns)
+            valid &= in_range & (page_type == ACTIVE_AND_VALID)
+
+            containing_page, _ = self._lookup("PteFrame", pfns)
+            pte_address, _ = self._lookup("PteAddress", pfns)
+            table_address = ((containing_page << self.PAGE_BITS) |
+                             (pte_address & 0xFFF))
+
+            result |= (table_address << shift) & mask
+            pfns = containing_page
+
+        # Now get the DTB.
+        containing_page, in_range = self._lookup("PteFrame", pfns)
+        valid &= in_range
+
+        return result, containing_page << self.PAGE_BITS, valid
+
+    def page_ownership(self, memory_model="x64"):
+        """Counts the valid pages mapped by each DTB.
+
+        Returns:
+          A dict of DTB to the number of pages it maps.
+        """
+        pfns = numpy.flatnonzero(self.fields["Type"] == ACTIVE_AND_VALID)
+        _, dtbs, valid = self.ptov(pfns << self.PAGE_BITS, memory_model)
+        dtbs, counts = numpy.unique(dtbs[valid], return_counts=True)
+
+        return dict(zip(dtbs.tolist(), counts.tolist()))
+
+
 class PtoV(common.WinProcessFilter):
     """Converts a physical address to a virtual address."""
 
@@ -367,6 +592,15 @@ class PtoV(common.WinProcessFilter):
                         ("PDE", pde_address),
                         ("PTE", pte_address))
 
+    def bulk_ptov(self, physical_addresses):
+        """Convert many physical addresses at once using the PFN database.
+
+        Returns:
+          A tuple of numpy arrays (virtual addresses, DTBs, valid).
+        """
+        return self.pfn_plugin.pfn_database_view().ptov(
+            physical_addresses, self.pfn_plugin.memory_model())
+
     def ptov(self, physical_address):
         """Convert the physical address to a virtual address.
 
@@ -400,6 +634,37 @@ class PtoV(common.WinProcessFilter):
                             "{1}\n", self.physical_address, result)
 
 
+class PFNSummary(common.WindowsCommandPlugin):
+    """Summarize the PFN database by page list and owning process."""
+
+    __name = "pfn_summary"
+
+    def render(self, renderer):
+        pfn_plugin = self.session.plugins.pfn(session=self.session)
+        database = pfn_plugin.pfn_database_view()
+
+        renderer.section("Page lists")
+        renderer.table_header([("List", "list", "<30"),
+                               ("Pages", "pages", ">12")])
+
+        for name, count in sorted(database.type_counts().items()):
+            renderer.table_row(name, count)
+
+        dtb_map = {}
+        for task in self.session.plugins.pslist().filter_processes():
+            dtb_map[task.Pcb.DirectoryTableBase.v()] = task
+
+        renderer.section("Pages by owner")
+        renderer.table_header([("DTB", "dtb", "[addrpad]"),
+                               ("Pages", "pages", ">12"),
+                               dict(name="Process", type="_EPROCESS")])
+
+        ownership = database.page_ownership(pfn_plugin.memory_model())
+        for dtb, count in sorted(ownership.items()):
+            renderer.table_row(
+                dtb, count, dtb_map.get(dtb, obj.NoneObject("Unknown")))
+
+
 class DTBScan2(common.WindowsCommandPlugin):
     """A Fast scanner for hidden DTBs.
 
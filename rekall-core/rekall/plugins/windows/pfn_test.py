@@ -21,7 +21,14 @@
 #
 
 """Tests for the pfn plugins."""
+import struct
+
+from rekall import addrspace
+from rekall import obj
+from rekall import session
 from rekall import testlib
+from rekall.plugins.windows import pfn
+
 
 class TestVtoP(testlib.SimpleTestCase):
     # Create a test case by running the vadmap plugin and selecting at least one
@@ -47,3 +54,78 @@ class TestPFN(testlib.SimpleTestCase):
         commandline="pfn %(pfn)s",
         pfn=0
     )
+
+
+class PFNDatabaseTest(testlib.RekallBaseUnitTestCase):
+    """Test the bulk PFN database view."""
+
+    # A minimal _MMPFN.
+    VTYPES = {
+        '_MMPFN': [48, {
+            'PteAddress': [8, ['Pointer', dict(target='unsigned long long')]],
+            'u2': [16, ['_U2']],
+            'u3': [24, ['_U3']],
+            'u4': [40, ['_U4']],
+        }],
+        '_U2': [8, {'ShareCount': [0, ['unsigned long long']]}],
+        '_U3': [8, {'e1': [0, ['_E1']], 'e2': [0, ['_E2']]}],
+        '_E1': [2, {'PageLocation': [0, ['BitField', dict(
+            start_bit=0, end_bit=3, native_type='unsigned short')]]}],
+        '_E2': [4, {'ReferenceCount': [2, ['unsigned short']]}],
+        '_U4': [8, {'PteFrame': [0, ['BitField', dict(
+            start_bit=0, end_bit=52, native_type='unsigned long long')]]}],
+    }
+
+    def setUp(self):
+        self.session = session.Session()
+        self.profile = obj.Profile.classes["ProfileLLP64"](
+            session=self.session)
+        self.profile.add_types(self.VTYPES)
+
+        # A chain of page tables: page 10 is mapped by a PTE in page 20, which
+        # is mapped by page 30 etc. Page 50 is the PML4.
+        self.records = {}
+        for page, (frame, pte) in {10: (20, 0x18), 20: (30, 0x30),
+                                   30: (40, 0x48), 40: (50, 0x60),
+                                   50: (50, 0x78)}.items():
+            self.records[page] = (pfn.ACTIVE_AND_VALID, frame,
+                                  0xFFFFF68000000000 | pte)
+
+        data = []
+        for page in range(64):
+            page_type, frame, pte = self.records.get(page, (page % 6, 0, 0))
+            data.append(struct.pack(
+                "<QQQHHIQQ", 0, pte, 1, page_type, 3, 0, 0, frame))
+
+        self.address_space = addrspace.BufferAddressSpace(
+            data="".join(data), session=self.session)
+
+    def testPFNDatabase(self):
+        database = pfn.PFNDatabase(
+            profile=self.profile, address_space=self.address_space,
+            offset=0, count=64, session=self.session)
+
+        self.assertEqual(database["PteFrame"][10], 20)
+        self.assertEqual(database["ReferenceCount"][10], 3)
+        self.assertEqual(database["Type"][1], 1)
+
+        counts = database.type_counts()
+        self.assertEqual(counts["ActiveAndValid"], 5)
+        self.assertEqual(sum(counts.values()), 64)
+
+        # Compute the expected virtual address one level at a time.
+        expected = 0x123
+        page = 10
+        for shift, mask in pfn.PFNDatabase.LEVELS["x64"]:
+            _, frame, pte = self.records[page]
+            expected |= (((frame << 12) | (pte & 0xFFF)) << shift) & mask
+            page = frame
+
+        result, dtbs, valid = database.ptov(
+            [(10 << 12) | 0x123, 1 << 12, 1000 << 12])
+
+        self.assertEqual(valid.tolist(), [True, False, False])
+        self.assertEqual(int(result[0]), expected)
+        self.assertEqual(int(dtbs[0]), 50 << 12)
+
+        self.assertEqual(database.page_ownership(), {50 << 12: 5})
@@ -27,6 +27,7 @@ __author__ = ("Michael Cohen <scudette@gmail.com> based on original code "
 
 # pylint: disable=protected-access
 
+import collections
 import ntpath
 import re
 import struct
@@ -169,6 +170,11 @@ class HiveAddressSpace(HiveBaseAddressSpace):
     CI_OFF_MASK = 0x0FFF
     CI_OFF_SHIFT = 0x0
 
+    # The number of _HMAP_ENTRY in each _HMAP_TABLE and the maximum number of
+    # tables in the _HMAP_DIRECTORY.
+    HMAP_TABLE_SIZE = 0x200
+    HMAP_DIRECTORY_SIZE = 0x400
+
     def __init__(self, hive_addr=None, profile=None, **kwargs):
         """Translate between hive addresses and virtual memory addresses.
 
@@ -192,8 +198,55 @@ class HiveAddressSpace(HiveBaseAddressSpace):
         # This is a quick lookup for blocks.
         self.block_cache = utils.FastStore(max_size=1000)
 
+        # The block addresses of the stable and volatile storage, indexed by
+        # the table and block parts of the cell index (see _build_block_map).
+        self.block_map = None
+
         self.logging = self.session.logging.getChild("addrspace.hive")
 
+    def _build_block_map(self):
+        """Precompute the address of every block in the hive's storage.
+
+        Each _HMAP_TABLE is read from memory in one go and the block addresses
+        are decoded directly, so translating a cell index is a list lookup.
+        """
+        entry_size = self.profile.get_obj_size("_HMAP_ENTRY")
+        table_offset = self.profile.get_obj_offset("_HMAP_TABLE", "Table")
+
+        # Windows 10 uses a different field (see _HMAP_ENTRY.BlockAddress).
+        field_offset = self.profile.get_obj_offset(
+            "_HMAP_ENTRY", "BlockAddress")
+        mask = 0xffffffffffffffff
+        if field_offset == None:
+            field_offset = self.profile.get_obj_offset(
+                "_HMAP_ENTRY", "PermanentBinAddress")
+            mask = 0xfffffffffff0
+
+        if self.profile.metadata("arch") == "AMD64":
+            field = struct.Struct("<Q")
+        else:
+            field = struct.Struct("<I")
+
+        self.block_map = []
+        for storage in self.storage:
+            blocks = min(storage.Length.v() / self.BLOCK_SIZE,
+                         self.HMAP_TABLE_SIZE * self.HMAP_DIRECTORY_SIZE)
+
+            block_map = []
+            directory = storage.Map.Directory
+            for table in xrange(0, blocks, self.HMAP_TABLE_SIZE):
+                count = min(blocks - table, self.HMAP_TABLE_SIZE)
+                data = self.base.read(
+                    directory[table / self.HMAP_TABLE_SIZE].v() + table_offset,
+                    count * entry_size)
+
+                for offset in xrange(field_offset, count * entry_size,
+                                     entry_size):
+                    block_map.append(
+                        field.unpack_from(data, offset)[0] & mask)
+
+            self.block_map.append(block_map)
+
     def vtop(self, vaddr):
         vaddr = int(vaddr)
 
@@ -203,9 +256,23 @@ class HiveAddressSpace(HiveBaseAddressSpace):
             return self.baseblock + vaddr + self.BLOCK_SIZE + 4
 
         ci_type = (vaddr & self.CI_TYPE_MASK) >> self.CI_TYPE_SHIFT
+        ci_off = (vaddr & self.CI_OFF_MASK) >> self.CI_OFF_SHIFT
+
+        if self.block_map is None:
+            self._build_block_map()
+
+        # The table and block parts of the cell index together are the index
+        # of the block in the storage.
+        block_index = (vaddr & (self.CI_TABLE_MASK | self.CI_BLOCK_MASK)) >> (
+            self.CI_BLOCK_SHIFT)
+
+        block_map = self.block_map[ci_type]
+        if block_index < len(block_map):
+            return block_map[block_index] + ci_off + 4
+
+        # Cells outside the storage length are looked up the slow way.
         ci_table = (vaddr & self.CI_TABLE_MASK) >> self.CI_TABLE_SHIFT
         ci_block = (vaddr & self.CI_BLOCK_MASK) >> self.CI_BLOCK_SHIFT
-        ci_off = (vaddr & self.CI_OFF_MASK) >> self.CI_OFF_SHIFT
 
         try:
             block = self.block_cache.Get((ci_type, ci_table, ci_block))
@@ -527,6 +594,16 @@ class Registry(object):
             address_space = HiveFileAddressSpace(base=base_as)
 
         self.address_space = address_space
+        self.stable = stable
+
+        # Maps lower case key paths (relative to the root and separated with
+        # \\) to the offset of the key node. Built by walk().
+        self.key_index = None
+
+        # The key index is cached in the session under this key.
+        self.cache_key = None
+        if filename is not None:
+            self.cache_key = (filename, stable)
 
         root_index = self.ROOT_INDEX
         if not stable:
@@ -543,6 +620,10 @@ class Registry(object):
     def open_key(self, key=""):
         """Opens a key.
 
+        If the key index for the hive was built (see walk() and
+        BuildKeyIndex()), lookups are dict lookups. Otherwise the subkeys of
+        each path component are searched.
+
         Args:
            key: A string path to the key (separated with / or \\) or a list of
               path components (useful if the keyname contains /).
@@ -551,12 +632,113 @@ class Registry(object):
             # / can be part of the key name...
             key = filter(None, re.split(r"[\\/]", key))
 
+        key_index = self._get_key_index()
+        if key_index is not None:
+            return self._open_indexed_key(key_index, key)
+
         result = self.root
         for component in key:
             result = result.open_subkey(component)
 
         return result
 
+    def _open_indexed_key(self, key_index, components):
+        result = self.root
+        path = []
+        for component in components:
+            path.append(component.lower())
+            offset = key_index.get("\\".join(path))
+            if offset is None:
+                return obj.NoneObject("Couldn't find subkey {0} of {1}",
+                                      component, result.Name)
+
+            result = self.profile._CM_KEY_NODE(
+                offset=offset, vm=self.address_space, parent=result)
+
+        return result
+
+    def _get_key_index(self):
+        """Returns the key index if it was built before (possibly cached)."""
+        if (self.key_index is None and self.cache_key is not None and
+                self.session is not None):
+            key_indexes = self.session.GetParameter("registry_key_index")
+            if key_indexes:
+                self.key_index = key_indexes.get(self.cache_key)
+
+        return self.key_index
+
+    def walk(self, key=""):
+        """Walk all the keys under key in breadth first order.
+
+        Each key node is only instantiated once. Walking the entire hive (the
+        default) also builds the key index which is then used by open_key()
+        and cached in the session.
+
+        Yields:
+          (path, last write time, values) tuples, where path is the same as
+          the key's Path and values is an iterator over the key's values.
+        """
+        if key:
+            root = self.open_key(key)
+        else:
+            root = self.root
+
+        if not root:
+            return
+
+        key_index = None
+        if not key:
+            key_index = {}
+
+        seen = set()
+        queue = collections.deque([(root, root.Path, "")])
+        while queue:
+            node, path, index_path = queue.popleft()
+            # Subkeys may be pointers to the key node, so we use int() to get
+            # the offset of the key node itself.
+            offset = int(node)
+            if offset in seen:
+                continue
+
+            seen.add(offset)
+            yield path, node.LastWriteTime, node.values()
+
+            for subkey in node.subkeys():
+                name = unicode(subkey.Name)
+                if index_path:
+                    subkey_index_path = index_path + "\\" + name.lower()
+                else:
+                    subkey_index_path = name.lower()
+
+                # The first key with a name is used, like open_subkey().
+                if key_index is not None:
+                    key_index.setdefault(subkey_index_path, int(subkey))
+
+                queue.append((subkey, path + "/" + name, subkey_index_path))
+
+        if key_index is not None:
+            self.key_index = key_index
+            if self.cache_key is not None and self.session is not None:
+                key_indexes = self.session.GetParameter(
+                    "registry_key_index") or {}
+                key_indexes[self.cache_key] = key_index
+                self.session.SetCache("registry_key_index", key_indexes)
+
+    def BuildKeyIndex(self):
+        """Build the key index in one pass over the hive.
+
+        This walks every key in the hive, so it only pays off for callers
+        which open many keys.
+        """
+        for _ in self.walk():
+            pass
+
+        # The root key is invalid so there is nothing to index.
+        if self.key_index is None:
+            self.key_index = {}
+
+        return self.key_index
+
     def open_value(self, path):
         key = self.open_key(ntpath.dirname(path))
 
@@ -595,6 +777,8 @@ class RegistryHive(Registry):
             session=session, profile=profile, address_space=hive_address_space,
             **kwargs)
 
+        self.cache_key = (int(hive_offset), self.stable)
+
 
 class RegistryPlugin(common.WindowsCommandPlugin):
     """A generic registry plugin."""
@@ -0,0 +1,313 @@
+"""Tests for the registry hive address space."""
+import struct
+
+from rekall import addrspace
+from rekall import obj
+from rekall import session
+from rekall import testlib
+from rekall.plugins.overlays import basic
+from rekall.plugins.windows.registry import registry
+
+
+class HiveAddressSpaceTest(testlib.RekallBaseUnitTestCase):
+    """Test the block map against the _HMAP_DIRECTORY objects."""
+
+    # A minimal hive with the Windows 7 _HMAP_ENTRY.
+    VTYPES = {
+        '_CMHIVE': [0x30, {
+            'Hive': [0, ['_HHIVE']],
+        }],
+        '_HHIVE': [0x30, {
+            'BaseBlock': [0, ['unsigned long long']],
+            'Flat': [8, ['unsigned long']],
+            'Storage': [0x10, ['Array', dict(target='_DUAL', count=2)]],
+        }],
+        '_DUAL': [0x10, {
+            'Length': [0, ['unsigned long']],
+            'Map': [8, ['Pointer', dict(target='_HMAP_DIRECTORY')]],
+        }],
+        '_HMAP_DIRECTORY': [0x2000, {
+            'Directory': [0, ['Array', dict(
+                target='Pointer', count=0x400,
+                target_args=dict(target='_HMAP_TABLE'))]],
+        }],
+        '_HMAP_TABLE': [0x3000, {
+            'Table': [0, ['Array', dict(target='_HMAP_ENTRY', count=0x200)]],
+        }],
+        '_HMAP_ENTRY': [0x18, {
+            'BlockAddress': [8, ['unsigned long long']],
+        }],
+    }
+
+    # Windows 10 keeps flags in the low bits of PermanentBinAddress.
+    WIN10_HMAP_ENTRY = {
+        '_HMAP_ENTRY': [0x18, {
+            'PermanentBinAddress': [8, ['unsigned long long']],
+        }],
+    }
+
+    HIVE_OFFSET = 0x100
+    DIRECTORY_OFFSET = 0x1000
+    TABLES_OFFSET = 0x5000
+
+    # The number of blocks in the stable and volatile storage. The stable
+    # storage spans two tables.
+    LENGTHS = [0x201, 3]
+
+    def _BuildHive(self, vtypes, flags=0):
+        profile = obj.Profile.classes["ProfileLLP64"](session=self.session)
+        profile.set_metadata("arch", "AMD64")
+        profile.add_types(vtypes)
+
+        data = bytearray(self.TABLES_OFFSET + 4 * 0x3000)
+        struct.pack_into("<QI", data, self.HIVE_OFFSET, 0x100000, 0)
+
+        table_offset = self.TABLES_OFFSET
+        for storage, length in enumerate(self.LENGTHS):
+            directory = self.DIRECTORY_OFFSET + storage * 0x2000
+            struct.pack_into("<IxxxxQ", data,
+                             self.HIVE_OFFSET + 0x10 + storage * 0x10,
+                             length * 0x1000, directory)
+
+            for table in range(0, length + 1, 0x200):
+                struct.pack_into("<Q", data, directory + table / 0x200 * 8,
+                                 table_offset)
+
+                # Also fill the entries past the storage length.
+                for block in range(0x200):
+                    address = (0xfffff8a000000000 + storage * 0x10000000 +
+                               (table + block) * 0x3000)
+                    struct.pack_into("<Q", data, table_offset + block * 0x18 + 8,
+                                     address | flags)
+
+                table_offset += 0x3000
+
+        base = addrspace.BufferAddressSpace(data=str(data),
+                                            session=self.session)
+
+        return registry.HiveAddressSpace(
+            base=base, hive_addr=self.HIVE_OFFSET, profile=profile, session=self.session)
+
+    def _ObjectVtop(self, hive, vaddr):
+        ci_type = (vaddr & hive.CI_TYPE_MASK) >> hive.CI_TYPE_SHIFT
+        ci_table = (vaddr & hive.CI_TABLE_MASK) >> hive.CI_TABLE_SHIFT
+        ci_block = (vaddr & hive.CI_BLOCK_MASK) >> hive.CI_BLOCK_SHIFT
+        ci_off = (vaddr & hive.CI_OFF_MASK) >> hive.CI_OFF_SHIFT
+
+        return hive.storage[ci_type].Map.Directory[ci_table].Table[
+            ci_block].BlockAddress + ci_off + 4
+
+    def _CheckVtop(self, hive):
+        for storage, length in enumerate(self.LENGTHS):
+            # Include blocks past the storage length, which are not in the
+            # block map.
+            for block in range(length + 2):
+                for offset in (0, 0x20, 0xffc):
+                    vaddr = (storage << 31) | (block << 12) | offset
+                    self.assertEqual(hive.vtop(vaddr),
+                                     self._ObjectVtop(hive, vaddr))
+
+        self.assertEqual([len(x) for x in hive.block_map], self.LENGTHS)
+
+    def setUp(self):
+        self.session = session.Session()
+
+    def testBlockMap(self):
+        self._CheckVtop(self._BuildHive(self.VTYPES))
+
+    def testBlockMapWin10(self):
+        vtypes = dict(self.VTYPES)
+        vtypes.update(self.WIN10_HMAP_ENTRY)
+        hive = self._BuildHive(vtypes, flags=0x5)
+        self._CheckVtop(hive)
+
+        # The flags are masked out.
+        self.assertEqual(hive.vtop(0x1000) & 0xfff, 4)
+
+
+class HiveBuilder(object):
+    """Lays out key and value cells of a registry file in memory."""
+
+    def __init__(self):
+        self.data = bytearray("regf".ljust(0x1000, "\x00"))
+        # Leave room for the root key at cell 0x20.
+        self.data.extend("\x00" * 0x100)
+
+    def _Allocate(self, cell):
+        # Cells are preceded by their size.
+        offset = len(self.data) - 0x1000
+        self.data.extend(struct.pack("<i", -len(cell) - 4) + cell)
+        return offset
+
+    def Value(self, name, data):
+        return self._Allocate(struct.pack(
+            "<2sHIII4x", "vk", len(name), 0x80000004, data, 4) + name)
+
+    def Key(self, name, subkeys=(), values=(), index_type="lf"):
+        flags = 0x20
+        if isinstance(name, unicode):
+            name = name.encode("utf-16-le")
+            flags = 0
+
+        subkey_list = 0
+        if subkeys:
+            subkey_list = self._IndexList(index_type, subkeys)
+
+        value_list = 0
+        if values:
+            value_list = self._Allocate(
+                "".join(struct.pack("<I", x) for x in values))
+
+        return self._Allocate(struct.pack(
+            "<2sHQ8xIIIIII28xHH", "nk", flags, 130000000000000000,
+            len(subkeys), 0, subkey_list, 0, len(values), value_list,
+            len(name), 0) + name)
+
+    def _IndexList(self, index_type, subkeys):
+        entries = []
+        for subkey in subkeys:
+            entries.append(struct.pack("<I", subkey))
+            if index_type in ("lf", "lh"):
+                # The hash is not used.
+                entries.append("hash")
+
+        return self._Allocate(
+            struct.pack("<2sH", index_type, len(subkeys)) + "".join(entries))
+
+    def Root(self, root):
+        """Copies the root key to cell 0x20."""
+        start = root + 0x1000
+        cell = self.data[start:start + 4 + 0x50]
+        self.data[0x1020:0x1020 + len(cell)] = cell
+
+
+class RegistryKeyIndexTest(testlib.RekallBaseUnitTestCase):
+    """Test the key index against walking the subkeys."""
+
+    VTYPES = {
+        '_CM_KEY_NODE': [0x50, {
+            'Signature': [0, ['unsigned short']],
+            'Flags': [2, ['unsigned short']],
+            'LastWriteTime': [4, ['unsigned long long']],
+            'Parent': [0x10, ['unsigned long']],
+            'SubKeyCounts': [0x14, ['Array', dict(
+                target='unsigned long', count=2)]],
+            'SubKeyLists': [0x1c, ['Array', dict(
+                target='unsigned long', count=2)]],
+            'ValueList': [0x24, ['_CHILD_LIST']],
+            'NameLength': [0x48, ['unsigned short']],
+            'ClassLength': [0x4a, ['unsigned short']],
+            'Name': [0x4c, ['unsigned short']],
+        }],
+        '_CHILD_LIST': [8, {
+            'Count': [0, ['unsigned long']],
+            'List': [4, ['unsigned long']],
+        }],
+        '_CM_KEY_INDEX': [8, {
+            'Signature': [0, ['unsigned short']],
+            'Count': [2, ['unsigned short']],
+            'List': [4, ['unsigned long']],
+        }],
+        '_CM_KEY_VALUE': [0x18, {
+            'Signature': [0, ['unsigned short']],
+            'NameLength': [2, ['unsigned short']],
+            'DataLength': [4, ['unsigned long']],
+            'Data': [8, ['unsigned long']],
+            'Type': [0xc, ['unsigned long']],
+            'Name': [0x14, ['unsigned short']],
+        }],
+    }
+
+    def setUp(self):
+        self.session = session.Session()
+        self.profile = obj.Profile.classes["ProfileLLP64"](
+            session=self.session)
+        self.profile.add_classes(
+            String=basic.String, UnicodeString=basic.UnicodeString,
+            Flags=basic.Flags, Enumeration=basic.Enumeration)
+        self.profile.add_types(self.VTYPES)
+
+        hive = HiveBuilder()
+        windows = hive.Key("Windows", values=[hive.Value("Version", 10)])
+        microsoft = hive.Key("Microsoft", subkeys=[windows], index_type="li")
+        classes = hive.Key("Classes")
+        software = hive.Key("Software", subkeys=[microsoft, classes])
+
+        # Keys which only differ in case - the first one is found.
+        select = hive.Key("Select", values=[hive.Value("Current", 1)])
+        system = hive.Key("System", subkeys=[
+            select, hive.Key("SELECT"), hive.Key(u"Caf\u00e9")],
+                          index_type="lh")
+
+        hive.Root(hive.Key("ROOT", subkeys=[software, system]))
+
+        base = addrspace.BufferAddressSpace(data=str(hive.data),
+                                            session=self.session)
+        self.address_space = registry.HiveFileAddressSpace(
+            base=base, session=self.session)
+
+    def _Registry(self):
+        return registry.Registry(session=self.session, profile=self.profile,
+                                 address_space=self.address_space)
+
+    def _OpenUnindexedKey(self, reg, path):
+        key = reg.root
+        for component in path.split("/"):
+            key = key.open_subkey(component)
+
+        return key
+
+    def testWalk(self):
+        reg = self._Registry()
+        walked = [(path, [unicode(x.Name) for x in values])
+                  for path, _, values in reg.walk()]
+
+        self.assertEqual(walked, [
+            (u"ROOT", []),
+            (u"ROOT/Software", []),
+            (u"ROOT/System", []),
+            (u"ROOT/Software/Microsoft", []),
+            (u"ROOT/Software/Classes", []),
+            (u"ROOT/System/Select", [u"Current"]),
+            (u"ROOT/System/SELECT", []),
+            (u"ROOT/System/Caf\u00e9", []),
+            (u"ROOT/Software/Microsoft/Windows", [u"Version"])])
+
+        self.assertEqual(len(reg.key_index), len(walked) - 2)
+
+        for path, _ in walked[1:]:
+            relative_path = path.split("/", 1)[1]
+            key = reg.open_key(relative_path)
+            self.assertEqual(
+                int(key), int(self._OpenUnindexedKey(reg, relative_path)))
+
+            # SELECT is hidden by Select, like in open_subkey().
+            if path == u"ROOT/System/SELECT":
+                self.assertEqual(key.Path, u"ROOT/System/Select")
+            else:
+                self.assertEqual(key.Path, path)
+
+    def _CheckOpenKey(self, reg):
+        for path in ["software/MICROSOFT/windows", "System\\select",
+                     u"system/caf\u00e9", "System/Select/Missing",
+                     "Missing", "Software/Microsoft/Windows/Missing"]:
+            key = reg.open_key(path)
+            expected = self._OpenUnindexedKey(reg, path.replace("\\", "/"))
+            self.assertEqual(bool(key), bool(expected))
+            if key:
+                self.assertEqual(int(key), int(expected))
+                self.assertEqual(key.Path, expected.Path)
+
+        self.assertEqual(int(reg.open_key("")), int(reg.root))
+        self.assertEqual(
+            reg.open_value("System/Select/Current").DecodedData, 1)
+
+    def testOpenKey(self):
+        reg = self._Registry()
+
+        # Opening a few keys does not walk the hive.
+        self._CheckOpenKey(reg)
+        self.assertEqual(reg.key_index, None)
+
+        self.assertTrue(reg.BuildKeyIndex())
+        self._CheckOpenKey(reg)
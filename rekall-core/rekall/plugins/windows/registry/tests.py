@@ -1 +1,2 @@
 from rekall.plugins.windows.registry import printkey_test
+from rekall.plugins.windows.registry import registry_test
@@ -48,23 +48,24 @@ class WinSSDT(common.WindowsCommandPlugin):
     def _render_x64_table(self, table, renderer):
         resolver = self.session.address_resolver
 
-        for j, entry in enumerate(table):
-            function_address = table.v() + (entry >> 4)
-            renderer.table_row(
-                j, function_address,
-                resolver.format_address(
-                    function_address,
-                    max_distance=0xFFFFFFFFFFFF) or "Unknown")
+        function_addresses = [table.v() + (entry >> 4) for entry in table]
+        symbols = resolver.format_addresses(
+            function_addresses, max_distance=0xFFFFFFFFFFFF)
+
+        for j, (function_address, symbol) in enumerate(
+                zip(function_addresses, symbols)):
+            renderer.table_row(j, function_address, symbol or "Unknown")
 
     def _render_x86_table(self, table, renderer):
         resolver = self.session.address_resolver
 
-        for j, function_address in enumerate(table):
-            renderer.table_row(
-                j, function_address,
-                resolver.format_address(
-                    function_address,
-                    max_distance=0xFFFFFFFFFFFF) or "Unknown")
+        function_addresses = list(table)
+        symbols = resolver.format_addresses(
+            function_addresses, max_distance=0xFFFFFFFFFFFF)
+
+        for j, (function_address, symbol) in enumerate(
+                zip(function_addresses, symbols)):
+            renderer.table_row(j, function_address, symbol or "Unknown")
 
     def render(self, renderer):
         # Directly get the SSDT.
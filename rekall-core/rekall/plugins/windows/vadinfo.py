@@ -252,12 +252,13 @@ class VAD(common.WinProcessFilter):
             return data
 
     def _make_cache(self, task):
-        result = utils.RangedCollection()
+        result = utils.IntervalIndex()
         self.session.report_progress(
             " Enumerating VADs in %s (%s)", task.name, task.pid)
 
-        for vad in task.RealVadRoot.traverse():
-            result.insert(vad.Start, vad.End, (self._get_filename(vad), vad))
+        result.insert_many(
+            (vad.Start, vad.End, (self._get_filename(vad), vad))
+            for vad in task.RealVadRoot.traverse())
 
         return result
 
@@ -21,13 +21,23 @@
 __author__ = "Michael Cohen <scudette@gmail.com>"
 
 import acora
+import cPickle
+import multiprocessing
 import re
 
 from rekall import addrspace
+from rekall import config
 from rekall import constants
 from rekall import registry
 
 
+config.DeclareOption(
+    "--scan_workers", default=1, type="IntParser",
+    help="The number of processes to use when scanning the physical address "
+    "space. If larger than 1, eligible scanners partition the image between "
+    "a pool of worker processes.")
+
+
 class ScannerCheck(object):
     """ A scanner check is a special class which is invoked on an AS to check
     for a specific condition.
@@ -215,7 +225,6 @@ class BaseScanner(object):
         self.profile = profile
         self.max_length = None
         self.base_offset = None
-        self.scan_buffer_offset = None
         self.buffer_as = addrspace.BufferAddressSpace(session=self.session)
         if checks is not None:
             self.checks = checks
@@ -286,7 +295,15 @@ class BaseScanner(object):
         """
         maxlen = maxlen or 2**64
         end = offset + maxlen
-        overlap = ""
+
+        # Large physical scans can be farmed out to a pool of processes.
+        workers = self.session.GetParameter("scan_workers", 1)
+        if workers > 1 and self.can_scan_in_parallel():
+            for hit in self.scan_parallel(offset=offset, end=end,
+                                          workers=workers):
+                yield hit
+
+            return
 
         # Record the last reported hit to prevent multiple reporting of the same
         # hits when using an overlap.
@@ -309,6 +326,12 @@ class BaseScanner(object):
         # from the second chunk.
         chunk_end = 0
 
+        # Chunks are read into a reusable buffer behind the overlap carried
+        # over from the previous chunk.
+        scan_buffer = memoryview(bytearray(
+            constants.SCAN_BLOCKSIZE + self.overlap))
+        overlap_length = 0
+
         for run in self.address_space.merge_base_ranges(start=offset, end=end):
             # Store where this chunk will start. Absolute offset.
             chunk_offset = run.start
@@ -327,7 +350,7 @@ class BaseScanner(object):
                 # means there is a gap in the virtual address space and
                 # therefore we should not use any overlap.
                 if chunk_offset != chunk_end:
-                    overlap = ""
+                    overlap_length = 0
 
                 # Our chunk is SCAN_BLOCKSIZE long or as much data there's
                 # left in the range.
@@ -341,31 +364,247 @@ class BaseScanner(object):
                 # virtual address space's read() method.
                 phys_chunk_offset = run.file_offset + (chunk_offset - run.start)
 
+                data_end = overlap_length + addrspace.ReadInto(
+                    run.address_space, phys_chunk_offset,
+                    scan_buffer[overlap_length:overlap_length + chunk_size])
+
+                # The checks use string methods (e.g. find() or acora), so
+                # the chunk is copied once into a string for them.
                 buffer_as.assign_buffer(
-                    overlap + run.address_space.read(
-                        phys_chunk_offset, chunk_size),
-                    base_offset=chunk_offset - len(overlap))
+                    scan_buffer[:data_end].tobytes(),
+                    base_offset=chunk_offset - overlap_length)
 
                 if self.overlap > 0:
-                    overlap = buffer_as.data[-self.overlap:]
+                    overlap_length = min(self.overlap, data_end)
+                    scan_buffer[:overlap_length] = buffer_as.data[
+                        data_end - overlap_length:]
+
+                hits, chunk_offset = self.scan_buffer(
+                    buffer_as, last_reported_hit=last_reported_hit)
+
+                for hit_offset, res in hits:
+                    last_reported_hit = hit_offset
+                    yield res
+
+    def scan_buffer(self, buffer_as, last_reported_hit=-1):
+        """Run the checks and skippers over a single filled buffer.
+
+        This is the inner loop of scan(). It is exposed separately so that a
+        ScannerGroup can feed the same buffer to many scanners without reading
+        it again.
+
+        Args:
+          buffer_as: A BufferAddressSpace holding the data to scan.
+
+          last_reported_hit: Hits at or below this offset were already reported
+            (e.g. from the overlap of the previous buffer) and are suppressed.
+
+        Returns:
+          A list of (offset, hit) tuples for each new hit in the buffer, and
+          the offset where scanning stopped (where the next buffer starts).
+        """
+        if self.constraints is None:
+            self.build_constraints()
+
+        hits = []
+        scan_offset = buffer_as.base_offset
+        while scan_offset < buffer_as.end():
+            # Check the current offset for a match.
+            res = self.check_addr(scan_offset, buffer_as=buffer_as)
+
+            # Remove multiple matches in the overlap region which we have
+            # previously reported.
+            if res is not None and scan_offset > last_reported_hit:
+                last_reported_hit = scan_offset
+                hits.append((scan_offset, res))
+
+            # Skip as much data as the skippers tell us to, up to the end of
+            # the buffer.
+            scan_offset += min(len(buffer_as),
+                               self.skip(buffer_as, scan_offset))
+
+        return hits, scan_offset
+
+    def can_scan_in_parallel(self):
+        """Can this scan be run by the parallel engine?
+
+        Worker processes reopen the image from the session's filename and
+        rebuild the checks from self.checks, so this is only possible when:
+
+        - We scan the session's physical address space.
+        - The scanner uses the stock check_addr() and skip() methods (i.e. all
+          the logic is in its checks).
+        - The checks' arguments can be pickled.
+        """
+        if (self.address_space is None or
+                self.address_space is not self.session.physical_address_space):
+            return False
+
+        if not self.session.GetParameter("filename"):
+            return False
+
+        cls = self.__class__
+        if (cls.check_addr.im_func is not BaseScanner.check_addr.im_func or
+                cls.skip.im_func is not BaseScanner.skip.im_func or
+                cls.scan_buffer.im_func is not BaseScanner.scan_buffer.im_func):
+            self.session.logging.info(
+                "%s overrides the scanning methods and can not be run in "
+                "parallel. Scanning serially.", cls.__name__)
+            return False
+
+        try:
+            cPickle.dumps(self.checks, -1)
+        except (TypeError, AttributeError, cPickle.PicklingError) as e:
+            self.session.logging.info(
+                "The checks of %s can not be sent to the scan workers (%s). "
+                "Scanning serially.", cls.__name__, e)
+            return False
+
+        return True
+
+    def _get_shards(self, offset, end, workers):
+        """Partition the runs between offset and end into shards.
+
+        Each shard is a list of (start, end) ranges. When a run is split
+        between two shards, the second shard starts self.overlap bytes early so
+        hits which straddle the split are not lost.
+        """
+        ranges = [(run.start, run.end) for run in
+                  self.address_space.merge_base_ranges(start=offset, end=end)]
+
+        total = sum(run_end - run_start for run_start, run_end in ranges)
+
+        # Make a few shards per worker so the load is balanced, but never
+        # bother with shards smaller than a single scan block.
+        shard_size = max(constants.SCAN_BLOCKSIZE, self.overlap * 2,
+                         total / (workers * 4) + 1)
+
+        shards = []
+        shard = []
+        shard_length = 0
+        for run_start, run_end in ranges:
+            start = run_start
+            while start < run_end:
+                length = min(run_end - start, shard_size - shard_length)
+                shard.append((start, start + length))
+                shard_length += length
+                start += length
+
+                if shard_length >= shard_size:
+                    shards.append(shard)
+                    shard = []
+                    shard_length = 0
+
+                    # The run continues in the next shard - overlap it.
+                    if start < run_end:
+                        start = max(run_start, start - self.overlap)
+
+        if shard:
+            shards.append(shard)
+
+        return shards
+
+    def scan_parallel(self, offset=0, end=2**64, workers=2):
+        """Scan the physical address space using a pool of processes.
+
+        Hits are yielded in ascending offset order, just like scan().
+        """
+        address_space_spec = []
+        address_space = self.address_space
+        while address_space is not None:
+            address_space_spec.insert(0, address_space.__class__.__name__)
+            address_space = address_space.base
+
+        state = dict(filename=self.session.GetParameter("filename"))
+        for name in ("repository_path", "profile_path"):
+            value = self.session.GetParameter(name)
+            if value:
+                state[name] = value
+
+        # Only pass the profile if it is already known - otherwise the workers
+        # will all try to autodetect it.
+        profile = self.profile
+        if profile is None and self.session.HasParameter("profile_obj"):
+            profile = self.session.profile
+
+        if profile is not None:
+            state["profile"] = profile.name
+
+        shards = self._get_shards(offset, end, workers)
+        if not shards:
+            return
+
+        pool = multiprocessing.Pool(
+            processes=min(workers, len(shards)),
+            initializer=_InitScanWorker,
+            initargs=(state, ":".join(address_space_spec), self.checks,
+                      self.window_size, self.overlap))
+
+        last_reported_hit = -1
+        try:
+            for shard, hits in zip(shards, pool.imap(_ScanShard, shards)):
+                self.session.report_progress(
+                    self.progress_message % dict(
+                        offset=shard[-1][1],
+                        name=self.__class__.__name__))
+
+                for hit in hits:
+                    # Remove the hits in the overlap that were already
+                    # reported by the previous shard.
+                    if hit > last_reported_hit:
+                        last_reported_hit = hit
+                        yield hit
+
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+
+# The scanner used by each worker process of the parallel scan engine.
+_WORKER_SCANNER = None
+_WORKER_ERROR = None
+
+
+def _InitScanWorker(state, address_space_spec, checks, window_size, overlap):
+    """Build a session and a scanner in a parallel scan worker process."""
+    global _WORKER_SCANNER, _WORKER_ERROR  # pylint: disable=global-statement
 
-                scan_offset = buffer_as.base_offset
-                while scan_offset < buffer_as.end():
-                    # Check the current offset for a match.
-                    res = self.check_addr(scan_offset, buffer_as=buffer_as)
+    # Importing here avoids a circular import and ensures all the address
+    # spaces and checks are registered in the worker.
+    from rekall import plugins  # pylint: disable=unused-variable
+    from rekall import session as rekall_session
 
-                    # Remove multiple matches in the overlap region which we
-                    # have previously reported.
-                    if res is not None and scan_offset > last_reported_hit:
-                        last_reported_hit = scan_offset
-                        yield res
+    # An exception escaping the initializer makes the pool respawn the worker
+    # forever, so we keep it and raise it from the first task instead.
+    try:
+        worker_session = rekall_session.Session(**state)
+        address_space = worker_session.plugins.load_as(
+            pas_spec=address_space_spec).GetPhysicalAddressSpace()
 
-                    # Skip as much data as the skippers tell us to, up to the
-                    # end of the buffer.
-                    scan_offset += min(len(buffer_as),
-                                       self.skip(buffer_as, scan_offset))
+        profile = None
+        if "profile" in state:
+            profile = worker_session.profile
 
-                chunk_offset = scan_offset
+        _WORKER_SCANNER = BaseScanner(
+            profile=profile, address_space=address_space,
+            session=worker_session, window_size=window_size, checks=checks)
+        _WORKER_SCANNER.overlap = overlap
+    except Exception as e:  # pylint: disable=broad-except
+        _WORKER_ERROR = RuntimeError(
+            "Unable to initialize scan worker: %s" % e)
+
+
+def _ScanShard(shard):
+    """Scan all the ranges in a shard and return the list of hits."""
+    if _WORKER_ERROR is not None:
+        raise _WORKER_ERROR
+
+    hits = []
+    for start, end in shard:
+        hits.extend(_WORKER_SCANNER.scan(offset=start, maxlen=end - start))
+
+    return hits
 
 
 class MultiStringScanner(BaseScanner):
@@ -438,22 +677,44 @@ class PointerScanner(BaseScanner):
 class ScannerGroup(BaseScanner):
     """Runs a bunch of scanners in one pass over the image."""
 
-    def __init__(self, scanners=None, **kwargs):
+    def __init__(self, scanners=None, shared_buffer=False, **kwargs):
         """Create a new scanner group.
 
         Args:
           scanners: A dict of BaseScanner instances. Keys will be used to refer
           to the scanner, while the value is the scanner instance.
+
+          shared_buffer: If set, each block of the image is read only once into
+            a single buffer which is then handed to every scanner's checks and
+            skippers in turn. In this mode the hits are those returned by each
+            scanner's check_addr(), so scanners which post process their hits
+            in their own scan() method (e.g. the pool scanners) are rejected.
+
+        Raises:
+          ValueError: If shared_buffer is set and a scanner overrides scan().
         """
         super(ScannerGroup, self).__init__(**kwargs)
         self.scanners = scanners
-        for scanner in scanners.values():
+        self.shared_buffer = shared_buffer
+        for name, scanner in scanners.items():
             scanner.address_space = self.address_space
 
+            if (shared_buffer and scanner.__class__.scan.im_func is not
+                    BaseScanner.scan.im_func):
+                raise ValueError(
+                    "Scanner %s (%s) overrides scan() and can not use a "
+                    "shared buffer." % (name, scanner.__class__.__name__))
+
         # A dict to hold all hits for each scanner.
         self.result = {}
 
     def scan(self, offset=0, maxlen=None):
+        if self.shared_buffer:
+            for name, hit in self.scan_shared(offset=offset, maxlen=maxlen):
+                yield name, hit
+
+            return
+
         available_length = maxlen or self.session.profile.get_constant(
             "MaxPointer")
 
@@ -471,6 +732,76 @@ class ScannerGroup(BaseScanner):
             offset += constants.SCAN_BLOCKSIZE
             available_length -= constants.SCAN_BLOCKSIZE
 
+    def scan_shared(self, offset=0, maxlen=None):
+        """Scan with all scanners, reading each block only once.
+
+        Yields:
+          (name, hit) tuples, where name is the key of the scanner in
+          self.scanners. Within a block, hits are grouped by scanner.
+        """
+        maxlen = maxlen or 2**64
+        end = offset + maxlen
+
+        # The overlap must be large enough for the greediest scanner.
+        overlap_size = max([self.overlap] + [
+            scanner.overlap for scanner in self.scanners.values()])
+
+        # Each scanner keeps its own last reported hit so hits in the overlap
+        # region are only reported once per scanner.
+        last_reported_hits = dict((name, -1) for name in self.scanners)
+
+        buffer_as = addrspace.BufferAddressSpace(session=self.session)
+        scan_buffer = memoryview(bytearray(
+            constants.SCAN_BLOCKSIZE + overlap_size))
+        overlap_length = 0
+        chunk_end = 0
+
+        for run in self.address_space.merge_base_ranges(start=offset, end=end):
+            chunk_offset = run.start
+
+            while chunk_offset < run.end:
+                if self.session:
+                    self.session.report_progress(
+                        self.progress_message % dict(
+                            offset=chunk_offset,
+                            name=self.__class__.__name__))
+
+                # A gap in the address space - do not use the overlap.
+                if chunk_offset != chunk_end:
+                    overlap_length = 0
+
+                chunk_size = min(constants.SCAN_BLOCKSIZE,
+                                 run.end - chunk_offset)
+
+                chunk_end = chunk_offset + chunk_size
+                phys_chunk_offset = run.file_offset + (chunk_offset - run.start)
+
+                data_end = overlap_length + addrspace.ReadInto(
+                    run.address_space, phys_chunk_offset,
+                    scan_buffer[overlap_length:overlap_length + chunk_size])
+
+                # The checks use string methods (e.g. find() or acora), so
+                # the chunk is copied once into a string for them.
+                buffer_as.assign_buffer(
+                    scan_buffer[:data_end].tobytes(),
+                    base_offset=chunk_offset - overlap_length)
+
+                if overlap_size > 0:
+                    overlap_length = min(overlap_size, data_end)
+                    scan_buffer[:overlap_length] = buffer_as.data[
+                        data_end - overlap_length:]
+
+                # Now feed all the scanners from the same buffer.
+                for name, scanner in self.scanners.items():
+                    hits, _ = scanner.scan_buffer(
+                        buffer_as, last_reported_hit=last_reported_hits[name])
+
+                    for hit_offset, hit in hits:
+                        last_reported_hits[name] = hit_offset
+                        yield name, hit
+
+                chunk_offset = chunk_end
+
 
 class DiscontigScannerGroup(ScannerGroup):
     """A scanner group which works over a virtual address space."""
@@ -478,6 +809,13 @@ class DiscontigScannerGroup(ScannerGroup):
     def scan(self, offset=0, maxlen=None):
         maxlen = maxlen or self.session.profile.get_constant("MaxPointer")
 
+        # The shared buffer mode already follows the address space's mappings.
+        if self.shared_buffer:
+            for match in self.scan_shared(offset=offset, maxlen=maxlen):
+                yield match
+
+            return
+
         for (start, _, length) in self.address_space.get_address_ranges(
                 offset, offset + maxlen):
             for match in super(DiscontigScannerGroup, self).scan(
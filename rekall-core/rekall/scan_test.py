@@ -0,0 +1,209 @@
+import tempfile
+
+from rekall import addrspace
+from rekall import addrspace_test
+from rekall import constants
+from rekall import scan
+from rekall import session
+from rekall import testlib
+
+
+class ScannerGroupTest(testlib.RekallBaseUnitTestCase):
+    """Test the shared buffer mode of the ScannerGroup."""
+
+    def setUp(self):
+        self.session = session.Session()
+        data = ("xxfooxxxxbarxxxx" * 64)
+        self.test_as = addrspace_test.CustomRunsAddressSpace(
+            session=self.session,
+            #        Voff, Poff, length
+            runs=[(0, 0, 512),
+                  (512, 512, 256),   # Contiguous with previous run.
+                  (2048, 768, 256)], # Discontiguous run.
+            data=data)
+
+        # Use a small block size so the overlap is exercised.
+        self.old_blocksize = constants.SCAN_BLOCKSIZE
+        constants.SCAN_BLOCKSIZE = 100
+
+    def tearDown(self):
+        constants.SCAN_BLOCKSIZE = self.old_blocksize
+
+    def _MakeScanners(self):
+        result = {}
+        for needle in ["foo", "bar"]:
+            scanner = scan.BaseScanner(
+                address_space=self.test_as, session=self.session,
+                checks=[("StringCheck", dict(needle=needle))])
+            scanner.overlap = 10
+            result[needle] = scanner
+
+        return result
+
+    def testSharedBufferMatchesIndividualScans(self):
+        expected = {}
+        for name, scanner in self._MakeScanners().items():
+            expected[name] = list(scanner.scan())
+
+        group = scan.ScannerGroup(
+            scanners=self._MakeScanners(), shared_buffer=True,
+            address_space=self.test_as, session=self.session)
+
+        hits = {}
+        for name, hit in group.scan():
+            hits.setdefault(name, []).append(hit)
+
+        for name in expected:
+            # Every hit is reported exactly once and in order.
+            self.assertEqual(hits[name], sorted(set(hits[name])))
+            self.assertEqual(hits[name], expected[name])
+
+        self.assertEqual(hits["foo"][:3], [2, 18, 34])
+        self.assertEqual(hits["foo"][-1], 2048 + 256 - 14)
+
+    def testSharedBufferRejectsScanOverrides(self):
+        scanners = self._MakeScanners()
+        scanners["pool"] = PostProcessingScanner(
+            address_space=self.test_as, session=self.session,
+            checks=[("StringCheck", dict(needle="foo"))])
+
+        # The group can not run PostProcessingScanner.scan() on the buffer.
+        self.assertRaises(
+            ValueError, scan.ScannerGroup, scanners=scanners,
+            shared_buffer=True, address_space=self.test_as,
+            session=self.session)
+
+        # Without a shared buffer each scanner runs its own scan().
+        group = scan.ScannerGroup(
+            scanners=scanners, address_space=self.test_as,
+            session=self.session)
+        hits = [hit for name, hit in group.scan(maxlen=100) if name == "pool"]
+        self.assertEqual(hits, [("foo", 2), ("foo", 18), ("foo", 34),
+                                ("foo", 50), ("foo", 66), ("foo", 82)])
+
+    def testScanBuffer(self):
+        scanner = self._MakeScanners()["foo"]
+        buffer_as = addrspace.BufferAddressSpace(
+            data="xxfooxxxxfooxx", base_offset=100, session=self.session)
+
+        self.assertEqual(scanner.scan_buffer(buffer_as),
+                         ([(102, 102), (109, 109)], 114))
+
+        # Hits which were already reported are suppressed.
+        self.assertEqual(scanner.scan_buffer(buffer_as, last_reported_hit=102),
+                         ([(109, 109)], 114))
+
+
+class PostProcessingScanner(scan.BaseScanner):
+    """A scanner which builds its results in scan() (like PoolScanner)."""
+
+    def scan(self, offset=0, maxlen=None):
+        for hit in super(PostProcessingScanner, self).scan(
+                offset=offset, maxlen=maxlen):
+            yield "foo", hit
+
+
+class StreamWrapper(object):
+    """A run target which only implements read() (like AFF4StreamWrapper)."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def read(self, offset, length):
+        return self.data[offset:offset + length]
+
+
+class WrapperRunsScanTest(testlib.RekallBaseUnitTestCase):
+    """Test scanning runs which are backed by plain stream wrappers."""
+
+    def setUp(self):
+        self.session = session.Session()
+        self.test_as = addrspace_test.CustomRunsAddressSpace(
+            session=self.session, runs=[], data="")
+
+        # Like a file mapped into an AFF4 image.
+        self.test_as.add_run(0, 0, 1024, StreamWrapper(
+            "xxfooxxxxbarxxxx" * 64))
+
+        self.old_blocksize = constants.SCAN_BLOCKSIZE
+        constants.SCAN_BLOCKSIZE = 100
+
+    def tearDown(self):
+        constants.SCAN_BLOCKSIZE = self.old_blocksize
+
+    def _MakeScanner(self):
+        scanner = scan.BaseScanner(
+            address_space=self.test_as, session=self.session,
+            checks=[("StringCheck", dict(needle="foo"))])
+        scanner.overlap = 10
+        return scanner
+
+    def testScanWrapperRuns(self):
+        expected = range(2, 1024, 16)
+        self.assertEqual(list(self._MakeScanner().scan()), expected)
+
+        group = scan.ScannerGroup(
+            scanners=dict(foo=self._MakeScanner()), shared_buffer=True,
+            address_space=self.test_as, session=self.session)
+        self.assertEqual([hit for _, hit in group.scan()], expected)
+
+        buffer = bytearray(8)
+        self.assertEqual(self.test_as.read_into(16, buffer), 8)
+        self.assertEqual(str(buffer), "xxfooxxx")
+
+
+class ParallelScannerTest(testlib.RekallBaseUnitTestCase):
+    """Test the parallel scanning engine."""
+
+    def setUp(self):
+        self.temp_file = tempfile.NamedTemporaryFile()
+        self.temp_file.write("xxfooxxxxbarxxxx" * 1024)
+        self.temp_file.flush()
+
+        self.session = session.Session(filename=self.temp_file.name)
+        self.session.plugins.load_as(
+            pas_spec="FileAddressSpace").GetPhysicalAddressSpace()
+
+        self.old_blocksize = constants.SCAN_BLOCKSIZE
+        constants.SCAN_BLOCKSIZE = 1000
+
+    def tearDown(self):
+        constants.SCAN_BLOCKSIZE = self.old_blocksize
+        self.temp_file.close()
+
+    def _Scan(self):
+        scanner = scan.BaseScanner(
+            address_space=self.session.physical_address_space,
+            session=self.session,
+            checks=[("StringCheck", dict(needle="foo"))])
+
+        return list(scanner.scan())
+
+    def testParallelScanMatchesSerialScan(self):
+        expected = self._Scan()
+        self.assertEqual(len(expected), 1024)
+
+        with self.session:
+            self.session.SetParameter("scan_workers", 3)
+
+        self.assertEqual(self._Scan(), expected)
+
+        # The image is split between multiple overlapping shards.
+        scanner = scan.BaseScanner(
+            address_space=self.session.physical_address_space,
+            session=self.session,
+            checks=[("StringCheck", dict(needle="foo"))])
+        self.assertTrue(scanner.can_scan_in_parallel())
+
+        shards = scanner._get_shards(0, 2**64, 3)
+        self.assertTrue(len(shards) > 3)
+        for previous, shard in zip(shards, shards[1:]):
+            self.assertEqual(previous[-1][1] - shard[0][0], scanner.overlap)
+
+    def testUnpicklableChecksScanSerially(self):
+        scanner = scan.BaseScanner(
+            address_space=self.session.physical_address_space,
+            session=self.session,
+            checks=[("StringCheck", dict(needle=lambda: "foo"))])
+
+        self.assertFalse(scanner.can_scan_in_parallel())
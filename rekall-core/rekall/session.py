@@ -69,6 +69,10 @@ config.DeclareOption(
     "--max_collector_cost", default=4, type="IntParser",
     help="If specified, collectors with higher cost will not be used.")
 
+config.DeclareOption(
+    "--cache_profiles", default=True, type="Boolean",
+    help="Keep parsed copies of repository profiles in the cache directory.")
+
 config.DeclareOption(
     "--home", default=None,
     help="An alternative home directory path. If not set we use $HOME.")
@@ -467,6 +471,8 @@ class Session(object):
         # session.GetParameter("process_context").
         self.context_cache = {}
         self._repository_managers = []
+        self._profile_cache_manager = None
+        self._profile_cache_dir = None
 
         # Store user configurable attributes here. These will be read/written to
         # the configuration file.
@@ -539,6 +545,29 @@ class Session(object):
 
         return self._repository_managers
 
+    @property
+    def profile_cache_manager(self):
+        """The IO manager which caches parsed profiles, if enabled."""
+        if not self.GetParameter("cache_profiles", True):
+            return
+
+        cache_dir = self.GetParameter("cache_dir")
+        if not cache_dir:
+            return
+
+        cache_dir = os.path.join(
+            config.GetHomeDir(self), os.path.expandvars(cache_dir), "profiles")
+
+        if cache_dir != self._profile_cache_dir:
+            self._profile_cache_dir = cache_dir
+            try:
+                self._profile_cache_manager = io_manager.ProfileCacheManager(
+                    cache_dir, session=self)
+            except IOError:
+                self._profile_cache_manager = None
+
+        return self._profile_cache_manager
+
     def __enter__(self):
         # Allow us to update the state context manager.
         self.state.__enter__()
@@ -650,8 +679,10 @@ class Session(object):
 
     def _RunParameterHook(self, name):
         """Launches the registered parameter hook for name."""
-        for cls in kb.ParameterHook.classes.values():
-            if cls.name == name and cls.is_active(self):
+        # The registry maintains an index of the hooks by name, which is
+        # updated as new hook classes are defined.
+        for cls in kb.ParameterHook.classes_by_name.get(name, ()):
+            if cls.is_active(self):
                 if name in self._hook_locks:
                     # This should never happen! If it does then this will block
                     # in a loop so we fail hard.
@@ -838,8 +869,14 @@ class Session(object):
                         continue
 
                     now = time.time()
+                    profile_cache = self.profile_cache_manager
+                    if profile_cache is not None:
+                        data = profile_cache.GetProfileData(manager, name)
+                    else:
+                        data = manager.GetData(name)
+
                     result = obj.Profile.LoadProfileFromData(
-                        manager.GetData(name), self, name=name)
+                        data, self, name=name)
                     if result:
                         self.logging.info(
                             "Loaded profile %s from %s (in %s sec)",
@@ -1,4 +1,13 @@
+import json
+import os
+import shutil
+import tempfile
+
 from rekall import addrspace
+from rekall import binary_profile
+from rekall import kb
+# Import and register all the plugins.
+from rekall import plugins # pylint: disable=unused-import
 from rekall import testlib
 from rekall import session
 
@@ -9,6 +18,27 @@ class CustomAddressSpace(addrspace.BaseAddressSpace):
         session_obj.SetCache("foo", "bar", volatile=False)
 
 
+class CountingParameterHook(kb.ParameterHook):
+    name = "session_test_counter"
+    volatile = False
+    calls = 0
+
+    def calculate(self):
+        CountingParameterHook.calls += 1
+        return CountingParameterHook.calls
+
+
+class InactiveParameterHook(kb.ParameterHook):
+    name = "session_test_counter"
+
+    @classmethod
+    def is_active(cls, session):
+        return False
+
+    def calculate(self):
+        raise RuntimeError("Inactive hook should never run.")
+
+
 class SessionTest(testlib.RekallBaseUnitTestCase):
     """Test the RunBasedAddressSpace implementation."""
 
@@ -48,3 +78,49 @@ class SessionTest(testlib.RekallBaseUnitTestCase):
         # Any parameters set by the address space should be present in the
         # session cache.
         self.assertEqual(self.session.GetParameter("foo"), "bar")
+
+    def testParameterHooks(self):
+        CountingParameterHook.calls = 0
+        self.assertEqual(self.session.GetParameter("session_test_counter"), 1)
+
+        # The result of the hook is cached.
+        self.assertEqual(self.session.GetParameter("session_test_counter"), 1)
+        self.assertEqual(CountingParameterHook.calls, 1)
+
+        # Parameters without hooks just return the default.
+        self.assertEqual(
+            self.session.GetParameter("session_test_no_hook", 5), 5)
+
+    def testProfileCache(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+
+        repository = os.path.join(temp_dir, "repository")
+        os.makedirs(os.path.join(repository, "v1.0"))
+        with open(os.path.join(repository, "v1.0", "inventory"), "wb") as fd:
+            json.dump({"$METADATA": dict(Type="Inventory",
+                                         ProfileClass="Inventory"),
+                       "$INVENTORY": {"test": dict(LastModified=1)}}, fd)
+
+        with open(os.path.join(repository, "v1.0", "test"), "wb") as fd:
+            json.dump({"$METADATA": dict(ProfileClass="Profile32Bits"),
+                       "$CONSTANTS": dict(foo=1),
+                       "$STRUCTS": {"Test": [4, {}]}}, fd)
+
+        def LoadProfile():
+            test_session = session.Session()
+            with test_session:
+                test_session.SetParameter("repository_path", [repository])
+                test_session.SetParameter("cache_dir",
+                                          os.path.join(temp_dir, "cache"))
+
+            profile = test_session.LoadProfile("test")
+            self.assertEqual(profile.get_constant("foo"), 1)
+            self.assertEqual(profile.get_obj_size("Test"), 4)
+
+            return profile
+
+        # The first load populates the cache, later loads use the binary form.
+        self.assertEqual(LoadProfile().vtypes.__class__, dict)
+        self.assertEqual(LoadProfile().vtypes.__class__,
+                         binary_profile.LazyTypes)
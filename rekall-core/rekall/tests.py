@@ -2,6 +2,7 @@
 
 from rekall import obj_test
 from rekall import addrspace_test
+from rekall import scan_test
 from rekall import session_test
 
 from rekall.plugins import tests
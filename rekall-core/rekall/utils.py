@@ -22,6 +22,7 @@
 
 """These are various utilities for rekall."""
 import __builtin__
+import bisect
 import cPickle
 import cStringIO
 import importlib
@@ -352,6 +353,56 @@ class AgeBasedCache(FastStore):
             raise KeyError("Item too old.")
 
 
+class SizeBasedCache(FastStore):
+    """A cache which limits the total size of the stored items.
+
+    Items must support len(). The least recently used items are expired once
+    the total size exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes=10 * 1024 * 1024, **kwargs):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        super(SizeBasedCache, self).__init__(**kwargs)
+
+    @Synchronized
+    def Put(self, key, item):
+        hit = self._hash.get(key, self)
+        if hit is not self:
+            self.total_bytes -= len(hit[1])
+
+        self.total_bytes += len(item)
+        return super(SizeBasedCache, self).Put(key, item)
+
+    @Synchronized
+    def Expire(self):
+        # Always keep the most recent item, even if it is too large.
+        while self.total_bytes > self.max_bytes and len(self._age) > 1:
+            x = self._age.PopLeft()
+            self.ExpireObject(x)
+
+    @Synchronized
+    def ExpireObject(self, key):
+        item = super(SizeBasedCache, self).ExpireObject(key)
+        if item is not None:
+            self.total_bytes -= len(item)
+
+        return item
+
+    @Synchronized
+    def Flush(self):
+        super(SizeBasedCache, self).Flush()
+        self.total_bytes = 0
+
+    @Synchronized
+    def __getstate__(self):
+        super(SizeBasedCache, self).__getstate__()
+        return dict(max_bytes=self.max_bytes)
+
+    def __setstate__(self, state):
+        self.__init__(max_bytes=state["max_bytes"])
+
+
 # Compensate for Windows python not supporting socket.inet_ntop and some
 # Linux systems (i.e. OpenSuSE 11.2 w/ Python 2.6) not supporting IPv6.
 
@@ -738,6 +789,122 @@ class RangedCollection(object):
         return "\n".join(result)
 
 
+class IntervalIndex(object):
+    """An array backed drop in replacement for RangedCollection.
+
+    Ranges are kept in parallel sorted lists and looked up with bisect. This is
+    much faster than RangedCollection for collections which are built once and
+    then queried many times (e.g. the runs of an address space). Inserting
+    after a lookup is allowed but causes the index to be rebuilt on the next
+    lookup.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        # Ranges inserted since the index was last built.
+        self._pending = {}
+        self._starts = []
+        self._ends = []
+        self._data = []
+
+        # The index of the last range found by get_containing_range().
+        self._last_hit = None
+
+    def insert(self, start, end, data):
+        self.insert_many([(start, end, data)])
+
+    def insert_many(self, ranges):
+        """Insert many (start, end, data) tuples at once."""
+        if not self._pending:
+            self._pending = dict(
+                ((s, e), d) for s, e, d in self._iter_built())
+
+        for start, end, data in ranges:
+            self._pending[(int(start), int(end))] = data
+
+    def _iter_built(self):
+        return itertools.izip(self._starts, self._ends, self._data)
+
+    def _build(self):
+        """Rebuild the sorted lists from the pending ranges."""
+        ranges = sorted(self._pending.iteritems())
+        self._starts = [x[0][0] for x in ranges]
+        self._ends = [x[0][1] for x in ranges]
+        self._data = [x[1] for x in ranges]
+        self._pending = {}
+        self._last_hit = None
+
+    def get_next_range_start(self, address):
+        """Gets the start address of the next range larger than address."""
+        if self._pending:
+            self._build()
+
+        index = bisect.bisect_left(self._starts, address)
+        if index < len(self._starts):
+            return self._starts[index]
+
+    def get_containing_range(self, address):
+        """Retrieve the data associated with the range that contains value.
+
+        Retuns:
+          A tuple of start, end, data for the range that contains address.
+        """
+        if self._pending:
+            self._build()
+
+        # Most lookups are for the same range as the last one.
+        index = self._last_hit
+        if (index is None or not
+                self._starts[index] <= address < self._ends[index]):
+            index = bisect.bisect_right(self._starts, address) - 1
+            if index < 0 or address >= self._ends[index]:
+                return None, None, None
+
+            self._last_hit = index
+
+        return self._starts[index], self._ends[index], self._data[index]
+
+    def __eq__(self, other):
+        if isinstance(other, self.__class__):
+            return list(self) == list(other)
+
+        return NotImplemented
+
+    def __len__(self):
+        if self._pending:
+            self._build()
+
+        return len(self._starts)
+
+    def __getitem__(self, item):
+        if self._pending:
+            self._build()
+
+        return self._starts[item], self._ends[item], self._data[item]
+
+    def __iter__(self):
+        if self._pending:
+            self._build()
+
+        return self._iter_built()
+
+    def __reversed__(self):
+        if self._pending:
+            self._build()
+
+        return itertools.izip(reversed(self._starts), reversed(self._ends),
+                              reversed(self._data))
+
+    def __str__(self):
+        result = []
+        for start, end, data in self:
+            result.append("<%#x, %#x> %s" % (start, end, data))
+
+        return "\n".join(result)
+
+
 class JITIterator(object):
     def __init__(self, baseclass):
         self.baseclass = baseclass
@@ -772,6 +939,7 @@ def CopyAStoFD(in_as, out_fd, start=0, length=2**64,
                cb=lambda off, length: None):
     """Copy an address space into a file-like object."""
     blocksize = 1024 * 1024
+    buffer = memoryview(bytearray(blocksize))
 
     for run in in_as.get_address_ranges(start=start, end=start+length):
         for offset in xrange(run.start, run.end, blocksize):
@@ -779,13 +947,13 @@ def CopyAStoFD(in_as, out_fd, start=0, length=2**64,
             if to_read == 0:
                 break
 
-            data = in_as.read(offset, to_read)
+            read_length = in_as.read_into(offset, buffer[:to_read])
 
             out_fd.seek(offset)
-            out_fd.write(data)
-            length -= len(data)
+            out_fd.write(buffer[:read_length])
+            length -= read_length
 
-            cb(offset, len(data))
+            cb(offset, read_length)
 
 
 def issubclass(obj, cls):    # pylint: disable=redefined-builtin
@@ -0,0 +1,365 @@
+#!/usr/bin/env python
+
+# Rekall Memory Forensics
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or (at
+# your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+#
+
+"""Benchmark the pure python Xpress and LZNT1 decoders.
+
+This script compresses synthetic data (a mix of text, zero runs and random
+bytes, similar to memory pages) with simple greedy encoders for both formats,
+checks that the current decoders produce the same output as the original
+implementations and then compares their throughput.
+
+Usage:
+    decompression_benchmark.py [--blocks 32] [--seed 1]
+"""
+
+import argparse
+import cStringIO
+import random
+import struct
+import time
+
+from rekall.plugins.addrspaces import xpress
+from rekall.plugins.filesystems import lznt1
+
+
+# Hibernation files compress up to 16 pages in each Xpress block.
+XPRESS_BLOCK_SIZE = 0x10000
+
+# LZNT1 compresses data in chunks of 4kb.
+LZNT1_CHUNK_SIZE = 0x1000
+
+
+def GenerateData(size, rand):
+    """Generate data which looks a bit like memory pages."""
+    words = ["kernel32", "ntdll", "\x00\x00\x00\x00", "\xff\xff\xff\xff",
+             "Microsoft", "Windows", "\x90\x90", "rekall", "memory"]
+    result = []
+    length = 0
+    while length < size:
+        kind = rand.random()
+        if kind < 0.3:
+            piece = "\x00" * rand.randint(16, 2048)
+        elif kind < 0.5:
+            piece = "".join(chr(rand.randint(0, 255))
+                            for _ in xrange(rand.randint(4, 256)))
+        else:
+            piece = "".join(rand.choice(words)
+                            for _ in xrange(rand.randint(1, 64)))
+
+        result.append(piece)
+        length += len(piece)
+
+    return "".join(result)[:size]
+
+
+def FindMatches(data, start, end, max_offset, max_length):
+    """Greedy LZ77 parse of data[start:end].
+
+    Yields (position, offset, length) for matches and (position, 0, 0) for
+    literals. Only matches within max_offset of the position are used.
+    """
+    last_seen = {}
+    position = start
+    while position < end:
+        key = data[position:position + 3]
+        candidate = last_seen.get(key)
+        last_seen[key] = position
+
+        length = 0
+        if (len(key) == 3 and candidate is not None and
+                position - candidate <= max_offset):
+            limit = min(end - position, max_length(position - start))
+            while (length < limit and
+                   data[candidate + length] == data[position + length]):
+                length += 1
+
+        if length >= 3:
+            yield position, position - candidate, length
+            position += length
+        else:
+            yield position, 0, 0
+            position += 1
+
+
+def XpressEncode(data):
+    """Encode data using the plain LZ77 Xpress format."""
+    output = bytearray()
+    indicator_position = None
+    indicator = indicator_bits = 0
+    nibble_position = None
+
+    for position, offset, length in FindMatches(
+            data, 0, len(data), 0x2000, lambda _: 0xffff):
+        if indicator_bits == 0:
+            if indicator_position is not None:
+                struct.pack_into("<L", output, indicator_position, indicator)
+
+            indicator_position = len(output)
+            output += "\x00" * 4
+            indicator = 0
+            indicator_bits = 32
+
+        indicator_bits -= 1
+        if not length:
+            output.append(data[position])
+            continue
+
+        indicator |= 1 << indicator_bits
+        length -= 3
+        output += struct.pack("<H", ((offset - 1) << 3) | min(length, 7))
+        if length < 7:
+            continue
+
+        length -= 7
+        if nibble_position is None:
+            nibble_position = len(output)
+            output.append(min(length, 15))
+        else:
+            output[nibble_position] |= min(length, 15) << 4
+            nibble_position = None
+
+        if length < 15:
+            continue
+
+        length -= 15
+        if length < 255:
+            output.append(length)
+        else:
+            output.append(255)
+            output += struct.pack("<H", length + 15 + 7)
+
+    if indicator_position is not None:
+        struct.pack_into("<L", output, indicator_position, indicator)
+
+    return str(output)
+
+
+def LZNT1Encode(data):
+    """Encode data using the LZNT1 format."""
+    output = bytearray()
+    for chunk_start in xrange(0, len(data), LZNT1_CHUNK_SIZE):
+        chunk_end = min(chunk_start + LZNT1_CHUNK_SIZE, len(data))
+        chunk = bytearray()
+        tag_position = None
+        tag_bit = 8
+
+        for position, offset, length in FindMatches(
+                data, chunk_start, chunk_end, 0x1000,
+                lambda p: (0xfff >> lznt1.DISPLACEMENT_TABLE[p - 1]) + 3):
+            if tag_bit == 8:
+                tag_position = len(chunk)
+                chunk.append(0)
+                tag_bit = 0
+
+            if length:
+                displacement = lznt1.DISPLACEMENT_TABLE[
+                    position - chunk_start - 1]
+                chunk[tag_position] |= 1 << tag_bit
+                chunk += struct.pack(
+                    "<H", ((offset - 1) << (12 - displacement)) |
+                    (length - 3))
+            else:
+                chunk.append(data[position])
+
+            tag_bit += 1
+
+        if len(chunk) < chunk_end - chunk_start:
+            output += struct.pack("<H", 0xb000 | (len(chunk) - 1))
+            output += chunk
+        else:
+            output += struct.pack("<H", 0x3000 | (chunk_end - chunk_start - 1))
+            output += data[chunk_start:chunk_end]
+
+    return str(output)
+
+
+def LegacyXpressDecode(inputBuffer):
+    """The original dict based Xpress decoder."""
+    outputBuffer = {}
+    outputIndex = 0
+    inputIndex = 0
+    indicatorBit = 0
+    nibbleIndex = 0
+
+    def recombine(outbuf):
+        return "".join(outbuf[k] for k in sorted(outbuf.keys()))
+
+    while inputIndex < len(inputBuffer):
+        if indicatorBit == 0:
+            try:
+                indicator = struct.unpack(
+                    "<L", inputBuffer[inputIndex:inputIndex + 4])[0]
+            except struct.error:
+                return recombine(outputBuffer)
+
+            inputIndex += 4
+            indicatorBit = 32
+
+        indicatorBit = indicatorBit - 1
+        if not indicator & (1 << indicatorBit):
+            try:
+                outputBuffer[outputIndex] = inputBuffer[inputIndex]
+            except IndexError:
+                return recombine(outputBuffer)
+
+            inputIndex += 1
+            outputIndex += 1
+        else:
+            try:
+                length = struct.unpack(
+                    "<H", inputBuffer[inputIndex:inputIndex + 2])[0]
+            except struct.error:
+                return recombine(outputBuffer)
+
+            inputIndex += 2
+            offset = length / 8
+            length = length % 8
+            if length == 7:
+                if nibbleIndex == 0:
+                    nibbleIndex = inputIndex
+                    length = ord(inputBuffer[inputIndex]) % 16
+                    inputIndex += 1
+                else:
+                    length = ord(inputBuffer[nibbleIndex]) / 16
+                    nibbleIndex = 0
+
+                if length == 15:
+                    length = ord(inputBuffer[inputIndex])
+                    inputIndex += 1
+                    if length == 255:
+                        try:
+                            length = struct.unpack(
+                                "<H", inputBuffer[inputIndex:inputIndex + 2])[0]
+                        except struct.error:
+                            return recombine(outputBuffer)
+                        inputIndex = inputIndex + 2
+                        length = length - (15 + 7)
+                    length = length + 15
+                length = length + 7
+            length = length + 3
+
+            while length != 0:
+                try:
+                    outputBuffer[outputIndex] = outputBuffer[
+                        outputIndex - offset - 1]
+                except KeyError:
+                    return recombine(outputBuffer)
+                outputIndex += 1
+                length -= 1
+
+    return recombine(outputBuffer)
+
+
+def LegacyLZNT1Decode(cdata):
+    """The original cStringIO based LZNT1 decoder (without logging)."""
+    in_fd = cStringIO.StringIO(cdata)
+    output_fd = cStringIO.StringIO()
+
+    while in_fd.tell() < len(cdata):
+        block_offset = in_fd.tell()
+        uncompressed_chunk_offset = output_fd.tell()
+
+        block_header = struct.unpack("<H", in_fd.read(2))[0]
+        if block_header & lznt1.SIGNATURE_MASK != lznt1.SIGNATURE_MASK:
+            break
+
+        size = (block_header & lznt1.SIZE_MASK)
+        block_end = block_offset + size + 3
+
+        if block_header & lznt1.COMPRESSED_MASK:
+            while in_fd.tell() < block_end:
+                header = ord(in_fd.read(1))
+                for mask in lznt1.TAG_MASKS:
+                    if in_fd.tell() >= block_end:
+                        break
+
+                    if header & mask:
+                        pointer = struct.unpack("<H", in_fd.read(2))[0]
+                        displacement = lznt1.DISPLACEMENT_TABLE[
+                            output_fd.tell() - uncompressed_chunk_offset - 1]
+
+                        symbol_offset = (pointer >> (12 - displacement)) + 1
+                        symbol_length = (pointer & (0xFFF >> displacement)) + 3
+
+                        output_fd.seek(-symbol_offset, 2)
+                        data = output_fd.read(symbol_length)
+
+                        if 0 < len(data) < symbol_length:
+                            data = data * (symbol_length / len(data) + 1)
+                            data = data[:symbol_length]
+
+                        output_fd.seek(0, 2)
+                        output_fd.write(data)
+
+                    else:
+                        output_fd.write(in_fd.read(1))
+
+        else:
+            output_fd.write(in_fd.read(size + 1))
+
+    return output_fd.getvalue()
+
+
+def Benchmark(decoder, blocks, repeat):
+    best = None
+    for _ in xrange(repeat):
+        now = time.time()
+        for block in blocks:
+            decoder(block)
+
+        elapsed = time.time() - now
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--blocks", type=int, default=32,
+                        help="Number of 64kb blocks to compress.")
+    parser.add_argument("--seed", type=int, default=1,
+                        help="Seed for the synthetic data.")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Number of timing runs (the best is reported).")
+    args = parser.parse_args()
+
+    rand = random.Random(args.seed)
+    plain = [GenerateData(XPRESS_BLOCK_SIZE, rand) for _ in xrange(args.blocks)]
+    total = sum(len(x) for x in plain) / 1024.0 / 1024
+
+    for name, encoder, legacy, current in [
+            ("xpress", XpressEncode, LegacyXpressDecode, xpress.xpress_decode),
+            ("lznt1", LZNT1Encode, LegacyLZNT1Decode, lznt1.decompress_data)]:
+        compressed = [encoder(x) for x in plain]
+        for data, block in zip(plain, compressed):
+            if legacy(block) != data or current(block) != data:
+                raise RuntimeError("%s decoders do not match." % name)
+
+        ratio = sum(len(x) for x in compressed) / (total * 1024 * 1024)
+        old = Benchmark(legacy, compressed, args.repeat)
+        new = Benchmark(current, compressed, args.repeat)
+
+        print "%-8s ratio %.2f  old %6.2f MB/s  new %6.2f MB/s  (%.1fx)" % (
+            name, ratio, total / old, total / new, old / new)
+
+
+if __name__ == "__main__":
+    main()